@@ -1,16 +1,131 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, fields
 from datetime import datetime
+import hashlib
+import inspect
+import json
 import re
+import sys
 
 from bs4 import BeautifulSoup
+import pandas as pd
 
 UNIFIED_PARSE_DATE = '%Y-%m-%d'
 
+# the methods every output field is computed by; a change in their source code
+# changes the version of the field (see BaseExtractor.versions)
+FIELD_METHODS = {
+    'article_body': ('find_article_body',),
+    'title': ('find_title',),
+    # __init__ sets date_str_format, which parse_date depends on
+    'date_published': ('find_date', 'parse_date', '__init__'),
+    'abstract': ('find_abstract',),
+    'keywords': ('find_keywords',),
+    'genre': ('find_genre',),
+    'author': ('find_author',),
+}
+
+
+@dataclass(slots=True)
+class Article:
+    '''
+    One parsed article. Slots instead of a dict per article: the parsed corpus is
+    hundreds of thousands of these. The genre and the outlet repeat a lot, so they
+    are interned (one string object per value), and the keywords are a tuple.
+    parsed['title'] works too, like with the dicts the extractors used to return.
+    '''
+    title: str = None
+    date_published: str = None
+    abstract: str = None
+    article_body: str = None
+    keywords: tuple = ()
+    genre: str = None
+    author: str = None
+    file_path: str = None
+    outlet: str = None  # set by extractor_registry.AutoExtractor
+    versions: str = None  # json {field: version} of the extractor (see BaseExtractor.versions)
+
+    def __post_init__(self):
+        self.keywords = tuple(self.keywords or ())
+        if isinstance(self.genre, str):
+            self.genre = sys.intern(self.genre)
+        if isinstance(self.outlet, str):
+            self.outlet = sys.intern(self.outlet)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+
+ARTICLE_COLUMNS = tuple(field.name for field in fields(Article))
+# written only if some article has them
+OPTIONAL_COLUMNS = ('outlet', 'versions')
+
+
+class ArticleColumns:
+    '''
+    A buffer of articles kept as columns (a list per field), which is what
+    pd.DataFrame is built from anyway, so to_frame() doesn't go through a dict per row.
+    The outlet and versions columns are written only if some article has them.
+    '''
+    def __init__(self, articles=()):
+        self.columns = {column: [] for column in ARTICLE_COLUMNS}
+        for article in articles:
+            self.append(article)
+
+    def __len__(self):
+        return len(self.columns['file_path'])
+
+    def append(self, article):
+        for column, values in self.columns.items():
+            values.append(getattr(article, column))
+
+    def to_frame(self):
+        columns = dict(self.columns)
+        # the csvs have always had the keywords as lists: "['a', 'b']"
+        columns['keywords'] = [list(keywords) for keywords in columns['keywords']]
+        for column in OPTIONAL_COLUMNS:
+            if all(value is None for value in columns[column]):
+                del columns[column]
+        return pd.DataFrame(columns)
+
+
+class MemoryReader:
+    '''A reader (see BaseExtractor.reader) of the pages which are already in memory.'''
+    def __init__(self, pages=None):
+        self.pages = pages or {}
+
+    def __contains__(self, file_path):
+        return file_path in self.pages
+
+    def paths(self):
+        return iter(self.pages)
+
+    def read(self, file_path):
+        try:
+            return self.pages[file_path]
+        except KeyError:
+            raise FileNotFoundError(file_path)
+
+    def size(self, file_path):
+        return len(self.pages[file_path])
+
 
 class BaseExtractor(ABC):
+    field_methods = FIELD_METHODS
+    # class -> {field: version}, the source code of a class doesn't change while running
+    _versions = {}
+
     def __init__(self):
         self.format_str = UNIFIED_PARSE_DATE
         self.date_str_format = None
+        # an object with a read(file_path) method (page_store.PageStore, corpus_pack.PackReader);
+        # if None, pages are read from plain files
+        self.reader = None
+        # decompose every soup after the extraction, see release()
+        self.release_soups = False
     
     def normalize_path(self, file_path):
         if file_path.startswith('../data/'):
@@ -30,11 +145,21 @@ class BaseExtractor(ABC):
         except ValueError:
             return None
     
+    def read_html(self, file_path):
+        """Reads the page either from the reader (if set) or from a plain file."""
+        if self.reader is not None:
+            html = self.reader.read(file_path)
+            if not isinstance(html, str):
+                # packs hand out zero-copy byte views, decode them directly
+                html = str(html, 'utf-8')
+            return html
+        with open(file_path, encoding='utf-8') as fp:
+            return fp.read()
+
     def make_soup(self, file_path):
         """Reads a file and returns a BeautifulSoup object."""
         try:
-            with open(file_path, encoding='utf-8') as fp:
-                html = fp.read()
+            html = self.read_html(file_path)
             return BeautifulSoup(html, "html.parser")
         except FileNotFoundError:
             print(f"File not found: {file_path}")
@@ -46,28 +171,86 @@ class BaseExtractor(ABC):
     def extract(self, file_path):
         """Extract article information from the HTML."""
         soup = self.make_soup(file_path)
-        article_body = self.find_article_body(soup)
-        if not article_body:
+        try:
+            values = self.extract_fields(soup, file_path)
+        finally:
+            if self.release_soups:
+                self.release(soup)
+        if values is None or not values['article_body']:
             return None
-        
-        title = self.find_title(soup)
-        parsed_date = self.parse_date(self.find_date(soup))
-        abstract = self.find_abstract(soup)
-        keywords = self.find_keywords(soup)
-        genre = self.find_genre(soup)
-        author = self.find_author(soup)
+        return Article(
+            **values,
+            file_path=self.normalize_path(file_path),
+            versions=self.versions_json(),
+        )
+
+    def release(self, soup):
+        """
+        Frees the soup right away. A soup is full of reference cycles (parent <-> children),
+        so without this it waits for the garbage collector, and a long run piles them up.
+        (soup.decompose() on the BeautifulSoup object itself doesn't free its children.)
+        The fields are plain strings, they don't keep the soup alive.
+        It costs about 6% of the extraction time, so extract() calls it only if
+        release_soups is set (the parse runs set it with a memory limit).
+        """
+        if soup is not None:
+            for element in list(soup.contents):
+                element.decompose()
 
+    def field_getters(self, soup, file_path):
+        """
+        Returns {field: a function computing the field} for the page,
+        or None if the page is not an article.
+        Override it if the fields don't come from find_*(soup) (and FIELD_METHODS too).
+        """
         return {
-            "title": title,
-            "date_published": parsed_date,
-            "abstract": abstract,
-            "article_body": article_body,
-            "keywords": keywords,
-            "genre": genre,
-            "author": author,
-            "file_path": self.normalize_path(file_path),
-        }  
-    
+            'article_body': lambda: self.find_article_body(soup),
+            'title': lambda: self.find_title(soup),
+            'date_published': lambda: self.parse_date(self.find_date(soup)),
+            'abstract': lambda: self.find_abstract(soup),
+            'keywords': lambda: self.find_keywords(soup),
+            'genre': lambda: self.find_genre(soup),
+            'author': lambda: self.find_author(soup),
+        }
+
+    def extract_fields(self, soup, file_path, fields=None):
+        """
+        Computes only the `fields` (all by default) of the page, e.g. the fields
+        whose extractor code has changed (see parse_and_save.reextract).
+        The article body goes first: without it the page is not an article.
+        Returns {field: value} or None if the page is not an article.
+        """
+        getters = self.field_getters(soup, file_path)
+        if getters is None:
+            return None
+        values = {}
+        for field in fields or self.field_methods:
+            values[field] = getters[field]()
+            if field == 'article_body' and not values[field]:
+                return None
+        return values
+
+    def versions(self) -> dict:
+        """
+        {field: version}: a short hash of the source code of the methods the field
+        comes from (field_methods) and of field_getters, as defined for this extractor.
+        Helpers called by these methods (e.g. _remove_html_tags) are not covered:
+        list them in field_methods if their changes should re-extract the field.
+        """
+        cls = type(self)
+        if cls not in BaseExtractor._versions:
+            versions = {}
+            for field, methods in self.field_methods.items():
+                digest = hashlib.sha1(_source(cls.field_getters).encode('utf-8'))
+                for method in methods:
+                    digest.update(_source(getattr(cls, method)).encode('utf-8'))
+                versions[field] = digest.hexdigest()[:8]
+            BaseExtractor._versions[cls] = versions
+        return BaseExtractor._versions[cls]
+
+    def versions_json(self) -> str:
+        return json.dumps(self.versions(), sort_keys=True, separators=(',', ':'))
+
     @abstractmethod
     def find_title(self, soup) -> str:
         pass
@@ -110,4 +293,12 @@ class BaseExtractor(ABC):
         cleaned_text = cleaned_text.replace('\xa0', ' ').replace('<0xa0>', ' ') 
         cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
         cleaned_text = cleaned_text.replace('\xa0', ' ').replace('<0xa0>', ' ')
-        return cleaned_text
\ No newline at end of file
+        return cleaned_text
+
+
+def _source(function):
+    try:
+        return inspect.getsource(function)
+    except (OSError, TypeError):
+        # no source (e.g. a compiled module): the name at least
+        return function.__qualname__
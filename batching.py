@@ -0,0 +1,89 @@
+'''
+Length-bucketed batching for the NLP stages (spacy_resolve, maverick_driver, ...).
+
+The articles are sorted by their number of tokens and cut into batches under a token
+budget, so a batch holds articles of about the same length: a transformer pads every
+text of a batch to the longest one, and a short brief batched with a long analysis
+costs as much as two long analyses. The cost of a batch is counted the same way,
+longest text * number of texts, which keeps the peak memory of one batch bounded.
+The results are put back into the input order.
+'''
+import heapq
+import itertools
+
+TOKEN_BUDGET = 8_000  # padded tokens per batch
+WINDOW = 1_000  # how many articles are read ahead and sorted at once
+
+_tie = itertools.count()  # the results don't have to be comparable in the heap
+
+
+def count_tokens(text) -> int:
+    '''A cheap estimate of the number of tokens; it's only used to sort and group.'''
+    return len(text.split())
+
+
+def token_batches(items, token_budget=TOKEN_BUDGET, max_items=None, window=WINDOW, key=count_tokens):
+    '''
+    Input: items -- an iterable of texts (or of anything `key` can count the tokens of).
+           token_budget -- the maximum of longest * number of items in a batch;
+               an item longer than the budget gets a batch of its own.
+           max_items -- the maximum number of items in a batch (no limit by default).
+           window -- the items are read, sorted and batched `window` at a time,
+               so a stream is never read whole; None sorts all the items at once.
+    Output: yields batches, lists of (index, item) where index is the position of the item
+            in the input. In a window the longest items come first, so the heaviest
+            batches don't end up at the tail of a run.
+    '''
+    iterator = enumerate(items)
+    while True:
+        chunk = list(itertools.islice(iterator, window)) if window else list(iterator)
+        if not chunk:
+            return
+        chunk.sort(key=lambda indexed: key(indexed[1]), reverse=True)
+
+        batch, longest = [], 0
+        for index, item in chunk:
+            n_tokens = key(item)
+            # sorted longest first, so the first item of a batch is the longest one
+            longest = longest or n_tokens
+            if batch and (
+                longest * (len(batch) + 1) > token_budget
+                or (max_items and len(batch) >= max_items)
+            ):
+                yield batch
+                batch, longest = [], n_tokens
+            batch.append((index, item))
+        if batch:
+            yield batch
+        if not window:
+            return
+
+
+def in_order(indexed_results):
+    '''
+    Takes (index, result) pairs in any order, yields the results in the order of the indices
+    as soon as the next one is there. Only the results which came too early are kept.
+    '''
+    waiting = []
+    next_index = 0
+    for index, result in indexed_results:
+        heapq.heappush(waiting, (index, next(_tie), result))
+        while waiting and waiting[0][0] == next_index:
+            yield heapq.heappop(waiting)[2]
+            next_index += 1
+    # the input had gaps: give the rest in order anyway
+    while waiting:
+        yield heapq.heappop(waiting)[2]
+
+
+def map_batched(process_batch, items, token_budget=TOKEN_BUDGET, max_items=None, window=WINDOW, key=count_tokens):
+    '''
+    Runs process_batch(list of items) -> list of results over the length-bucketed batches
+    and yields the results in the order of `items`.
+    '''
+    def indexed_results():
+        for batch in token_batches(items, token_budget, max_items, window, key):
+            results = process_batch([item for _, item in batch])
+            yield from zip((index for index, _ in batch), results)
+
+    return in_order(indexed_results())
@@ -0,0 +1,65 @@
+'''
+Throughput of the extractors: the golden pages (fixtures/golden, see golden.py)
+are copied to a temporary folder `n_docs` times in total, keeping the paths of the datasets,
+and parsed with run_all's batches on a pool of 1, 2, 4... workers.
+Prints docs/s, MB/s and the speedup over one worker for every pool size.
+
+works like this: python bench_extractors.py [<n_docs> [<max_workers>]]
+'''
+from concurrent.futures import ProcessPoolExecutor
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from golden import GOLDEN_DIR, golden_pages
+from run_all import make_batches, parse_batch
+
+
+def replicate(out_dir, n_docs):
+    '''
+    Copies the golden pages into out_dir/<copy>/... until there are n_docs of them.
+    Returns the (size, dataset_name, file_path) tasks of run_all.make_batches.
+    '''
+    pages = golden_pages()
+    tasks = []
+    for i in range(n_docs):
+        dataset_name, page_path = pages[i % len(pages)]
+        relative_path = os.path.relpath(page_path, GOLDEN_DIR)
+        # a folder per copy, above the file's own folders (euractiv takes the genre from them)
+        head, tail = os.path.split(relative_path)
+        file_path = os.path.join(out_dir, head, str(i // len(pages)), tail)
+        if dataset_name == 'euractiv':
+            genre_dir, article_dir = os.path.split(head)
+            file_path = os.path.join(out_dir, genre_dir, f'{article_dir}-{i // len(pages)}', tail)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        shutil.copyfile(page_path, file_path)
+        tasks.append((os.path.getsize(file_path), dataset_name, file_path))
+    return tasks
+
+
+def bench(tasks, workers):
+    start = time.perf_counter()
+    articles = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for results in pool.map(parse_batch, make_batches(tasks)):
+            articles += sum(result[3] is not None for result in results)
+    return time.perf_counter() - start, articles
+
+
+if __name__ == '__main__':
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        tasks = replicate(out_dir, n_docs)
+        megabytes = sum(size for size, _, _ in tasks) / 1024 / 1024
+        print(f'{n_docs} docs ({megabytes:.1f} MB) of {len(golden_pages())} golden pages')
+        workers, base = 1, None
+        while workers <= max_workers:
+            seconds, articles = bench(tasks, workers)
+            base = base or seconds
+            print(f'{workers:>3} workers: {n_docs / seconds:8.1f} docs/s, {megabytes / seconds:6.2f} MB/s, '
+                f'x{base / seconds:.2f}, {articles} articles')
+            workers *= 2
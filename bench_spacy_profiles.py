@@ -0,0 +1,92 @@
+'''
+Compares the "fast_cpu" profile of spacy_resolve with the full pipeline:
+docs/sec of both and how much the coref clusters agree -- the F1 of the mentions
+and of the coreference links (pairs of mentions in one cluster), with the full
+pipeline as the reference, and the share of identical resolved texts.
+
+works like this: python bench_spacy_profiles.py <parsed csv> [<n_docs> [<threads>]]
+'''
+import itertools
+import os
+import sys
+import time
+
+# spacy_resolve.NLP is the pipeline of this profile: make it the fast one, the full one is loaded below
+os.environ.setdefault('SPACY_RESOLVE_PROFILE', 'fast_cpu')
+
+import pandas as pd
+
+import spacy_resolve
+from spacy_resolve import get_coref_clusters, load_models, resolve_from_doc
+
+
+def clusters_of(doc):
+    return [
+        {(span.start, span.end) for span in spans}
+        for spans in get_coref_clusters(doc).values()
+    ]
+
+
+def links(clusters):
+    return {
+        pair for cluster in clusters
+        for pair in itertools.combinations(sorted(cluster), 2)
+    }
+
+
+def f1(reference, predicted):
+    if not reference and not predicted:
+        return 1.0
+    true_positive = len(reference & predicted)
+    if not true_positive:
+        return 0.0
+    precision = true_positive / len(predicted)
+    recall = true_positive / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+
+def run(nlp, texts):
+    '''Returns (docs/sec, clusters of every doc, resolved texts).'''
+    start = time.perf_counter()
+    docs = list(nlp.pipe(texts, batch_size=8))
+    resolved = [resolve_from_doc(doc) for doc in docs]
+    seconds = time.perf_counter() - start
+    return len(texts) / seconds, [clusters_of(doc) for doc in docs], resolved
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: <parsed csv> [<n_docs> [<threads>]]')
+        sys.exit(1)
+
+    csv_path = sys.argv[1]
+    n_docs = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    texts = pd.read_csv(csv_path, usecols=['article_body'])['article_body'].dropna()
+    texts = [text for text in texts if text.strip()][:n_docs]
+
+    # the same number of threads for both, otherwise the comparison is about threads
+    fast_nlp = spacy_resolve.NLP if threads is None else load_models('fast_cpu', threads)[0]
+    full_nlp, _ = load_models('full', threads or 1)
+
+    full_speed, full_clusters, full_resolved = run(full_nlp, texts)
+    fast_speed, fast_clusters, fast_resolved = run(fast_nlp, texts)
+
+    mention_f1 = sum(
+        f1(set().union(*full), set().union(*fast))
+        for full, fast in zip(full_clusters, fast_clusters)
+    ) / len(texts)
+    link_f1 = sum(
+        f1(links(full), links(fast))
+        for full, fast in zip(full_clusters, fast_clusters)
+    ) / len(texts)
+    same_text = sum(a == b for a, b in zip(full_resolved, fast_resolved)) / len(texts)
+
+    print(f'{len(texts)} docs, {threads or 1} thread(s)')
+    print(f'full: {full_speed:.2f} docs/s, fast_cpu: {fast_speed:.2f} docs/s '
+        f'({fast_speed / full_speed:.1f}x)'
+    )
+    print(f'agreement: mention F1 {mention_f1:.3f}, link F1 {link_f1:.3f}, '
+        f'identical resolved texts {same_text:.1%}'
+    )
@@ -0,0 +1,152 @@
+'''
+Compares the span-rewrite engine (span_rewrite.splice_tokens) with the
+token-by-token rewriting the resolvers used before, on synthetic articles
+with hundreds of coreference clusters. Checks that the outputs are identical.
+
+works like this: python bench_span_rewrite.py [<n_tokens> <n_clusters>]
+'''
+import random
+import sys
+import time
+
+from maverick_resolve import rewrite_tokens
+from span_rewrite import splice_tokens
+
+
+def legacy_find_nonoverlapping_spans(spans):
+    unique_spans = []
+    p1, p2 = 0, 1
+    span1, span2 = spans[p1], spans[p2]
+    start_, end_ = span1[0], span1[1]
+    while p2 < len(spans):
+        span1, span2 = spans[p1], spans[p2]
+        if span1[0] == span2[0] or span1[1] == span2[1]:
+            end_ = span2[1]
+        else:
+            unique_spans.append((start_, end_))
+            start_, end_ = span2
+        p2 += 1
+        p1 += 1
+    unique_spans.append((start_, end_))
+    return unique_spans
+
+
+def legacy_maverick_rewrite(tokens, spans_of_spans, best_entities):
+    '''maverick_resolve.resolve() before the engine, without picking the best entity.'''
+    token_id2replacement = {}
+    for spans, best_entity in zip(spans_of_spans, best_entities):
+        if best_entity is None:
+            continue
+        unique_spans = legacy_find_nonoverlapping_spans(spans)
+        for span in unique_spans:
+            is_possesive = False
+            start, end = span
+            if best_entity in ' '.join(tokens[start: end + 1]):
+                continue
+            if tokens[end] in ["’s", "'s"]:
+                is_possesive = True
+            token_id2replacement[start] = best_entity
+            if start == end and (tokens[start] in [
+                "its", "their", "hers", "his", "our", "my", "yours",
+            ]):
+                token_id2replacement[start] = best_entity + "'s"
+            start += 1
+            while start <= end:
+                token_id2replacement[start] = ""
+                start += 1
+            if is_possesive:
+                token_id2replacement[end] = "'s"
+
+    new_tokens = []
+    for ind, token in enumerate(tokens):
+        if ind in token_id2replacement:
+            new_token = token_id2replacement[ind]
+            if not new_token.strip():
+                continue
+            new_tokens.append(new_token)
+        else:
+            new_tokens.append(token)
+    return new_tokens
+
+
+def legacy_spacy_rewrite(tokens, modifications):
+    '''spacy_resolve.replace_all_references_with_entities() before the engine.'''
+    modifications = sorted(modifications, key=lambda x: x[0], reverse=True)
+    result_tokens = tokens.copy()
+    for start, end, replacement in modifications:
+        if start < len(result_tokens):
+            result_tokens[start] = replacement
+            for i in range(start+1, end):
+                if i < len(result_tokens):
+                    result_tokens[i] = ""
+    return [tok for tok in result_tokens if tok.strip()]
+
+
+def spacy_rewrite(tokens, modifications):
+    modifications = sorted(modifications, key=lambda x: x[0], reverse=True)
+    return splice_tokens(tokens, modifications, drop_blank_tokens=True)
+
+
+def make_article(n_tokens, n_clusters, rng):
+    '''
+    Tokens and clusters of mentions of 1-4 tokens; about every tenth mention
+    has a nested mention in the same cluster, like "Sweden" in "Sweden ’s".
+    Mentions of different clusters don't overlap, so the old code gives the same output.
+    '''
+    vocabulary = ['Sweden', 'the', 'government', 'its', 'said', "’s", 'NATO', ',', '.', 'it']
+    tokens = [rng.choice(vocabulary) for _ in range(n_tokens)]
+    mentions = []
+    position = 0
+    while position < n_tokens - 4:
+        length = rng.randint(0, 3)
+        mention = [(position, position + length)]
+        if rng.random() < 0.1:
+            mention.append((position, position))
+        mentions.append(mention)
+        position += length + rng.randint(2, 12)
+    rng.shuffle(mentions)
+
+    spans_of_spans, best_entities = [], []
+    per_cluster = max(len(mentions) // n_clusters, 2)
+    for cluster in range(n_clusters):
+        cluster_mentions = mentions[cluster * per_cluster:(cluster + 1) * per_cluster]
+        if len(cluster_mentions) < 2:
+            break
+        spans_of_spans.append(sorted(span for mention in cluster_mentions for span in mention))
+        best_entities.append(None if cluster % 10 == 0 else f'Entity {cluster}')
+    return tokens, spans_of_spans, best_entities
+
+
+def timeit(func, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == '__main__':
+    n_tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_clusters = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    rng = random.Random(42)
+
+    for size in (n_tokens // 10, n_tokens, n_tokens * 10):
+        tokens, spans_of_spans, best_entities = make_article(size, n_clusters, rng)
+        legacy_time, legacy = timeit(legacy_maverick_rewrite, tokens, spans_of_spans, best_entities)
+        engine_time, engine = timeit(rewrite_tokens, tokens, spans_of_spans, best_entities)
+        assert legacy == engine, 'maverick outputs differ'
+
+        modifications = [
+            (start, end + 1, best_entity or 'X')
+            for spans, best_entity in zip(spans_of_spans, best_entities)
+            for start, end in spans
+        ]
+        spacy_legacy_time, spacy_legacy = timeit(legacy_spacy_rewrite, tokens, modifications)
+        spacy_engine_time, spacy_engine = timeit(spacy_rewrite, tokens, modifications)
+        assert spacy_legacy == spacy_engine, 'spacy outputs differ'
+
+        print(f'{size} tokens, {n_clusters} clusters: '
+            f'maverick {legacy_time * 1000:.2f} ms -> {engine_time * 1000:.2f} ms, '
+            f'spacy {spacy_legacy_time * 1000:.2f} ms -> {spacy_engine_time * 1000:.2f} ms'
+        )
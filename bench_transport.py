@@ -0,0 +1,71 @@
+'''
+Compares the scraper's transport (transport.py) with how the scraper downloaded pages
+before, against a local HTTP/1.1 server with keep-alive and gzip:
+a new connection per request, a default requests.Session (buffering response.text),
+and Transport.get / Transport.download (streaming to disk), with `threads` threads.
+Prints pages/s and the peak memory of the Python objects (tracemalloc).
+
+works like this: python bench_transport.py [<n_pages> [<page_kb> [<threads>]]]
+'''
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import requests
+
+from local_server import make_server
+from transport import Transport
+
+
+def no_pool(url, path):
+    response = requests.get(url, timeout=10)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(response.text)
+
+
+def bench(name, fetch, urls, out_dir, threads):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(fetch, urls, [os.path.join(out_dir, f'{i}.html') for i in range(len(urls))]))
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:<32} {len(urls) / seconds:8.1f} pages/s, peak {peak / 1024 / 1024:6.1f} MB')
+
+
+if __name__ == '__main__':
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    page_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+
+    server = make_server(page_kb)
+    urls = [f'http://127.0.0.1:{server.server_port}/{i}' for i in range(n_pages)]
+    print(f'{n_pages} pages of {page_kb} KB, {threads} threads')
+
+    session = requests.Session()
+
+    def default_session(url, path):
+        response = session.get(url, timeout=10)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(response.text)
+
+    transport = Transport()
+
+    def transport_get(url, path):
+        response = transport.get(url)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(response.text)
+
+    def transport_download(url, path):
+        transport.download(url, path)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        bench('new connection per request', no_pool, urls, out_dir, threads)
+        bench('default Session, response.text', default_session, urls, out_dir, threads)
+        bench('Transport.get, response.text', transport_get, urls, out_dir, threads)
+        bench('Transport.download (streamed)', transport_download, urls, out_dir, threads)
+    server.shutdown()
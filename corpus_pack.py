@@ -0,0 +1,134 @@
+import json
+import mmap
+import os
+import sys
+
+from tqdm import tqdm
+
+from file_discovery import discover_files
+
+
+class PackReader:
+    '''
+    Reads html pages from a pack: one file with all the pages of a dataset
+    concatenated (<name>.pack) and an offset index (<name>.pack.idx).
+
+    The pack is memory-mapped, so reading a page doesn't open a file or walk
+    a directory: read() returns a memoryview into the mapping (no copy),
+    BaseExtractor.make_soup() decodes it straight away.
+
+    Pages are addressed by the same paths glob would have given for the dataset
+    (the paths in the index are relative to `root`), so the file paths in the
+    parsed data don't depend on where the pages were read from.
+    '''
+    def __init__(self, pack_path, root):
+        self.pack_path = pack_path
+        self.root = root
+        with open(index_path(pack_path), encoding='utf-8') as fp:
+            self.index = json.load(fp)
+
+        self.fp = open(pack_path, 'rb')
+        if os.path.getsize(pack_path):
+            self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.mm = b''  # an empty file can't be mapped
+        self.view = memoryview(self.mm)
+
+    def __repr__(self):
+        return f'<PackReader>, pack: {self.pack_path}, pages: {len(self.index)}'
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, file_path):
+        return self.key(file_path) in self.index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def key(self, file_path):
+        return os.path.relpath(file_path, self.root)
+
+    def paths(self):
+        '''Yields file paths in the order they were packed (the order on disk).'''
+        for key in self.index:
+            yield os.path.join(self.root, key)
+
+    def read(self, file_path) -> memoryview:
+        '''
+        Returns a zero-copy view of the page bytes. Raises FileNotFoundError for unknown pages.
+        The view points into the mapping: decode or copy it (bytes(view)) before close().
+        '''
+        entry = self.index.get(self.key(file_path))
+        if entry is None:
+            raise FileNotFoundError(file_path)
+        offset, length = entry
+        return self.view[offset:offset + length]
+
+    def size(self, file_path) -> int:
+        return self.index[self.key(file_path)][1]
+
+    def close(self):
+        '''
+        Unmaps the pack. Raises BufferError while a view returned by read() is still alive
+        (the mapping can't be closed under it): release the views or drop them first.
+        '''
+        self.view.release()
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.fp.close()
+
+
+def index_path(pack_path):
+    return f'{pack_path}.idx'
+
+
+def build_pack(files, root, pack_path):
+    '''
+    Concatenates the files into one pack and writes the offset index next to it.
+    Input: files -- an iterable of file paths (e.g. from glob).
+           root -- the directory the index paths are relative to.
+           pack_path -- where to write the pack.
+    Output: the number of packed files.
+    '''
+    os.makedirs(os.path.dirname(pack_path) or '.', exist_ok=True)
+    index = {}
+    tmp_pack = f'{pack_path}.tmp'
+    with open(tmp_pack, 'wb') as out:
+        for file_path in tqdm(files, desc="Packing files", unit="file"):
+            with open(file_path, 'rb') as fp:
+                data = fp.read()
+            index[os.path.relpath(file_path, root)] = (out.tell(), len(data))
+            out.write(data)
+
+    tmp_index = f'{index_path(pack_path)}.tmp'
+    with open(tmp_index, 'w', encoding='utf-8') as fp:
+        json.dump(index, fp, ensure_ascii=False)
+    # replace both only when everything is written, so a crash doesn't leave a broken pack
+    os.replace(tmp_pack, pack_path)
+    os.replace(tmp_index, index_path(pack_path))
+    return len(index)
+
+
+if __name__ == '__main__':
+    'works like this: from the folder "code" python corpus_pack.py <dataset_name>'
+    from parse_and_save import DATASET_CONFIG, dataset_root, default_pack_path
+
+    if len(sys.argv) < 2:
+        print('Usage: <dataset name>')
+        sys.exit(1)
+
+    dataset_name = sys.argv[1]
+    if dataset_name not in DATASET_CONFIG:
+        print(f"Dataset {dataset_name} is not supported")
+        sys.exit(1)
+
+    root = dataset_root(dataset_name)
+    path_schema = DATASET_CONFIG[dataset_name]['path_schema']
+    files = discover_files(root, path_schema)
+    pack_path = DATASET_CONFIG[dataset_name].get('pack') or default_pack_path(dataset_name)
+    packed = build_pack(files, root, pack_path)
+    print(f'Packed {packed} files into {pack_path}')
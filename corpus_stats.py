@@ -0,0 +1,307 @@
+'''
+Pre-computed statistics of the parsed corpus, so "articles per month per outlet" or
+"top keywords per year" don't need the full csvs loaded into pandas every time.
+
+The rollups are kept by dataset x outlet x month in one sqlite file:
+    months   -- articles and tokens
+    keywords -- keyword frequencies
+    authors  -- articles per author
+    genres   -- articles per genre
+and the file paths of the counted articles with their dataset, so an update only adds
+the new articles of a csv (the csvs of parse_and_save.py / run_all.py are appended to)
+and --rebuild forgets exactly what the dataset added. The reports sum the datasets up per outlet.
+The mixed dataset is not counted: it holds the same pages as the datasets of the outlets.
+The periods are the ones of the site (docs/): 2010-2014, 2015-2019, 2020-2025.
+
+works like this: from the folder "code"
+    python corpus_stats.py update all | <dataset_name> ...
+    python corpus_stats.py report [--outlet OUTLET] [--period 2015-2019] [--top N]
+'''
+import argparse
+import ast
+from collections import Counter
+import os
+import sqlite3
+
+import pandas as pd
+
+from batching import count_tokens
+
+STATS_PATH = '../data/parsed_data/corpus_stats.sqlite'
+PERIODS = {
+    '2010-2014': ('2010-01', '2014-12'),
+    '2015-2019': ('2015-01', '2019-12'),
+    '2020-2025': ('2020-01', '2025-12'),
+}
+UNDATED = ''  # the month of the articles without a date
+CHUNK_SIZE = 2000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS articles (
+    file_path TEXT PRIMARY KEY, dataset TEXT NOT NULL, outlet TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS months (
+    dataset TEXT, outlet TEXT, month TEXT, articles INTEGER, tokens INTEGER,
+    PRIMARY KEY (dataset, outlet, month)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS keywords (
+    dataset TEXT, outlet TEXT, month TEXT, keyword TEXT, n INTEGER,
+    PRIMARY KEY (dataset, outlet, month, keyword)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS authors (
+    dataset TEXT, outlet TEXT, month TEXT, author TEXT, n INTEGER,
+    PRIMARY KEY (dataset, outlet, month, author)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS genres (
+    dataset TEXT, outlet TEXT, month TEXT, genre TEXT, n INTEGER,
+    PRIMARY KEY (dataset, outlet, month, genre)
+) WITHOUT ROWID;
+'''
+# the table of every counted field and the name of its column
+FIELD_TABLES = {'keywords': 'keyword', 'authors': 'author', 'genres': 'genre'}
+
+
+def month_of(date):
+    ''''2024-03-07' -> '2024-03'; anything which is not a date -> UNDATED.'''
+    if isinstance(date, str) and len(date) >= 7 and date[:4].isdigit() and date[5:7].isdigit():
+        return date[:7]
+    return UNDATED
+
+
+def parse_keywords(keywords):
+    '''The keywords of an article: a list/tuple or the "['a', 'b']" string of a csv.'''
+    if isinstance(keywords, (list, tuple)):
+        return keywords
+    if not isinstance(keywords, str) or not keywords.startswith('['):
+        return ()
+    try:
+        return ast.literal_eval(keywords)
+    except (ValueError, SyntaxError):
+        return ()
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+class CorpusStats:
+    '''
+    Input: db_path -- the sqlite file of the rollups (created if needed).
+    add() counts articles, the report methods read the rollups back as DataFrames.
+    '''
+    def __init__(self, db_path=STATS_PATH):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(SCHEMA)
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(articles)')]
+        if 'dataset' not in columns:
+            self.db.close()
+            raise RuntimeError(
+                f'{db_path} has the rollups by outlet only, without the datasets: '
+                'delete it and run "python corpus_stats.py update all" again'
+            )
+
+    def __repr__(self):
+        return f'<CorpusStats>, {self.db_path}'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM articles').fetchone()[0]
+
+    def add(self, dataset, articles):
+        '''
+        Counts the articles (Articles, dicts or csv rows with the columns of a parsed csv)
+        of the dataset; the articles which were already counted are skipped.
+        The outlet is the article's own "outlet" if it has one, the dataset otherwise.
+        Returns the number of the new articles.
+        '''
+        articles = list(articles)
+        new_paths = []
+        months, tokens = Counter(), Counter()
+        counts = {table: Counter() for table in FIELD_TABLES}
+        seen = self._counted([article['file_path'] for article in articles])
+        for article in articles:
+            file_path = article['file_path']
+            if file_path in seen:
+                continue
+            seen.add(file_path)
+            article_outlet = _text(_get(article, 'outlet')) or dataset
+            new_paths.append((file_path, dataset, article_outlet))
+
+            key = (dataset, article_outlet, month_of(article['date_published']))
+            months[key] += 1
+            body = article['article_body']
+            tokens[key] += count_tokens(body) if isinstance(body, str) else 0
+            for keyword in {_text(k) for k in parse_keywords(article['keywords'])} - {None}:
+                counts['keywords'][key + (keyword,)] += 1
+            if author := _text(article['author']):
+                counts['authors'][key + (author,)] += 1
+            if genre := _text(article['genre']):
+                counts['genres'][key + (genre,)] += 1
+
+        with self.db:
+            self.db.executemany('INSERT INTO articles VALUES (?, ?, ?)', new_paths)
+            self.db.executemany(
+                'INSERT INTO months VALUES (?, ?, ?, ?, ?) ON CONFLICT (dataset, outlet, month) DO UPDATE '
+                'SET articles = articles + excluded.articles, tokens = tokens + excluded.tokens',
+                [key + (n, tokens[key]) for key, n in months.items()]
+            )
+            for table, column in FIELD_TABLES.items():
+                self.db.executemany(
+                    f'INSERT INTO {table} VALUES (?, ?, ?, ?, ?) '
+                    f'ON CONFLICT (dataset, outlet, month, {column}) '
+                    'DO UPDATE SET n = n + excluded.n',
+                    [key + (n,) for key, n in counts[table].items()]
+                )
+        return len(new_paths)
+
+    def _counted(self, file_paths):
+        counted = set()
+        # sqlite has a limit on the number of the parameters of a query
+        for start in range(0, len(file_paths), 500):
+            part = file_paths[start:start + 500]
+            counted.update(row[0] for row in self.db.execute(
+                f'SELECT file_path FROM articles WHERE file_path IN ({",".join("?" * len(part))})', part
+            ))
+        return counted
+
+    def update_from_csv(self, csv_path, dataset, chunksize=CHUNK_SIZE):
+        '''Counts the new articles of a parsed csv, chunk by chunk. Returns their number.'''
+        added = 0
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            added += self.add(dataset, chunk.to_dict('records'))
+        return added
+
+    def forget(self, dataset):
+        '''Drops what a dataset added, e.g. before counting a rerun csv from scratch.'''
+        with self.db:
+            for table in ('articles', 'months', *FIELD_TABLES):
+                self.db.execute(f'DELETE FROM {table} WHERE dataset = ?', (dataset,))
+
+    def _where(self, outlet, period):
+        conditions, params = [], []
+        if outlet is not None:
+            conditions.append('outlet = ?')
+            params.append(outlet)
+        if period is not None:
+            if period not in PERIODS:
+                raise ValueError(f'Unknown period: {period}. Available periods: {", ".join(PERIODS)}')
+            conditions.append('month BETWEEN ? AND ?')
+            params.extend(PERIODS[period])
+        return (f'WHERE {" AND ".join(conditions)}' if conditions else ''), params
+
+    def months(self, outlet=None, period=None) -> pd.DataFrame:
+        '''Articles and tokens per outlet and month.'''
+        where, params = self._where(outlet, period)
+        return pd.read_sql_query(
+            f'SELECT outlet, month, SUM(articles) AS articles, SUM(tokens) AS tokens FROM months {where} '
+            'GROUP BY outlet, month ORDER BY outlet, month',
+            self.db, params=params
+        )
+
+    def totals(self, period=None) -> pd.DataFrame:
+        '''Articles and tokens per outlet (undated articles included unless a period is given).'''
+        where, params = self._where(None, period)
+        return pd.read_sql_query(
+            f'SELECT outlet, SUM(articles) AS articles, SUM(tokens) AS tokens FROM months {where} '
+            'GROUP BY outlet ORDER BY outlet',
+            self.db, params=params
+        )
+
+    def top(self, table, outlet=None, period=None, n=10, by_year=False) -> pd.DataFrame:
+        '''
+        The `n` most frequent keywords / authors / genres (table: one of FIELD_TABLES)
+        of the outlet (all outlets by default) in the period, per year if by_year.
+        '''
+        if table not in FIELD_TABLES:
+            raise ValueError(f'Unknown table: {table}. Available tables: {", ".join(FIELD_TABLES)}')
+        column = FIELD_TABLES[table]
+        where, params = self._where(outlet, period)
+        group = 'substr(month, 1, 4)' if by_year else "''"
+        df = pd.read_sql_query(
+            f'SELECT {group} AS year, {column}, SUM(n) AS n FROM {table} {where} '
+            f'GROUP BY year, {column} ORDER BY year, n DESC, {column}',
+            self.db, params=params
+        )
+        df = df.groupby('year', sort=True).head(n).reset_index(drop=True)
+        return df if by_year else df.drop(columns='year')
+
+    def report(self, outlet=None, period=None, n=10) -> str:
+        lines = [f'Period: {period or "all"}, outlet: {outlet or "all"}']
+        totals = self.totals(period)
+        if outlet is not None:
+            totals = totals[totals['outlet'] == outlet]
+        lines.append(totals.to_string(index=False))
+        for table in FIELD_TABLES:
+            lines.append(f'\nTop {table}:')
+            lines.append(self.top(table, outlet, period, n).to_string(index=False))
+        return '\n'.join(lines)
+
+
+def _get(article, key):
+    try:
+        return article[key]
+    except (KeyError, AttributeError):
+        return None
+
+
+def update_datasets(stats, dataset_names):
+    '''
+    Counts the new articles of the parsed csvs of the datasets (see parse_and_save.py).
+    The datasets left out of "all" (mixed) are refused: their pages are counted
+    with the datasets of their outlets already.
+    '''
+    from parse_and_save import ALL_DATASETS, output_paths
+
+    for dataset_name in dataset_names:
+        if dataset_name not in ALL_DATASETS:
+            raise ValueError(
+                f'Dataset {dataset_name} is not counted, available datasets: {", ".join(ALL_DATASETS)}'
+            )
+    for dataset_name in dataset_names:
+        out_path, _ = output_paths(dataset_name)
+        if not os.path.exists(out_path):
+            print(f'{dataset_name}: no parsed data')
+            continue
+        print(f'{dataset_name}: {stats.update_from_csv(out_path, dataset_name)} new articles')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Rollups of the parsed corpus by outlet and month')
+    arg_parser.add_argument('--db', default=STATS_PATH, help='the sqlite file of the rollups')
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    update = commands.add_parser('update', help='count the new articles of the datasets')
+    update.add_argument('datasets', nargs='+', help='"all" or dataset names from parse_and_save.py, except mixed')
+    update.add_argument('--rebuild', action='store_true', help='forget the datasets and count them again')
+    report = commands.add_parser('report', help='print the totals and the top keywords, authors, genres')
+    report.add_argument('--outlet', default=None)
+    report.add_argument('--period', default=None, choices=list(PERIODS))
+    report.add_argument('--top', type=int, default=10)
+    args = arg_parser.parse_args()
+
+    with CorpusStats(args.db) as stats:
+        if args.command == 'update':
+            from parse_and_save import ALL_DATASETS
+
+            dataset_names = ALL_DATASETS if args.datasets == ['all'] else args.datasets
+            for dataset_name in dataset_names:
+                if dataset_name not in ALL_DATASETS:
+                    arg_parser.error(f'Dataset {dataset_name} is not counted (the mixed dataset '
+                        'holds the pages of the other datasets)')
+            if args.rebuild:
+                for dataset_name in dataset_names:
+                    stats.forget(dataset_name)
+            update_datasets(stats, dataset_names)
+        else:
+            print(stats.report(args.outlet, args.period, args.top))
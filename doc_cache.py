@@ -0,0 +1,166 @@
+'''
+An on-disk cache of processed spaCy docs, so the coref heuristics of spacy_resolve
+(identify_entities, _get_head_noun, _is_named_entity, ...) can be rerun over
+a whole dataset without running the transformer again.
+
+The docs are saved in shards of `shard_size` docs (DocBin files, which keep the
+tags, lemmas, entities and the coref span groups), with index.json mapping the key
+of every doc (the file_path of the article) to its shard. Shards are loaded only
+when a doc of the shard is asked for.
+
+works like this:
+    python doc_cache.py build <parsed csv> <cache dir> [<context>] -- run the pipeline once
+    python doc_cache.py resolve <cache dir> <out csv> -- rerun the heuristics on the cache
+'''
+from collections import OrderedDict
+import json
+import os
+import sys
+
+import pandas as pd
+import spacy
+from spacy.tokens import DocBin
+from tqdm import tqdm
+
+SHARD_SIZE = 1000  # docs per shard
+LOADED_SHARDS = 2  # shards kept in memory by get()
+
+
+class DocCache:
+    def __init__(self, cache_dir, vocab=None, shard_size=SHARD_SIZE):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.shard_size = shard_size
+        # the strings are saved in the shards, so a blank vocab can read the docs
+        self.vocab = vocab or spacy.blank('en').vocab
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.index = {}  # key -> [shard, position in the shard]
+        self.shards = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as fp:
+                state = json.load(fp)
+            self.index, self.shards = state['index'], state['shards']
+
+        self.pending_keys, self.pending = [], None
+        self.loaded = OrderedDict()  # shard -> list of docs
+
+    def __repr__(self):
+        return f'<DocCache>, dir: {self.cache_dir}, docs: {len(self)}, shards: {self.shards}'
+
+    def __len__(self):
+        return len(self.index) + len(self.pending_keys)
+
+    def __contains__(self, key):
+        return key in self.index or key in self.pending_keys
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def shard_path(self, shard):
+        return os.path.join(self.cache_dir, f'shard-{shard:05d}.spacy')
+
+    def add(self, key, doc):
+        if self.pending is None:
+            self.pending = DocBin(store_user_data=True)
+        self.pending.add(doc)
+        self.pending_keys.append(key)
+        if len(self.pending_keys) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        '''Writes the pending docs as a new shard and then the index.'''
+        if not self.pending_keys:
+            return
+        self.pending.to_disk(self.shard_path(self.shards))
+        for position, key in enumerate(self.pending_keys):
+            self.index[key] = [self.shards, position]
+        self.shards += 1
+        self.pending_keys, self.pending = [], None
+
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump({'shards': self.shards, 'index': self.index}, fp, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _load_shard(self, shard):
+        if shard in self.loaded:
+            self.loaded.move_to_end(shard)
+            return self.loaded[shard]
+        docs = list(DocBin().from_disk(self.shard_path(shard)).get_docs(self.vocab))
+        self.loaded[shard] = docs
+        if len(self.loaded) > LOADED_SHARDS:
+            self.loaded.popitem(last=False)
+        return docs
+
+    def get(self, key):
+        '''The doc of the key; raises KeyError if it's not in the cache (or not flushed yet).'''
+        shard, position = self.index[key]
+        return self._load_shard(shard)[position]
+
+    def items(self):
+        '''Yields (key, doc) of the whole cache, one shard in memory at a time.'''
+        keys_of_shards = [[] for _ in range(self.shards)]
+        for key, (shard, position) in self.index.items():
+            keys_of_shards[shard].append((position, key))
+        for shard, keys in enumerate(keys_of_shards):
+            if not keys:
+                continue
+            docs = DocBin().from_disk(self.shard_path(shard)).get_docs(self.vocab)
+            keys = dict(keys)
+            for position, doc in enumerate(docs):
+                if position in keys:
+                    yield keys[position], doc
+
+
+def build_cache(records, cache, nlp, batch_size=32):
+    '''
+    Runs the pipeline over the (key, text) records which are not in the cache yet
+    and adds the docs to it. Returns the number of added docs.
+    '''
+    records = [(text, key) for key, text in records if key not in cache]
+    for doc, key in tqdm(
+            nlp.pipe(records, batch_size=batch_size, as_tuples=True),
+            total=len(records), desc="Caching docs", unit="doc"
+        ):
+        cache.add(key, doc)
+    cache.flush()
+    return len(records)
+
+
+def resolve_cached(cache):
+    '''Yields (key, resolved text) for every doc of the cache, without the transformer.'''
+    from spacy_resolve import resolve_from_doc
+    for key, doc in cache.items():
+        yield key, resolve_from_doc(doc)
+
+
+def read_records(csv_path, key_column='file_path', text_column='article_body', context=None):
+    '''(key, text) of a parsed csv; with `context`, only the passages about Sweden.'''
+    from relevance import relevant_text
+    df = pd.read_csv(csv_path, usecols=[key_column, text_column])
+    for key, text in zip(df[key_column], df[text_column]):
+        if isinstance(text, str) and text.strip():
+            yield key, text if context is None else relevant_text(text, context)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4 or sys.argv[1] not in ('build', 'resolve'):
+        print('Usage: build <parsed csv> <cache dir> [<context>] | resolve <cache dir> <out csv>')
+        sys.exit(1)
+
+    if sys.argv[1] == 'build':
+        from spacy_resolve import get_models
+        csv_path, cache_dir = sys.argv[2:4]
+        context = int(sys.argv[4]) if len(sys.argv) > 4 else None
+        nlp = get_models()[0]
+        cache = DocCache(cache_dir, vocab=nlp.vocab)
+        added = build_cache(read_records(csv_path, context=context), cache, nlp)
+        print(f'Added {added} docs, {cache}')
+    else:
+        cache_dir, out_path = sys.argv[2:4]
+        cache = DocCache(cache_dir)
+        resolved = list(tqdm(resolve_cached(cache), total=len(cache), desc="Resolving", unit="doc"))
+        pd.DataFrame(resolved, columns=['file_path', 'resolved_body']).to_csv(out_path, index=False)
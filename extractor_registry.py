@@ -0,0 +1,120 @@
+'''
+Picks the extractor of a page from a cheap fingerprint, so a mixed dump
+(an httrack mirror, Google-cached pages, several outlets in one folder)
+is parsed in one pass, without a full parse per candidate extractor.
+
+The fingerprint of a page is its path and the first `HEAD_CHARS` characters of
+its html: every outlet has a path pattern, the markup classes of its article
+pages and its host names (canonical links, og:url...). The outlet with the
+highest score wins.
+'''
+import re
+import sys
+
+from base_extractor import BaseExtractor, MemoryReader
+from extractors import (
+    SputnikExtractor, UkrinformExtractor, NvExtractor,
+    HromadskeExtractor, KyivPostExtractor, TyzhdenExtractor,
+    EuractivExtractor, KyivPostArchiveExtractor
+)
+
+HEAD_CHARS = 256 * 1024
+PATH_SCORE, MARKER_SCORE, HOST_SCORE = 4, 2, 1
+
+
+class Route:
+    def __init__(self, name, extractor, path_re, markers=(), hosts=()):
+        self.name = name
+        self.extractor = extractor
+        self.path_re = re.compile(path_re)
+        self.markers = markers
+        self.hosts = hosts
+
+    def __repr__(self):
+        return f'<Route>, {self.name}: {self.extractor.__name__}'
+
+    def score(self, file_path, head):
+        score = PATH_SCORE if self.path_re.search(file_path) else 0
+        score += MARKER_SCORE * sum(marker in head for marker in self.markers)
+        score += HOST_SCORE * sum(host in head for host in self.hosts)
+        return score
+
+
+# the order matters on ties: the more specific routes go first
+ROUTES = [
+    Route('kyivpost_archive', KyivPostArchiveExtractor, r'archive[_.]kyivpost',
+          markers=('entry-content', 'pm-item'), hosts=('archive.kyivpost.com',)),
+    Route('kyivpost', KyivPostExtractor, r'www\.kyivpost\.com',
+          markers=('id="section_0"', 'post-info', 'post-author-name'), hosts=('www.kyivpost.com',)),
+    Route('sputnik', SputnikExtractor, r'sputnik',
+          markers=('article__body', 'article__announce-text'),
+          hosts=('sputniknews.com', 'sputniknews.ua', 'sputniknews.ru')),
+    Route('hromadske', HromadskeExtractor, r'hromadske',
+          markers=('s-content', 'c-post-author__name'), hosts=('hromadske.ua',)),
+    Route('nv', NvExtractor, r'(^|/)nv(\.ua)?/',
+          markers=('content_wrapper', 'article__head__additional_published'), hosts=('nv.ua',)),
+    Route('ukrinform', UkrinformExtractor, r'ukrinform',
+          markers=('newsText', 'newsTitle', 'interviewText'),
+          hosts=('www.ukrinform.ua', 'www.ukrinform.net')),
+    Route('tyzhden', TyzhdenExtractor, r'tyzhden',
+          markers=('a-name', 'all-tags'), hosts=('tyzhden.ua',)),
+    Route('euractiv', EuractivExtractor, r'euractiv',
+          markers=('ea-article-body-content', 'metered-article'), hosts=('euractiv.com',)),
+]
+
+
+def route_page(file_path, html, routes=ROUTES, head_chars=HEAD_CHARS):
+    '''
+    Returns the best route for the page or None if nothing matches.
+    Only the head of the page is scanned, unless nothing matches there.
+    '''
+    best, best_score = None, 0
+    for head in (html[:head_chars], html) if len(html) > head_chars else (html,):
+        for route in routes:
+            score = route.score(file_path, head)
+            if score > best_score:
+                best, best_score = route, score
+        if best is not None:
+            return best
+    return None
+
+
+class AutoExtractor:
+    '''
+    An extractor for mixed datasets: routes every page to the extractor of its outlet
+    (see ROUTES) and sets the outlet of the article (Article.outlet).
+    The page is read once: the fingerprint and the extractor use the same html.
+    '''
+    def __init__(self, routes=ROUTES):
+        self.routes = routes
+        self.extractors = {}  # route name -> extractor, created on the first page
+        # the same reader interface as BaseExtractor.reader
+        self.reader = None
+        self.release_soups = False
+
+    # the paths and the reading of the pages are the ones of every extractor
+    normalize_path = BaseExtractor.normalize_path
+    read_html = BaseExtractor.read_html
+
+    def delegate(self, name):
+        '''The extractor of the route `name`, created on the first use.'''
+        if name not in self.extractors:
+            route = next(route for route in self.routes if route.name == name)
+            self.extractors[name] = route.extractor()
+        return self.extractors[name]
+
+    def extract(self, file_path):
+        html = self.read_html(file_path)
+        route = route_page(file_path, html, self.routes)
+        if route is None:
+            return None
+        extractor = self.delegate(route.name)
+        extractor.reader = MemoryReader({file_path: html})
+        extractor.release_soups = self.release_soups
+        try:
+            parsed = extractor.extract(file_path)
+        finally:
+            extractor.reader = None
+        if parsed:
+            parsed.outlet = sys.intern(route.name)
+        return parsed
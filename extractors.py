@@ -1,6 +1,7 @@
+import functools
 import re
 
-from base_extractor import BaseExtractor
+from base_extractor import FIELD_METHODS, BaseExtractor
 
 
 UKR2ENG = {
@@ -15,25 +16,28 @@ class SputnikExtractor(BaseExtractor):
         super().__init__()
         self.date_str_format = '%Y-%m-%dT%H:%M%z'
 
-    def extract(self, file_path):
-        soup = self.make_soup(file_path)
+    field_methods = {
+        **FIELD_METHODS,
+        'article_body': ('find_article_body', '_remove_all_copyright_text'),
+    }
+
+    def field_getters(self, soup, file_path):
         meta = soup.find("div", class_="article__meta")
         body = soup.find("div", class_="article__body")
         footer = soup.find("div", class_="article__footer")
         
         if not meta or not body:
-            return
+            return None
         
         return {
-            "title": self.find_title(soup),
-            "date_published": self.find_date(meta),
-            "abstract": self.find_abstract(soup),
-            "article_body": self.find_article_body(body),
-            "keywords": self.find_keywords(meta, footer),
-            "genre": self.find_genre(meta),
-            "author": self.find_author(meta),
-            "file_path": self.normalize_path(file_path),
-        }            
+            'article_body': lambda: self.find_article_body(body),
+            'title': lambda: self.find_title(soup),
+            'date_published': lambda: self.find_date(meta),
+            'abstract': lambda: self.find_abstract(soup),
+            'keywords': lambda: self.find_keywords(meta, footer),
+            'genre': lambda: self.find_genre(meta),
+            'author': lambda: self.find_author(meta),
+        }
 
     def find_title(self, soup):
         header = soup.find("div", class_="article__header")
@@ -462,6 +466,12 @@ class TyzhdenExtractor(BaseExtractor):
 
 
 class EuractivExtractor(BaseExtractor):
+    field_methods = {
+        **FIELD_METHODS,
+        'article_body': ('find_article_body_and_abstract',),
+        'abstract': ('find_article_body_and_abstract',),
+    }
+
     def __init__(self):
         super().__init__()
         self.date_str_format = '%b %d, %Y'
@@ -523,21 +533,15 @@ class EuractivExtractor(BaseExtractor):
     def find_article_body(self, soup) -> str:
         raise NotImplementedError("Use find_article_body_and_abstract instead")
 
-    def extract(self, file_path) -> dict:
-        soup = self.make_soup(file_path)
-        article_body, abstract = self.find_article_body_and_abstract(soup)
-        if not article_body:
-            return None
-
-        genre = self.find_genre(file_path)
-               
+    def field_getters(self, soup, file_path):
+        # the body and the abstract come from one call
+        body_and_abstract = functools.cache(lambda: self.find_article_body_and_abstract(soup))
         return {
-            "title": self.find_title(soup),
-            "date_published": self.parse_date(self.find_date(soup)),
-            "abstract": abstract,
-            "article_body": article_body,
-            "keywords": self.find_keywords(soup),
-            "genre": genre,
-            "author": self.find_author(soup),
-            "file_path": self.normalize_path(file_path),
-        }  
+            'article_body': lambda: body_and_abstract()[0],
+            'title': lambda: self.find_title(soup),
+            'date_published': lambda: self.parse_date(self.find_date(soup)),
+            'abstract': lambda: body_and_abstract()[1],
+            'keywords': lambda: self.find_keywords(soup),
+            'genre': lambda: self.find_genre(file_path),
+            'author': lambda: self.find_author(soup),
+        }
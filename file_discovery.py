@@ -0,0 +1,162 @@
+import json
+import os
+import re
+
+
+# directories which never contain articles: the scraper's index pages and the page store
+PRUNED_DIRS = frozenset({'index-pages', 'page-store'})
+MAGIC_CHARS = re.compile(r'[*?\[{]')
+
+
+def schema_to_regex(path_schema: str) -> re.Pattern:
+    '''
+    Translates a glob path schema (like "**/*.html" or "[0-9][0-9]/*.html")
+    into a regex matching relative paths, with the same meaning as glob(recursive=True):
+    "**/" matches zero or more directories, "*" and "?" don't match "/".
+    One extension: "{a,b}" matches either alternative, e.g. "*.htm{,l}" (.htm and .html).
+    '''
+    return re.compile(_translate(path_schema) + r'\Z')
+
+
+def _translate(path_schema: str) -> str:
+    out = []
+    i, n = 0, len(path_schema)
+    while i < n:
+        if path_schema.startswith('**/', i):
+            out.append('(?:[^/]*/)*')
+            i += 3
+            continue
+        if path_schema.startswith('**', i):
+            out.append('.*')
+            i += 2
+            continue
+        char = path_schema[i]
+        if char == '*':
+            out.append('[^/]*')
+        elif char == '?':
+            out.append('[^/]')
+        elif char == '[' and (end := path_schema.find(']', i + 2)) != -1:
+            chars = path_schema[i + 1:end]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            out.append(f'[{chars}]')
+            i = end
+        elif char == '{' and (end := path_schema.find('}', i + 1)) != -1:
+            alternatives = path_schema[i + 1:end].split(',')
+            out.append('(?:' + '|'.join(_translate(alternative) for alternative in alternatives) + ')')
+            i = end
+        else:
+            out.append(re.escape(char))
+        i += 1
+    return ''.join(out)
+
+
+def split_schema(path_schema: str) -> tuple:
+    '''
+    Splits the schema into the leading directories without wildcards and the rest:
+    "kyivpost/archive_kyivpost/**/*.html" => ("kyivpost/archive_kyivpost", "**/*.html"),
+    so the walk can start right there.
+    '''
+    parts = path_schema.split('/')
+    prefix = []
+    for part in parts[:-1]:
+        if MAGIC_CHARS.search(part):
+            break
+        prefix.append(part)
+    return '/'.join(prefix), '/'.join(parts[len(prefix):])
+
+
+def discover_files(root, path_schema, cache_path=None, prune=PRUNED_DIRS) -> list:
+    '''
+    Finds the files under `root` matching the glob `path_schema`, like
+    glob.iglob(os.path.join(root, path_schema), recursive=True) does,
+    but with os.scandir() and pruning the `prune` directories during the walk.
+
+    If `cache_path` is given, the listing of every directory is saved there together
+    with the directory's mtime. The next time, a directory whose mtime hasn't changed
+    (nothing was added, removed or renamed in it) costs one stat() instead of a scandir().
+
+    Output: a list of file paths (joined with `root`) in a stable order.
+    '''
+    prefix, rest = split_schema(path_schema)
+    start = os.path.join(root, prefix) if prefix else root
+    pattern = schema_to_regex(rest)
+    # without "**" there's no need to go deeper than the schema itself
+    max_depth = None if '**' in rest else rest.count('/')
+
+    cached_dirs = _load_cache(cache_path, start, prune)
+    listing = {}
+    found = []
+
+    stack = [('', 0)]
+    while stack:
+        rel_dir, depth = stack.pop()
+        dir_path = os.path.join(start, rel_dir) if rel_dir else start
+        try:
+            mtime = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            continue
+
+        cached = cached_dirs.get(rel_dir)
+        if cached is not None and cached[0] == mtime:
+            _, files, subdirs = cached
+        else:
+            files, subdirs = _scan(dir_path, prune)
+        listing[rel_dir] = (mtime, files, subdirs)
+
+        for name in files:
+            rel_path = f'{rel_dir}/{name}' if rel_dir else name
+            if pattern.match(rel_path):
+                found.append(os.path.join(start, rel_path))
+
+        if max_depth is not None and depth >= max_depth:
+            continue
+        # reversed, so the directories are popped in alphabetical order
+        for name in reversed(subdirs):
+            stack.append((f'{rel_dir}/{name}' if rel_dir else name, depth + 1))
+
+    if cache_path:
+        _save_cache(cache_path, start, prune, listing)
+    return found
+
+
+def _scan(dir_path, prune) -> tuple:
+    files, subdirs = [], []
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if entry.name not in prune:
+                        subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+    except OSError as e:
+        print(f'Error scanning {dir_path}: {e}')
+    files.sort()
+    subdirs.sort()
+    return files, subdirs
+
+
+def _load_cache(cache_path, start, prune) -> dict:
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, encoding='utf-8') as fp:
+            cache = json.load(fp)
+    except (OSError, ValueError):
+        return {}
+    # the listing is only valid for the same walk
+    if cache.get('start') != start or cache.get('prune') != sorted(prune):
+        return {}
+    return cache['dirs']
+
+
+def _save_cache(cache_path, start, prune, listing):
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    tmp_path = f'{cache_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fp:
+        json.dump(
+            {'start': start, 'prune': sorted(prune), 'dirs': listing},
+            fp, ensure_ascii=False
+        )
+    os.replace(tmp_path, cache_path)
@@ -0,0 +1,73 @@
+'''
+The golden pages of the extractors: small synthetic pages of every outlet in fixtures/golden,
+laid out like the data folder (in the markup of the real sites, with the paths the datasets have:
+fixtures/golden/<dataset>/... or the configured root and path_schema, see parse_and_save.py)
+and the expected article next to every page (<page>.json, null if the page is not an article).
+They are checked by test_golden_extractors.py and timed by bench_extractors.py.
+
+After an intended change of an extractor, regenerate the expectations and review the diff:
+    python golden.py update
+'''
+import json
+import os
+import sys
+
+from file_discovery import schema_to_regex
+from parse_and_save import ALL_DATASETS, DATASET_CONFIG, PATH
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'golden')
+
+
+def golden_root(dataset_name):
+    '''The folder of the fixtures which the path_schema of the dataset is relative to.'''
+    root = DATASET_CONFIG[dataset_name].get('root', os.path.join(PATH, dataset_name))
+    return os.path.normpath(os.path.join(GOLDEN_DIR, os.path.relpath(root, PATH)))
+
+
+def golden_pages():
+    '''Lists (dataset_name, path of the page) of the fixtures, by the path_schemas of the datasets.'''
+    pages = []
+    for dataset_name in sorted(ALL_DATASETS):
+        root = golden_root(dataset_name)
+        schema_re = schema_to_regex(DATASET_CONFIG[dataset_name]['path_schema'])
+        for dir_path, _, files in sorted(os.walk(root)):
+            pages.extend(
+                (dataset_name, os.path.join(dir_path, name))
+                for name in sorted(files)
+                if not name.endswith('.json')
+                and schema_re.match(os.path.relpath(os.path.join(dir_path, name), root))
+            )
+    return pages
+
+
+def extract(dataset_name, page_path):
+    '''The article of the page as it is compared with the golden json.'''
+    article = DATASET_CONFIG[dataset_name]['extractor']().extract(page_path)
+    if article is None:
+        return None
+    parsed = {
+        field: article[field] for field in ('title', 'date_published', 'abstract', 'article_body',
+                                            'keywords', 'genre', 'author')
+    }
+    # sputnik merges the keywords through a set, their order isn't stable
+    parsed['keywords'] = sorted(parsed['keywords'])
+    return parsed
+
+
+def expected_path(page_path):
+    return f'{page_path}.json'
+
+
+def update():
+    for dataset_name, page_path in golden_pages():
+        with open(expected_path(page_path), 'w', encoding='utf-8') as fp:
+            json.dump(extract(dataset_name, page_path), fp, ensure_ascii=False, indent=2)
+            fp.write('\n')
+        print(f'Updated: {os.path.relpath(expected_path(page_path), GOLDEN_DIR)}')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['update']:
+        print('Usage: python golden.py update')
+        sys.exit(1)
+    update()
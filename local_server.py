@@ -0,0 +1,35 @@
+'''
+A local HTTP/1.1 server with keep-alive and gzip, serving the same utf-8 page at every path
+(with `content_type`): for the transport tests and bench_transport.py.
+'''
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+
+def make_server(page_kb, content_type='text/html; charset=utf-8'):
+    html = ('<p>Sweden joined NATO in 2024.</p>\n' * (page_kb * 1024 // 35)
+        + '<p>Швеція вступила до НАТО.</p>\n').encode('utf-8')
+    compressed = gzip.compress(html)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive
+
+        def do_GET(self):
+            gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+            body = compressed if gzipped else html
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            if gzipped:
+                self.send_header('Content-Encoding', 'gzip')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,193 @@
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import json
+import os
+
+import pandas as pd
+from tqdm import tqdm
+
+from batching import count_tokens, token_batches
+from maverick_resolve import resolve
+from relevance import relevant_text
+
+MODEL_NAME = 'sapienzanlp/maverick-mes-ontonotes'
+BATCH_TOKENS = 20_000  # padded tokens of one task for a worker
+BATCH_ARTICLES = 32
+
+# the model of a worker process, loaded once by _init_worker
+_MODEL = None
+
+
+def _init_worker(model_name, device, threads):
+    '''
+    Runs once in every worker: loads Maverick, so the model is not loaded per article.
+    The torch threads are split between the workers, otherwise every worker
+    starts a thread per core and they fight for the cpu.
+    '''
+    global _MODEL
+    import torch
+    from maverick import Maverick
+
+    torch.set_num_threads(threads)
+    _MODEL = Maverick(hf_name_or_path=model_name, device=device)
+
+
+def resolve_batch(batch):
+    '''
+    Runs in a worker: Maverick predict() + resolve() for a batch of (article_id, text).
+    Output: a list of (article_id, resolved_text, clusters, error),
+    clusters are the inclusive token offsets of the mentions.
+    '''
+    results = []
+    for article_id, text in batch:
+        if not text:
+            # nothing about Sweden after the pre-filter
+            results.append((article_id, '', [], None))
+            continue
+        try:
+            maverick_out = _MODEL.predict(text)
+            clusters = [
+                [list(span) for span in spans]
+                for spans in maverick_out['clusters_token_offsets']
+            ]
+            results.append((article_id, resolve(maverick_out), clusters, None))
+        except Exception as e:
+            results.append((article_id, None, None, f'{type(e).__name__}: {e}'))
+    return results
+
+
+def make_batches(articles, batch_tokens=BATCH_TOKENS, batch_articles=BATCH_ARTICLES):
+    '''
+    Groups (article_id, text) into batches of articles of about the same length,
+    at most `batch_tokens` padded tokens each (see batching.py).
+    All the articles are sorted at once, longest first: the batches take about
+    the same time, and the longest articles don't end up at the tail of the run
+    with most of the workers idle.
+    '''
+    for batch in token_batches(
+            articles, batch_tokens, batch_articles, window=None,
+            key=lambda article: count_tokens(article[1])
+        ):
+        yield [article for _, article in batch]
+
+
+def load_checkpoint(out_path):
+    '''The ids of the articles which are already in the output (resolved or failed).'''
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding='utf-8') as fp:
+        for line in fp:
+            try:
+                done.add(json.loads(line)['article_id'])
+            except (json.JSONDecodeError, KeyError):
+                # the last line of an interrupted run can be cut off
+                continue
+    return done
+
+
+def drop_partial_line(out_path):
+    '''
+    Cuts the output back to the end of its last complete line, so the records
+    of a resumed run don't get glued onto the cut-off line of an interrupted one.
+    '''
+    if not os.path.exists(out_path):
+        return
+    with open(out_path, 'rb+') as fp:
+        size = fp.seek(0, os.SEEK_END)
+        end = size
+        # read backwards until a newline
+        while end > 0:
+            start = max(0, end - 64 * 1024)
+            fp.seek(start)
+            chunk = fp.read(end - start)
+            newline = chunk.rfind(b'\n')
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        if end != size:
+            fp.truncate(end)
+
+
+def read_articles(csv_path, id_column='file_path', text_column='article_body', chunksize=1000):
+    '''Streams (article_id, text) from a parsed csv, chunk by chunk.'''
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, usecols=[id_column, text_column]):
+        for article_id, text in zip(chunk[id_column], chunk[text_column]):
+            if isinstance(text, str) and text.strip():
+                yield article_id, text
+
+
+def run(articles, out_path, workers=1, model_name=MODEL_NAME, device='cpu', context=None):
+    '''
+    Resolves the articles on `workers` processes and appends
+    {"article_id", "resolved_text", "clusters"} lines to the jsonl `out_path`
+    as the batches come back. The articles which are already in `out_path` are skipped,
+    so an interrupted run continues where it stopped.
+    The articles which failed are written with "error" and are not retried.
+    If `context` is set, only the passages about Sweden are resolved (see relevance.py).
+    '''
+    drop_partial_line(out_path)
+    done = load_checkpoint(out_path)
+    articles = [
+        (article_id, text if context is None else relevant_text(text, context))
+        for article_id, text in articles if article_id not in done
+    ]
+    print(f'{len(done)} articles already resolved, {len(articles)} to resolve')
+    if not articles:
+        return
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    progress = tqdm(total=len(articles), desc="Resolving articles", unit="article")
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    with open(out_path, 'a', encoding='utf-8') as out, ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(model_name, device, threads)
+        ) as pool:
+        pending = set()
+        # keep a couple of batches per worker in flight, not the whole corpus
+        for batch in make_batches(articles):
+            pending.add(pool.submit(resolve_batch, batch))
+            if len(pending) < workers * 2:
+                continue
+            done_futures, pending = wait(pending, return_when=FIRST_COMPLETED)
+            _write(done_futures, out, progress)
+        _write(pending, out, progress)
+    progress.close()
+
+
+def _write(futures, out, progress):
+    for future in futures:
+        for article_id, resolved_text, clusters, error in future.result():
+            record = {'article_id': article_id, 'resolved_text': resolved_text, 'clusters': clusters}
+            if error:
+                record['error'] = error
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            progress.update(1)
+        # the checkpoint is the output itself, so make it reach the disk batch by batch
+        out.flush()
+
+
+def load_resolved(out_path) -> pd.DataFrame:
+    return pd.read_json(out_path, lines=True)
+
+
+if __name__ == '__main__':
+    'works like this: python maverick_driver.py <parsed csv> <out jsonl> [--workers N]'
+    arg_parser = argparse.ArgumentParser(description='Run Maverick coreference over a parsed dataset')
+    arg_parser.add_argument('csv_path', help='a csv from parse_and_save.py')
+    arg_parser.add_argument('out_path', help='the jsonl with the resolved texts')
+    arg_parser.add_argument('--workers', type=int, default=1, help='number of processes')
+    arg_parser.add_argument('--model', default=MODEL_NAME)
+    arg_parser.add_argument('--device', default='cpu')
+    arg_parser.add_argument(
+        '--context', type=int, default=None,
+        help='resolve only the sentences about Sweden with N sentences around them'
+    )
+    args = arg_parser.parse_args()
+
+    run(
+        read_articles(args.csv_path), args.out_path,
+        workers=args.workers, model_name=args.model, device=args.device,
+        context=args.context
+    )
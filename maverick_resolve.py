@@ -3,6 +3,10 @@ import re
 import pandas as pd
 import spacy
 
+from batching import TOKEN_BUDGET, WINDOW, map_batched
+from relevance import relevant_text
+from span_rewrite import drop_conflicting_spans, merge_spans, splice_tokens
+
 
 NLP = spacy.load("en_core_web_sm")
 
@@ -58,41 +62,15 @@ def _is_the_same(cluster: list):
         return True
 
 
-def _is_the_same_span(span1: tuple, span2: tuple) -> bool:
-    start1, end1 = span1
-    start2, end2 = span2
-
-    if start1 == start2:
-        return True
-
-    if end1 == end2:
-        return True
-
-    return False
-
-
 def find_nonoverlapping_spans(spans: tuple) -> list:
     '''
     Sometimes entities are clusterized into a few entities:
     Ukrainian Hetman Ivan Mazepa => 
         [Ukrainian hetman, Ukrainian hetman Ivan Mazepa, Ivan Mazepa].
-    This function merges such spans into one span.
+    This function merges such spans (and any other overlapping or nested spans)
+    into one span.
     '''
-    unique_spans = []
-    p1, p2 = 0, 1
-    span1, span2 = spans[p1], spans[p2]
-    start_, end_ = span1[0], span1[1]
-    while p2 < len(spans):
-        span1, span2 = spans[p1], spans[p2]
-        if _is_the_same_span(span1, span2):
-            end_ = span2[1]
-        else:
-            unique_spans.append((start_, end_))
-            start_, end_ = span2
-        p2 += 1
-        p1 += 1
-    unique_spans.append((start_, end_))
-    return unique_spans
+    return merge_spans(spans, inclusive=True)
 
 
 def detokenize(tokens):
@@ -161,48 +139,72 @@ def resolve(maverick_out: dict) -> str:
     corresponding spans. Picks the best entity in the cluster and replaces all the 
     other entities with that entity for that particular cluster.
     '''
-
-    token_id2replacement = {}
-
     tokens = maverick_out['tokens']
     clusters = maverick_out['clusters_token_text']
     spans_of_spans = maverick_out['clusters_token_offsets']
-    for cluster, spans in zip(clusters, spans_of_spans):
-        # don't do anything with clusters like ['trade', 'trade']
-        if _is_the_same(cluster):
+    # don't do anything with clusters like ['trade', 'trade']
+    best_entities = [
+        None if _is_the_same(cluster) else get_canonical_mention(cluster)
+        for cluster in clusters
+    ]
+    new_tokens = rewrite_tokens(tokens, spans_of_spans, best_entities)
+    return detokenize(new_tokens)
+
+
+def resolve_many(model, texts, token_budget=TOKEN_BUDGET, window=WINDOW, context=None) -> list:
+    '''
+    Runs maverick's predict() and resolve() for many texts, in length-bucketed batches
+    (see batching.py). Maverick predicts one text at a time, so the batches only keep
+    texts of about the same length together. Returns the resolved texts in the order of `texts`.
+    If `context` is set, only the passages about Sweden are resolved (see relevance.py).
+    Empty texts (e.g. nothing relevant) are returned as they are, without a predict().
+    '''
+    if context is not None:
+        texts = (relevant_text(text, context) for text in texts)
+
+    def resolve_batch(batch):
+        return [resolve(model.predict(text)) if text else text for text in batch]
+
+    return list(map_batched(resolve_batch, texts, token_budget, window=window))
+
+
+def rewrite_tokens(tokens: list, spans_of_spans: list, best_entities: list) -> list:
+    '''
+    Replaces the spans of every cluster with its best entity (None -- leave the cluster as is).
+    The spans are inclusive (start, end) token offsets, like maverick returns them.
+    Returns the new list of tokens.
+    '''
+    spans_to_rewrite = []
+    for spans, best_entity in zip(spans_of_spans, best_entities):
+        if best_entity is None:
+            spans_to_rewrite.append([])
             continue
-        best_entity = get_canonical_mention(cluster)
-        unique_spans = find_nonoverlapping_spans(spans)
-        for span in unique_spans:
-            is_possesive = False
-            start, end = span
+        spans_to_rewrite.append([
+            (start, end) for start, end in find_nonoverlapping_spans(spans)
             # if "Ivan Mazepa" (the best entity) is already in 
             # "Ukraine ’s hetman Ivan Mazepa", no need to change anything 
-            if best_entity in  ' '.join(tokens[start: end + 1]):
-                continue
-            if tokens[end] in ["’s", "'s"]:
-                is_possesive = True
-            token_id2replacement[start] = best_entity
+            # (most spans are one token long, those don't need a join)
+            if best_entity not in (
+                tokens[start] if start == end else ' '.join(tokens[start: end + 1])
+            )
+        ])
+    # a span overlapping a span of another cluster would rewrite the same tokens twice
+    spans_to_rewrite = drop_conflicting_spans(spans_to_rewrite, inclusive=True)
+
+    rewrites = []
+    for spans, best_entity in zip(spans_to_rewrite, best_entities):
+        for start, end in spans:
+            replacement = best_entity
             # make a possesive form
             if start == end and (tokens[start] in [
                 "its", "their", "hers", "his", "our", "my", "yours",
             ]):
-                token_id2replacement[start] = best_entity + "'s"
-            start += 1
-            while start <= end:
-                token_id2replacement[start] = ""
-                start += 1
-            if is_possesive:
-                token_id2replacement[end] = "'s"
-
-    new_tokens = []
-    for ind, token in enumerate(tokens):
-        if ind in token_id2replacement:
-            new_token = token_id2replacement[ind]
-            if not new_token.strip():
-                continue
-            new_tokens.append(new_token)
-        else:
-            new_tokens.append(token)
+                replacement = best_entity + "'s"
+            if tokens[end] in ["’s", "'s"]:
+                values = [replacement if replacement.strip() else None] + [None] * (end - start)
+                values[-1] = "'s"
+                rewrites.append((start, end + 1, values))
+            else:
+                rewrites.append((start, end + 1, replacement))
 
-    return detokenize(new_tokens)
+    return splice_tokens(tokens, rewrites)
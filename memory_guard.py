@@ -0,0 +1,199 @@
+'''
+Memory instrumentation for long parse runs:
+- the peak RSS of the run and per extractor (or any other label of the documents),
+- the largest documents: by html size and by the memory their parsing took
+  (the tracemalloc peak while tracing, the RSS growth otherwise),
+- tracemalloc snapshots every `snapshot_every` documents: the lines which allocated
+  the most since the previous snapshot,
+- a soft memory limit: above it, the driver's on_limit() is called (to flush its
+  output) and the garbage collector runs before the next document. The RSS of a
+  process rarely goes back down (freed memory is kept for reuse), so after a flush
+  the limit is re-armed only when the RSS falls `rearm_margin` below it or after
+  `rearm_docs` documents, not flushed again after every document.
+
+works like this (parse_and_save.py):
+    PARSE_MEMORY_LIMIT_MB=2000 PARSE_SNAPSHOT_EVERY=1000 python parse_and_save.py <dataset_name>
+or with run_all.py --memory-limit 2000 --snapshot-every 1000: there the guard watches the
+main process, which buffers the articles ("run_all main process" in the report), and the
+peak RSS of the workers, which parse the pages, is in the report of every dataset.
+'''
+from contextlib import contextmanager
+import gc
+import heapq
+import os
+import sys
+import tracemalloc
+
+try:
+    import psutil
+except ImportError:  # optional: /proc or getrusage work too
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+MB = 1024 * 1024
+TOP_DOCS = 10
+TOP_STATS = 10
+REARM_MARGIN = 0.1  # the limit is re-armed 10% below it
+REARM_DOCS = 1000
+
+
+def peak_rss() -> int:
+    '''The peak resident memory of the process in bytes (0 if unknown).'''
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss() -> int:
+    '''The current resident memory of the process in bytes (the peak if it can't be read).'''
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+class MemoryGuard:
+    '''
+    Input: name -- the name of the run (a dataset) for the report.
+           soft_limit_mb -- the RSS above which on_limit() and gc.collect() run (None: no limit).
+           snapshot_every -- take a tracemalloc snapshot every N documents (0: no tracing).
+           on_limit -- called without arguments when the limit is hit, e.g. to flush the output.
+           rearm_margin, rearm_docs -- after a flush, the limit is hit again only once the RSS
+               has been `rearm_margin` (a fraction) below it or after `rearm_docs` documents.
+    Wrap the parsing of every document in `with guard.document(file_path, size, label):`.
+    '''
+    def __init__(self, name, soft_limit_mb=None, snapshot_every=0, on_limit=None,
+                 top_docs=TOP_DOCS, top_stats=TOP_STATS,
+                 rearm_margin=REARM_MARGIN, rearm_docs=REARM_DOCS):
+        self.name = name
+        self.soft_limit = soft_limit_mb * MB if soft_limit_mb else None
+        self.snapshot_every = snapshot_every
+        self.on_limit = on_limit
+        self.top_docs = top_docs
+        self.top_stats = top_stats
+        self.rearm_margin = rearm_margin
+        self.rearm_docs = rearm_docs
+
+        self.docs = self.reliefs = 0
+        self.peak = 0
+        self.label_peaks = {}  # label -> the peak RSS while parsing its documents
+        self.largest = []  # heaps of (bytes, file_path)
+        self.hungriest = []
+        self.snapshots = []  # the reports of the snapshots
+        self._snapshot = None
+        self._tracing = False
+        self._armed = True
+        self._relieved_at = 0  # self.docs at the last flush
+
+    def __repr__(self):
+        return f'<MemoryGuard>, {self.name}: {self.docs} docs, peak RSS {self.peak / MB:.0f} MB'
+
+    def __enter__(self):
+        if self.snapshot_every and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        return self
+
+    def __exit__(self, *exc):
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    @contextmanager
+    def document(self, file_path, size=0, label=None):
+        '''
+        Measures the parsing of a document. Yields a dict whose 'label' can be set
+        inside the block, when the extractor is known only after the parsing.
+        '''
+        document = {'label': label}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        rss_before = current_rss()
+        yield document
+        rss = current_rss()
+        used = tracemalloc.get_traced_memory()[1] - traced_before if tracing else rss - rss_before
+        self.track(file_path, size, document['label'], rss, used)
+
+    def track(self, file_path, size, label, rss, used=None):
+        '''
+        Records a parsed document: its html size, the RSS after it and the memory it took
+        (None if it's not known, e.g. the document was parsed in another process).
+        '''
+        self.docs += 1
+        self.peak = max(self.peak, rss)
+        if label is not None:
+            self.label_peaks[label] = max(self.label_peaks.get(label, 0), rss)
+        _push(self.largest, (size, file_path), self.top_docs)
+        if used is not None:
+            _push(self.hungriest, (used, file_path), self.top_docs)
+
+        if self.snapshot_every and self.docs % self.snapshot_every == 0 and tracemalloc.is_tracing():
+            self.take_snapshot()
+        if self.soft_limit:
+            if not self._armed and (
+                rss < self.soft_limit * (1 - self.rearm_margin)
+                or self.docs - self._relieved_at >= self.rearm_docs
+            ):
+                self._armed = True
+            if self._armed and rss > self.soft_limit:
+                self.relieve(rss)
+
+    def take_snapshot(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+        if self._snapshot is None:
+            stats = snapshot.statistics('lineno')
+        else:
+            stats = snapshot.compare_to(self._snapshot, 'lineno')
+        self._snapshot = snapshot
+        lines = [f'{self.name}: tracemalloc snapshot after {self.docs} docs'] + [
+            f'  {stat}' for stat in stats[:self.top_stats]
+        ]
+        self.snapshots.append('\n'.join(lines))
+        print(self.snapshots[-1])
+
+    def relieve(self, rss):
+        '''Above the soft limit: the driver flushes what it holds and the garbage is collected.'''
+        self.reliefs += 1
+        self._armed = False
+        self._relieved_at = self.docs
+        if self.on_limit is not None:
+            self.on_limit()
+        gc.collect()
+        print(f'{self.name}: RSS {rss / MB:.0f} MB is over the soft limit '
+            f'{self.soft_limit / MB:.0f} MB, flushed: now {current_rss() / MB:.0f} MB')
+
+    def report(self) -> str:
+        lines = [
+            f'{self.name}: {self.docs} docs, peak RSS {max(self.peak, peak_rss()) / MB:.0f} MB'
+            + (f', {self.reliefs} flushes over the soft limit' if self.reliefs else '')
+        ]
+        for label, peak in sorted(self.label_peaks.items(), key=lambda item: -item[1]):
+            lines.append(f'  {label}: peak RSS {peak / MB:.0f} MB')
+        lines.append('  the largest documents:')
+        lines.extend(f'    {size / 1024:8.0f} KB  {path}' for size, path in sorted(self.largest, reverse=True))
+        if self.hungriest:
+            lines.append('  the documents which took the most memory'
+                + (' (tracemalloc peak):' if self.snapshot_every else ' (RSS growth):'))
+        lines.extend(f'    {used / MB:8.1f} MB  {path}' for used, path in sorted(self.hungriest, reverse=True))
+        return '\n'.join(lines)
+
+
+def _push(heap, item, size):
+    '''Keeps the `size` largest items in the heap.'''
+    if len(heap) < size:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
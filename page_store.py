@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+
+try:
+    import zstandard as zstd
+except ImportError:  # the store is optional, plain files still work without it
+    zstd = None
+
+
+STORE_SUBDIR = 'page-store'
+SEGMENT_SIZE = 64 * 1024 * 1024  # start a new segment after ~64MB of compressed data
+
+
+class PageStore:
+    '''
+    A raw-page store for scraped html.
+
+    Instead of writing one file per article, pages are compressed with zstd and
+    appended to packed segment files (<store_dir>/segment-00000.zst, ...).
+    Every page is an independent zstd frame, so it can be read back without
+    touching its neighbours. An append-only index (index.jsonl) maps a page to
+    (segment, offset, length) and keeps the ETag / Last-Modified headers
+    of the response, so the scraper can ask the site "has this changed?".
+
+    Pages are addressed by the same paths the scraper used to write to
+    (parser.get_file_dest()), so extractors and parse_and_save.py can keep
+    working with "file paths" -- the store just reads them from the segments.
+    '''
+    def __init__(self, source_dir, store_dir=None, segment_size=SEGMENT_SIZE, level=3):
+        if zstd is None:
+            raise RuntimeError('PageStore needs the "zstandard" package: pip install zstandard')
+        self.source_dir = source_dir
+        self.store_dir = store_dir or os.path.join(source_dir, STORE_SUBDIR)
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.index_file = os.path.join(self.store_dir, 'index.jsonl')
+        self.segment_size = segment_size
+
+        self.compressor = zstd.ZstdCompressor(level=level)
+        self.decompressor = zstd.ZstdDecompressor()
+        self.lock = threading.Lock()
+
+        self.index = self._load_index()
+        self.segment = max((entry['segment'] for entry in self.index.values()), default=0)
+
+    def __repr__(self):
+        return f'<PageStore>, source directory: {self.source_dir}, pages: {len(self.index)}'
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, file_path):
+        return self.key(file_path) in self.index
+
+    def key(self, file_path):
+        '''The key of a page is its path relative to the source directory.'''
+        return os.path.relpath(file_path, self.source_dir)
+
+    def paths(self):
+        '''Yields "file paths" of all the stored pages, like glob would do for plain files.'''
+        for key in self.index:
+            yield os.path.join(self.source_dir, key)
+
+    def read(self, file_path) -> str:
+        '''Decompresses the page on the fly. Raises FileNotFoundError for unknown pages.'''
+        entry = self.index.get(self.key(file_path))
+        if entry is None:
+            raise FileNotFoundError(file_path)
+        with open(self._segment_path(entry['segment']), 'rb') as fp:
+            fp.seek(entry['offset'])
+            compressed = fp.read(entry['length'])
+        return self.decompressor.decompress(compressed).decode('utf-8')
+
+    def size(self, file_path) -> int:
+        '''The compressed size of the page, a cheap proxy of its parsing cost.'''
+        return self.index[self.key(file_path)]['length']
+
+    def validators(self, file_path) -> dict:
+        '''
+        Returns the headers for a conditional GET (If-None-Match / If-Modified-Since)
+        or an empty dict if the page is unknown or the site didn't send any validators.
+        '''
+        entry = self.index.get(self.key(file_path))
+        if entry is None:
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, file_path, html, url=None, etag=None, last_modified=None):
+        '''
+        Compresses the page and appends it to the current segment.
+        Re-downloaded pages are appended again and the index points to the newest copy.
+        '''
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        compressed = self.compressor.compress(html)
+        entry = {
+            'key': self.key(file_path),
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched': int(time.time()),
+            'length': len(compressed),
+        }
+        with self.lock:
+            segment_path = self._segment_path(self.segment)
+            if os.path.exists(segment_path) and os.path.getsize(segment_path) >= self.segment_size:
+                self.segment += 1
+                segment_path = self._segment_path(self.segment)
+            with open(segment_path, 'ab') as fp:
+                entry['segment'] = self.segment
+                entry['offset'] = fp.tell()
+                fp.write(compressed)
+            with open(self.index_file, 'a', encoding='utf-8') as fp:
+                fp.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.index[entry['key']] = entry
+
+    def _segment_path(self, segment):
+        return os.path.join(self.store_dir, f'segment-{segment:05d}.zst')
+
+    def _load_index(self) -> dict:
+        index = {}
+        if not os.path.exists(self.index_file):
+            return index
+        with open(self.index_file, encoding='utf-8') as fp:
+            for line in fp:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # a half-written line from an interrupted run, the page will be re-fetched
+                    continue
+                # later lines are newer copies of the same page
+                index[entry['key']] = entry
+        return index
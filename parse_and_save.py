@@ -1,4 +1,4 @@
-import glob
+import json
 import os
 import sys
 
@@ -10,9 +10,17 @@ from extractors import (
     HromadskeExtractor, KyivPostExtractor, TyzhdenExtractor,
     EuractivExtractor, KyivPostArchiveExtractor
 )
+from base_extractor import ArticleColumns
+from corpus_pack import PackReader
+from memory_guard import MemoryGuard
+from extractor_registry import AutoExtractor
+from file_discovery import discover_files
+from page_store import PageStore
 
 PATH = '../data'
 OUT_PATH = os.path.join(PATH, 'parsed_data')
+PACK_PATH = os.path.join(PATH, 'packs')
+LISTING_PATH = os.path.join(OUT_PATH, 'file-listings')
 
 DATASET_CONFIG = {
     'sputnik': {
@@ -34,10 +42,16 @@ DATASET_CONFIG = {
     'kyivpost': {
         'extractor': KyivPostExtractor,
         'path_schema': 'www.kyivpost.com/**/*.html',
+        'out_subdir': 'kyivpost_splitted',
     },
     'kyivpost_archive': {
         'extractor': KyivPostArchiveExtractor,
         'path_schema': 'kyivpost/archive_kyivpost/**/*.html',
+        # the archive lives inside the kyivpost folder, so the schema is relative to PATH
+        'root': PATH,
+        'out_subdir': 'kyivpost_splitted',
+        # the archive is scraped by SimpleScraper('kyivpost');
+        # to read it from the compressed page store, set 'store': 'kyivpost'
     },
     'tyzhden': {
         'extractor': TyzhdenExtractor,
@@ -46,61 +60,93 @@ DATASET_CONFIG = {
     'euractiv': {
         'extractor': EuractivExtractor,
         'path_schema': '**/*.html',
+    },
+    'mixed': {
+        # pages of several outlets in one folder, every page goes to the extractor
+        # of its outlet (see extractor_registry.py)
+        'extractor': AutoExtractor,
+        'path_schema': '**/*.[hH][tT][mM]{,[lL]}',
+        # the same pages as the datasets of the outlets: "all" would parse them twice
+        'in_all': False,
     }
 }
+# Optional keys for every dataset:
+# 'root' -- the directory the path_schema is relative to (PATH/<dataset_name> by default).
+# 'out_subdir' -- a subdirectory of OUT_PATH for the parsed data.
+# 'store' -- the name of the scraper source (a directory in PATH) whose PageStore
+#   holds the pages. If set, the pages are read from the store (see page_store.py).
+# 'pack' -- a path to the pack of the dataset built by corpus_pack.py
+#   (e.g. default_pack_path(dataset_name)). If set, the pages are read from the pack.
+# Otherwise, the pages are read from the directory tree.
+# 'in_all' -- False to leave the dataset out of "all" in the CLIs (ALL_DATASETS).
+ALL_DATASETS = [
+    dataset_name for dataset_name, config in DATASET_CONFIG.items() if config.get('in_all', True)
+]
 
 
-if __name__ == '__main__':
-    'works like this: from the folder "code" python parse_and_save.py <dataset_name>'
-    if len(sys.argv) < 2:
-        print('Usage: <dataset name>')
-        sys.exit(1)
+def dataset_root(dataset_name):
+    '''The directory which the path_schema of the dataset is relative to.'''
+    return DATASET_CONFIG[dataset_name].get('root', os.path.join(PATH, dataset_name))
 
-    dataset_name = sys.argv[1]
-    if dataset_name not in DATASET_CONFIG:
-        print(f"Dataset {dataset_name} is not supported")
-        sys.exit(1)
 
-    rerun = False
-    if len(sys.argv) == 3:
-        if sys.argv[2] == 'rerun':
-            rerun = True
-        else: 
-            print('The second argument is not recognized. '
-                'Use "rerun" to rerun the parsing. '
-                'Continuing without rerun'
-            )
+def default_pack_path(dataset_name):
+    return os.path.join(PACK_PATH, f'{dataset_name}.pack')
 
-    os.makedirs(OUT_PATH, exist_ok=True)
-    if dataset_name == 'kyivpost_archive' or dataset_name == 'kyivpost':
-        OUT_PATH = os.path.join(OUT_PATH, 'kyivpost_splitted')
-        os.makedirs(OUT_PATH, exist_ok=True)
-    
-    out_path = os.path.join(OUT_PATH, f'{dataset_name}.csv')
-    log_path = os.path.join(OUT_PATH, f'{dataset_name}_log.txt')
 
-    extractor = DATASET_CONFIG[dataset_name]['extractor']()
-    path_schema = DATASET_CONFIG[dataset_name]['path_schema']
+def output_paths(dataset_name):
+    '''Returns (out_path, log_path) of the dataset and creates the output directory.'''
+    out_dir = os.path.join(OUT_PATH, DATASET_CONFIG[dataset_name].get('out_subdir', ''))
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, f'{dataset_name}.csv')
+    log_path = os.path.join(out_dir, f'{dataset_name}_log.txt')
+    return out_path, log_path
 
-    filepaths = os.path.join(PATH, dataset_name, path_schema)
-    if dataset_name == 'kyivpost_archive':
-        filepaths = os.path.join(PATH, path_schema)
 
-    files = glob.iglob(filepaths, recursive=True)  # generator cause there might be 10k files
+def make_extractor(dataset_name, release_soups=False):
+    '''
+    Creates the extractor of the dataset, reading from the store or the pack if configured.
+    release_soups -- free every soup right after its extraction (BaseExtractor.release).
+    '''
+    config = DATASET_CONFIG[dataset_name]
+    extractor = config['extractor']()
+    extractor.release_soups = release_soups
+    if store_source := config.get('store'):
+        # pages are decompressed on the fly from the packed segments
+        extractor.reader = PageStore(os.path.join(PATH, store_source))
+    elif pack_path := config.get('pack'):
+        # one memory-mapped file instead of thousands of small ones
+        extractor.reader = PackReader(pack_path, dataset_root(dataset_name))
+    return extractor
 
-    parsed_files, logs = [], []
 
-    # don't load again the files which were already processed
-    processed_files = set()
-    existing_df = None
-    # if rerun, process all files from the top
-    if not rerun:
-        existing_df = pd.read_csv(out_path) if os.path.exists(out_path) else None
-        if existing_df is not None:
-            processed_files = set(existing_df['file_path'])
-    
+def list_files(dataset_name, extractor):
+    '''Lists the pages of the dataset from the extractor's reader or from the directory tree.'''
+    if extractor.reader is not None:
+        return list(extractor.reader.paths())
+    # the listing is cached by directory mtimes, so unchanged trees aren't walked again
+    return discover_files(
+        dataset_root(dataset_name), DATASET_CONFIG[dataset_name]['path_schema'],
+        cache_path=os.path.join(LISTING_PATH, f'{dataset_name}.json')
+    )
+
+
+def load_processed(out_path, rerun=False):
+    '''
+    Returns (existing_df, processed_files): the already parsed data (or None)
+    and the set of its file paths, so they are not processed again.
+    Only the file_path column is loaded: the article bodies are not needed here.
+    If rerun, process all files from the top.
+    '''
+    if rerun or not os.path.exists(out_path):
+        return None, set()
+    existing_df = pd.read_csv(out_path, usecols=['file_path'])
+    return existing_df, set(existing_df['file_path'])
+
+
+def select_files(dataset_name, files, processed_files):
+    '''Yields the files which still have to be parsed.'''
     already_processed = set()  # relevant for "euractiv" only
-    for file_path in tqdm(files, desc="Processing files\n", unit="file"):
+    for file_path in files:
         if 'index-pages' in file_path:
             continue
         article_folder = file_path.split('/')[-2]
@@ -108,34 +154,218 @@ if __name__ == '__main__':
             if article_folder in already_processed:
                 continue
             already_processed.add(article_folder)
-        print(f'Processing file: {file_path}')
         normalized_path = file_path.replace('../data/', '')
         if normalized_path in processed_files:
             print(f'File already processed: {normalized_path}')
             continue
+        yield file_path
+
+
+ERROR_PREFIX = 'Error processing'
+
+
+def parse_file(extractor, file_path):
+    '''
+    Returns (parsed, message): the parsed article or None
+    and a message for the log if something went wrong
+    (see is_error() for telling a failure from a page which is not an article).
+    '''
+    try:
+        parsed = extractor.extract(file_path)
+        if not parsed:
+            return None, f'No valid article data found in {file_path}'
+        return parsed, None
+    except Exception as e:
+        return None, f"{ERROR_PREFIX} {file_path}: {e}"
+
+
+def is_error(message) -> bool:
+    '''
+    True if parse_file failed on the page (a read error, a bug in the extractor...):
+    the page is worth another try, unlike a page without an article.
+    '''
+    return message is not None and message.startswith(ERROR_PREFIX)
+
+
+def save_parsed(parsed_files, out_path, append):
+    '''
+    Writes the parsed articles (an ArticleColumns buffer or a list of Articles)
+    to the csv, appending to the existing data if needed.
+    '''
+    if not isinstance(parsed_files, ArticleColumns):
+        parsed_files = ArticleColumns(parsed_files)
+    df = parsed_files.to_frame()
+    if append:
+        # the rows go under the header the csv already has (e.g. a csv from before
+        # the "versions" column gets the new rows without it)
+        df = df.reindex(columns=pd.read_csv(out_path, nrows=0).columns)
+        df.to_csv(out_path, index=False, mode='a', header=False)
+    else:
+        df.to_csv(out_path, index=False)
+
+
+def stale_fields(versions, current):
+    '''The fields of a row whose version (a json string from the csv) isn't the current one.'''
+    try:
+        versions = json.loads(versions) if isinstance(versions, str) else {}
+    except ValueError:
+        versions = {}
+    return [field for field, version in current.items() if versions.get(field) != version]
+
+
+def reextract(dataset_name):
+    '''
+    Recomputes only the fields whose extractor code has changed since the rows were parsed
+    (see BaseExtractor.versions): the page of such a row is parsed once and only the stale
+    find_* methods are called, the other fields are kept from the csv.
+    The rows without the versions (parsed before they were recorded) are re-extracted whole.
+    The errors go to <dataset>_reextract_log.txt, the log of the parsing is kept.
+    Returns the number of the updated rows.
+    '''
+    out_path, log_path = output_paths(dataset_name)
+    log_path = os.path.join(os.path.dirname(log_path), f'{dataset_name}_reextract_log.txt')
+    if not os.path.exists(out_path):
+        raise ValueError(f'No parsed data for {dataset_name}: {out_path}')
+    df = pd.read_csv(out_path, dtype=object)
+    if 'versions' not in df.columns:
+        df['versions'] = None
+    extractor = make_extractor(dataset_name)
+    updated, logs = 0, []
+
+    for i, row in tqdm(df.iterrows(), total=len(df), desc="Re-extracting", unit="file"):
+        row_extractor = extractor
+        if isinstance(extractor, AutoExtractor):
+            # the mixed dataset: the extractor of the row's outlet
+            row_extractor = extractor.delegate(row['outlet'])
+            row_extractor.reader = extractor.reader
+        current = row_extractor.versions()
+        fields = stale_fields(row['versions'], current)
+        if not fields:
+            continue
+        file_path = os.path.join(PATH, row['file_path'])
+        soup = row_extractor.make_soup(file_path)
         try:
-            parsed = extractor.extract(file_path)
-            if not parsed:
-                message = f'No valid article data found in {file_path}'
-                print(message)
-                logs.append(message)
-                continue
-            parsed_files.append(parsed)
+            values = row_extractor.extract_fields(soup, file_path, fields)
         except Exception as e:
-            message = f"Error processing {file_path}: {e}"
-            print(message)
+            values, message = None, f'Error re-extracting {file_path}: {e}'
+        else:
+            message = f'No valid article data found in {file_path}'
+        if values is None:
+            # the row stays as it was, with its old versions
             logs.append(message)
+            continue
+        for field, value in values.items():
+            if field == 'keywords':
+                # the way the csvs keep the keywords: "['a', 'b']"
+                value = str(list(value or ()))
+            df.at[i, field] = value
+        df.at[i, 'versions'] = row_extractor.versions_json()
+        updated += 1
 
-    if parsed_files:
-        df = pd.DataFrame(parsed_files)
-    else:
-        print('No data to save')
-        sys.exit(1)
-    
-    if existing_df is None:
-        df.to_csv(out_path, index=False)
-    else:
-        df.to_csv(out_path, index=False, mode='a', header=False)
+    if updated:
+        tmp_path = f'{out_path}.tmp'
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, out_path)
+    with open(log_path, 'w', encoding='utf-8') as fp:
+        fp.write('\n'.join(logs))
+    return updated
+
+
+def parse_dataset(dataset_name, rerun=False, memory_limit_mb=None, snapshot_every=0):
+    '''
+    Parses the files of the dataset which are not in its csv yet (all of them if rerun)
+    and appends the articles to the csv. The peak memory, per extractor, and the largest
+    documents are reported at the end (see memory_guard.MemoryGuard); above
+    `memory_limit_mb` the parsed articles are flushed to the csv before going on.
+    Returns the number of the saved articles.
+    '''
+    out_path, log_path = output_paths(dataset_name)
+    # with a memory limit, the soups are freed right away rather than by the garbage collector
+    extractor = make_extractor(dataset_name, release_soups=bool(memory_limit_mb))
+    files = list_files(dataset_name, extractor)
+
+    parsed_files, logs = ArticleColumns(), []
+
+    # don't load again the files which were already processed
+    existing_df, processed_files = load_processed(out_path, rerun)
+    append = existing_df is not None
+    saved = 0
+
+    def flush():
+        nonlocal parsed_files, append, saved
+        if parsed_files:
+            save_parsed(parsed_files, out_path, append=append)
+            append = True
+            saved += len(parsed_files)
+            parsed_files = ArticleColumns()
+
+    guard = MemoryGuard(
+        dataset_name, soft_limit_mb=memory_limit_mb,
+        snapshot_every=snapshot_every, on_limit=flush
+    )
+    with guard:
+        for file_path in tqdm(
+                select_files(dataset_name, files, processed_files),
+                desc="Processing files\n", unit="file"
+            ):
+            print(f'Processing file: {file_path}')
+            with guard.document(file_path, file_size(extractor, file_path)) as document:
+                parsed, message = parse_file(extractor, file_path)
+                # the peaks per extractor; in the mixed dataset, per outlet
+                document['label'] = parsed.outlet if parsed and parsed.outlet else type(extractor).__name__
+            if message:
+                print(message)
+                logs.append(message)
+            if parsed:
+                parsed_files.append(parsed)
+        flush()
 
     with open(log_path, 'w', encoding='utf-8') as fp:
         fp.write('\n'.join(logs))
+    print(guard.report())
+    return saved
+
+
+def file_size(extractor, file_path):
+    if extractor.reader is not None:
+        return extractor.reader.size(file_path)
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+if __name__ == '__main__':
+    'works like this: from the folder "code" python parse_and_save.py <dataset_name> [rerun | reextract]'
+    if len(sys.argv) < 2:
+        print('Usage: <dataset name>')
+        sys.exit(1)
+
+    dataset_name = sys.argv[1]
+    if dataset_name not in DATASET_CONFIG:
+        print(f"Dataset {dataset_name} is not supported")
+        sys.exit(1)
+
+    rerun = False
+    if len(sys.argv) == 3:
+        if sys.argv[2] == 'rerun':
+            rerun = True
+        elif sys.argv[2] == 'reextract':
+            # only the fields whose find_* methods have changed
+            print(f'Updated rows: {reextract(dataset_name)}')
+            sys.exit(0)
+        else: 
+            print('The second argument is not recognized. '
+                'Use "rerun" to rerun the parsing or "reextract" to update the changed fields. '
+                'Continuing without rerun'
+            )
+
+    saved = parse_dataset(
+        dataset_name, rerun,
+        # the memory instrumentation, see memory_guard.py
+        memory_limit_mb=int(os.environ.get('PARSE_MEMORY_LIMIT_MB', 0)) or None,
+        snapshot_every=int(os.environ.get('PARSE_SNAPSHOT_EVERY', 0)),
+    )
+    if not saved:
+        print('No data to save')
+        sys.exit(1)
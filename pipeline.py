@@ -0,0 +1,129 @@
+'''
+Scraping and extraction in one go: every page SimpleScraper downloads is handed
+(in memory, not read back from disk) to a pool of extraction processes running
+the extractor of the dataset, and the parsed articles are appended to the
+dataset's csv as they come.
+
+At most `max_pending` pages wait for the extractors: when the extractors fall
+behind, the scraper blocks on the next page, so the memory stays bounded.
+
+works like this: from the folder "code" python pipeline.py <source> [--workers N]
+'''
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import threading
+import time
+
+from base_extractor import MemoryReader
+from memory_guard import current_rss
+from parse_and_save import PATH, DATASET_CONFIG, make_extractor, parse_file
+from run_all import DatasetRun
+from scraper import SOURCES_CONFIG, SimpleScraper
+from transport import DnsCache
+
+# the scraper sources whose dataset has another name
+SOURCE_DATASETS = {'kyivpost': 'kyivpost_archive'}
+MAX_PENDING = 64  # pages downloaded but not extracted yet
+FLUSH_EVERY = 20  # articles buffered before they are appended to the csv
+
+# extractors of a worker process, created once per dataset
+_EXTRACTORS = {}
+
+
+def extract_page(dataset_name, file_path, html):
+    '''
+    Runs in a worker: parses one downloaded page.
+    Output: (file_path, size, parsed, message, seconds, rss) like run_all.parse_batch.
+    '''
+    start = time.perf_counter()
+    if dataset_name not in _EXTRACTORS:
+        _EXTRACTORS[dataset_name] = make_extractor(dataset_name)
+    extractor = _EXTRACTORS[dataset_name]
+    extractor.reader = MemoryReader({file_path: html})
+    parsed, message = parse_file(extractor, file_path)
+    extractor.reader = None
+    return file_path, len(html), parsed, message, time.perf_counter() - start, current_rss()
+
+
+class ScrapePipeline:
+    '''
+    Input: scraper -- a SimpleScraper; its downloaded pages go to the extractors.
+           dataset_name -- the dataset of the source (see SOURCE_DATASETS).
+           workers -- extraction processes.
+           max_pending -- the bound of the queue between the scraper and the extractors.
+    '''
+    def __init__(self, scraper, dataset_name=None, workers=2, max_pending=MAX_PENDING,
+                 flush_every=FLUSH_EVERY):
+        self.scraper = scraper
+        self.dataset_name = dataset_name or SOURCE_DATASETS.get(scraper.source, scraper.source)
+        if self.dataset_name not in DATASET_CONFIG:
+            raise ValueError(f'No dataset for the source {scraper.source}')
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.output = DatasetRun(self.dataset_name, flush_every=flush_every)
+        self.pool = None
+        self.submitted = 0
+
+    def __enter__(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.scraper.on_page = self.on_page
+        self.output.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.scraper.on_page = None
+        # waits for the pages which are still being extracted
+        self.pool.shutdown(wait=True)
+        with self.lock:
+            self.output.flush()
+        print(self.output.report())
+
+    def file_path(self, filename):
+        '''
+        The path the batch parsing would have for the page ('../data/<source>/...'),
+        so the file_path in the csv is the same whichever way the page was parsed.
+        '''
+        return os.path.join(PATH, os.path.relpath(filename, self.scraper.data_dir))
+
+    def on_page(self, filename, html, link):
+        file_path = self.file_path(filename)
+        if file_path.replace('../data/', '') in self.output.processed_files:
+            print(f'File already processed: {file_path}')
+            return
+        # blocks the scraper while `max_pending` pages wait for the extractors
+        self.slots.acquire()
+        try:
+            future = self.pool.submit(extract_page, self.dataset_name, file_path, html)
+        except Exception:
+            self.slots.release()
+            raise
+        self.submitted += 1
+        future.add_done_callback(self._collect)
+
+    def _collect(self, future):
+        self.slots.release()
+        try:
+            file_path, size, parsed, message, seconds, rss = future.result()
+        except Exception as e:
+            print(f'Extraction failed: {e}')
+            return
+        with self.lock:
+            self.output.add(file_path, size, parsed, message, seconds, rss)
+
+    def run(self):
+        with self:
+            self.scraper.scrape_articles()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Scrape a source and parse the pages as they come')
+    arg_parser.add_argument('source', help=f'one of: {", ".join(SOURCES_CONFIG)}')
+    arg_parser.add_argument('--workers', type=int, default=2, help='extraction processes')
+    arg_parser.add_argument('--max-pending', type=int, default=MAX_PENDING)
+    arg_parser.add_argument('--use-store', action='store_true', help='save the pages into the page store')
+    args = arg_parser.parse_args()
+
+    scraper = SimpleScraper(args.source, use_store=args.use_store, dns_cache=DnsCache())
+    ScrapePipeline(scraper, workers=args.workers, max_pending=args.max_pending).run()
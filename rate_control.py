@@ -0,0 +1,181 @@
+'''
+Adaptive politeness for the scrapers: every host gets its own delay between requests,
+which goes down while the host answers fine and goes up when it throttles us.
+
+The delay follows AIMD (like TCP): the request rate grows by `rate_step` requests/sec
+after every `healthy_streak` good responses, and is halved on 429 / 503 and on
+401 / 403 (the way many sites block a scraper), or cut by a third on other errors.
+Other 4xx responses neither slow down nor speed up the host. A Retry-After header blocks the host for as long as it says.
+The learned delays are saved to a json file, so the next run starts where this one stopped.
+'''
+from email.utils import parsedate_to_datetime
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+THROTTLE_STATUSES = {401, 403, 429, 503}
+
+
+def host_of(url):
+    return urlsplit(url).netloc or url
+
+
+def parse_retry_after(value, now=None):
+    '''Seconds to wait from a Retry-After header (seconds or an HTTP date), None if unparsable.'''
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = now if now is not None else time.time()
+    return max(0.0, retry_at.timestamp() - now)
+
+
+class HostState:
+    def __init__(self, delay):
+        self.delay = delay
+        self.next_allowed = 0.0  # monotonic time of the next request
+        self.blocked_until = 0.0  # set by Retry-After
+        self.streak = 0  # good responses since the last change of the delay
+        self.requests = self.ok = self.throttled = self.errors = 0
+
+
+class RateController:
+    '''
+    Input: state_path -- the json file with the learned delays (None: don't persist).
+           delay -- the delay of a host seen for the first time.
+           min_delay, max_delay -- the bounds of the delay.
+           jitter -- a (low, high) range of random seconds added to every wait,
+               so the requests don't come like clockwork.
+    Thread-safe: wait() reserves the next slot of the host, so threads share a host's rate.
+    '''
+    def __init__(
+            self, state_path=None, delay=2.0, min_delay=0.25, max_delay=1800.0,
+            jitter=(0, 0), rate_step=0.05, healthy_streak=10,
+            clock=time.monotonic, sleep=time.sleep
+        ):
+        self.state_path = state_path
+        self.initial_delay = delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.jitter = jitter or (0, 0)
+        self.rate_step = rate_step
+        self.healthy_streak = healthy_streak
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.load()
+
+    def __repr__(self):
+        return f'<RateController>, hosts: {len(self.hosts)}, state: {self.state_path}'
+
+    def _host(self, url) -> HostState:
+        host = host_of(url)
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.initial_delay)
+        return self.hosts[host]
+
+    def _set_delay(self, state, delay):
+        state.delay = min(self.max_delay, max(self.min_delay, delay))
+        state.streak = 0
+
+    def wait(self, url):
+        '''Sleeps until the host of the url may get the next request.'''
+        with self.lock:
+            state = self._host(url)
+            now = self.clock()
+            slot = max(now, state.next_allowed, state.blocked_until)
+            state.next_allowed = slot + state.delay + random.uniform(*self.jitter)
+            state.requests += 1
+        if slot > now:
+            self.sleep(slot - now)
+
+    def record(self, url, status, headers=None):
+        '''
+        Adjusts the delay of the host to a response.
+        Returns True if the response is good (2xx, 3xx or 404), False if it's worth a retry.
+        '''
+        headers = headers or {}
+        with self.lock:
+            state = self._host(url)
+            retry_after = parse_retry_after(headers.get('Retry-After'))
+            if status in THROTTLE_STATUSES or retry_after is not None:
+                state.throttled += 1
+                self._set_delay(state, state.delay * 2)
+                if retry_after is not None:
+                    state.blocked_until = self.clock() + min(retry_after, self.max_delay)
+                return False
+            if status >= 500:
+                state.errors += 1
+                self._set_delay(state, state.delay * 1.5)
+                return False
+
+            if status >= 400 and status != 404:
+                # a bad request or a gone page says nothing about the host's health
+                return False
+
+            # a missing page is an answer too, the host is fine
+            state.ok += 1
+            state.streak += 1
+            if state.streak >= self.healthy_streak:
+                self._set_delay(state, 1 / (1 / state.delay + self.rate_step))
+            return True
+
+    def record_error(self, url):
+        '''A connection error or a timeout: back off like on a server error.'''
+        with self.lock:
+            state = self._host(url)
+            state.errors += 1
+            self._set_delay(state, state.delay * 1.5)
+
+    def metrics(self) -> dict:
+        '''The current state of every host, e.g. for a log line or a dashboard.'''
+        now = self.clock()
+        with self.lock:
+            return {
+                host: {
+                    'delay': round(state.delay, 3),
+                    'requests_per_minute': round(60 / state.delay, 2),
+                    'blocked_for': round(max(0.0, state.blocked_until - now), 1),
+                    'requests': state.requests,
+                    'ok': state.ok,
+                    'throttled': state.throttled,
+                    'errors': state.errors,
+                }
+                for host, state in self.hosts.items()
+            }
+
+    def report(self) -> str:
+        return '\n'.join(
+            f"{host}: {m['requests_per_minute']} req/min (delay {m['delay']}s), "
+            f"{m['requests']} requests, {m['ok']} ok, {m['throttled']} throttled, {m['errors']} errors"
+            for host, m in self.metrics().items()
+        )
+
+    def load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        with open(self.state_path, encoding='utf-8') as fp:
+            saved = json.load(fp)
+        for host, host_state in saved.items():
+            state = self.hosts[host] = HostState(self.initial_delay)
+            self._set_delay(state, host_state['delay'])
+
+    def save(self):
+        if not self.state_path:
+            return
+        with self.lock:
+            saved = {host: {'delay': state.delay} for host, state in self.hosts.items()}
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = f'{self.state_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump(saved, fp, indent=2)
+        os.replace(tmp_path, self.state_path)
@@ -0,0 +1,69 @@
+'''
+A cheap relevance pre-stage for the NLP stages: the project is about narratives
+about Sweden, so only the sentences which mention it (and a few sentences around
+them, for the coreference chains) are worth a transformer.
+'''
+import re
+
+# English, Ukrainian and Russian forms: Sweden, Swedish, Swedes, Stockholm,
+# Швеція / Швеції / Швецію, шведський / шведи, Стокгольм / Стокгольма, Швеция, шведский...
+# The cases of Швеція / Швеция are listed: швец\w* would match the surname Швець
+# and the word швець (a shoemaker).
+TARGET_RE = re.compile(
+    r'\b(sweden|swedish|swedes?|stockholm|швец(ія|ії|ію|ією|ия|ии|ию|ией)|швед\w*|стокгольм\w*)\b',
+    re.IGNORECASE
+)
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+CONTEXT_SENTENCES = 2  # sentences kept before and after a relevant one
+PASSAGE_SEPARATOR = '\n\n'
+
+
+def split_sentences(text: str) -> list:
+    return SENTENCE_RE.split(text)
+
+
+def is_relevant(text: str, target_re=TARGET_RE) -> bool:
+    return bool(text) and target_re.search(text) is not None
+
+
+def relevant_sentences(text: str, target_re=TARGET_RE) -> list:
+    '''
+    Splits the text into sentences with a regex and keeps only the ones
+    which mention a target, so the parser never sees the rest.
+    '''
+    if not is_relevant(text, target_re):
+        return []
+    return [sent for sent in split_sentences(text) if target_re.search(sent)]
+
+
+def relevant_passages(text: str, context=CONTEXT_SENTENCES, target_re=TARGET_RE) -> list:
+    '''
+    Returns the passages of the text around the sentences which mention a target:
+    every relevant sentence with `context` sentences before and after it,
+    overlapping and adjacent windows are joined into one passage.
+    A text without a mention gives [].
+    '''
+    if not is_relevant(text, target_re):
+        return []
+    sentences = split_sentences(text)
+    keep = [False] * len(sentences)
+    for ind, sent in enumerate(sentences):
+        if target_re.search(sent):
+            for kept in range(max(0, ind - context), min(len(sentences), ind + context + 1)):
+                keep[kept] = True
+
+    passages, passage = [], []
+    for sent, kept in zip(sentences, keep):
+        if kept:
+            passage.append(sent)
+        elif passage:
+            passages.append(' '.join(passage))
+            passage = []
+    if passage:
+        passages.append(' '.join(passage))
+    return passages
+
+
+def relevant_text(text: str, context=CONTEXT_SENTENCES, target_re=TARGET_RE) -> str:
+    '''The relevant passages as one text for a resolver, '' if nothing is relevant.'''
+    return PASSAGE_SEPARATOR.join(relevant_passages(text, context, target_re))
@@ -0,0 +1,204 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+
+import pandas as pd
+from tqdm import tqdm
+
+from relevance import relevant_text
+
+CHUNK_SIZE = 200  # articles resolved and saved at once
+
+# spacy_resolve loads the transformer on import: it's imported only where it runs.
+# If RESOLVER_SERVICE is set, the texts are sent to the resolver service instead
+# (see resolver_service.py) and no process here loads the models.
+_RESOLVER = None
+
+
+def _get_resolver():
+    global _RESOLVER
+    if _RESOLVER is None:
+        if address := os.environ.get('RESOLVER_SERVICE'):
+            from resolver_service import ResolverClient
+            _RESOLVER = ResolverClient(address)
+        else:
+            import spacy_resolve
+            _RESOLVER = spacy_resolve
+    return _RESOLVER
+
+
+def resolve_part(texts, context=None):
+    '''
+    Runs in a worker (or in the main process with one worker):
+    returns (resolved text, clusters) for every text, in order.
+    '''
+    return _get_resolver().resolve_many(texts, context=context, with_clusters=True)
+
+
+def resolve_chunk(chunk, pool=None, workers=1, context=None, text_column='article_body'):
+    '''
+    Adds "resolved_body", "coref_clusters" (json: a list of clusters of [start, end]
+    token offsets) and "n_clusters" to a chunk of the parsed data.
+    The rows without a text get an empty resolution.
+    With `context`, only the passages about Sweden are resolved: the offsets are the ones
+    of the passages, not of the article, so the passages are kept in "coref_text" too
+    (relevance.relevant_text, '' for an article without a mention).
+    '''
+    has_text = chunk[text_column].map(lambda text: isinstance(text, str) and bool(text.strip()))
+    texts = chunk.loc[has_text, text_column].tolist()
+
+    if pool is None or workers == 1 or len(texts) < 2:
+        results = resolve_part(texts, context)
+    else:
+        # contiguous parts, so the order of the results is the order of the rows
+        step = -(-len(texts) // workers)
+        parts = [texts[i:i + step] for i in range(0, len(texts), step)]
+        results = [
+            result
+            for part_results in pool.map(resolve_part, parts, [context] * len(parts))
+            for result in part_results
+        ]
+
+    results = iter(results)
+    resolved_bodies, coref_clusters = [], []
+    for text_present in has_text:
+        resolved_body, clusters = next(results) if text_present else (None, [])
+        resolved_bodies.append(resolved_body)
+        coref_clusters.append(clusters)
+
+    chunk = chunk.copy()
+    chunk['resolved_body'] = resolved_bodies
+    chunk['coref_clusters'] = [json.dumps(clusters) for clusters in coref_clusters]
+    chunk['n_clusters'] = [len(clusters) for clusters in coref_clusters]
+    if context is not None:
+        chunk['coref_text'] = [
+            relevant_text(text, context) if text_present else None
+            for text, text_present in zip(chunk[text_column], has_text)
+        ]
+    return chunk
+
+
+class Checkpoint:
+    '''
+    The progress of a resolution run, saved in <out_path>.checkpoint.json after every chunk:
+    how many rows of the input are done and how long the output was then.
+    On resume, the output is cut back to that length, so a chunk which was being
+    written during a crash is not there twice.
+    '''
+    def __init__(self, out_path):
+        self.path = f'{out_path}.checkpoint.json'
+        self.out_path = out_path
+        self.chunks = self.rows = self.out_bytes = 0
+
+    def load(self):
+        if not (os.path.exists(self.path) and os.path.exists(self.out_path)):
+            return False
+        with open(self.path, encoding='utf-8') as fp:
+            state = json.load(fp)
+        self.chunks, self.rows, self.out_bytes = state['chunks'], state['rows'], state['out_bytes']
+        with open(self.out_path, 'r+b') as fp:
+            fp.truncate(self.out_bytes)
+        return True
+
+    def save(self, rows):
+        self.chunks += 1
+        self.rows += rows
+        self.out_bytes = os.path.getsize(self.out_path)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump({
+                'chunks': self.chunks, 'rows': self.rows, 'out_bytes': self.out_bytes,
+            }, fp)
+        os.replace(tmp_path, self.path)
+
+
+def resolve_dataset(csv_path, out_path, resume=False, limit=None, workers=1,
+                    chunk_size=CHUNK_SIZE, context=None):
+    '''
+    Reads the parsed csv in chunks of `chunk_size` rows, resolves the article bodies
+    with spacy_resolve and appends the chunks to `out_path`, checkpointing after every chunk.
+    resume -- continue after the last checkpointed chunk (otherwise start from the top).
+    limit -- stop after this many rows of the input.
+    workers -- processes, every one loads its own pipeline
+        (set SPACY_RESOLVE_PROFILE=fast_cpu to keep them to one thread each).
+    context -- resolve only the passages about Sweden (see relevance.py);
+        the coref offsets are then the ones of the "coref_text" column.
+    '''
+    checkpoint = Checkpoint(out_path)
+    if not (resume and checkpoint.load()):
+        if os.path.exists(out_path):
+            os.remove(out_path)
+    if limit is not None and checkpoint.rows >= limit:
+        print(f'{checkpoint.rows} rows are already resolved')
+        return
+    print(f'Starting after {checkpoint.chunks} chunks ({checkpoint.rows} rows)')
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    progress = tqdm(initial=checkpoint.rows, total=limit, desc="Resolving articles", unit="article")
+    # the bodies have line breaks, so the rows which are done are skipped after parsing
+    to_skip = checkpoint.rows
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+            if to_skip:
+                skipped = min(to_skip, len(chunk))
+                chunk = chunk.iloc[skipped:]
+                to_skip -= skipped
+                if chunk.empty:
+                    continue
+            if limit is not None:
+                chunk = chunk.iloc[:limit - checkpoint.rows]
+            resolved = resolve_chunk(chunk, pool, workers, context)
+            resolved.to_csv(
+                out_path, index=False, mode='a', header=not os.path.exists(out_path)
+            )
+            checkpoint.save(len(chunk))
+            progress.update(len(chunk))
+            if limit is not None and checkpoint.rows >= limit:
+                break
+    finally:
+        progress.close()
+        if pool is not None:
+            pool.shutdown()
+
+
+def default_out_path(csv_path):
+    root, _ = os.path.splitext(csv_path)
+    return f'{root}_resolved.csv'
+
+
+if __name__ == '__main__':
+    'works like this: from the folder "code" python resolve_dataset.py <dataset_name | parsed csv>'
+    arg_parser = argparse.ArgumentParser(description='Resolve the coreferences of a parsed dataset')
+    arg_parser.add_argument('dataset', help='a dataset name from parse_and_save.py or a path to a parsed csv')
+    arg_parser.add_argument('--out', default=None, help='the output csv (<input>_resolved.csv by default)')
+    arg_parser.add_argument('--resume', action='store_true', help='continue from the last checkpoint')
+    arg_parser.add_argument('--limit', type=int, default=None, help='resolve only the first N rows')
+    arg_parser.add_argument('--workers', type=int, default=1, help='number of processes')
+    arg_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    arg_parser.add_argument(
+        '--context', type=int, default=None,
+        help='resolve only the sentences about Sweden with N sentences around them; '
+        'the coref_clusters offsets then refer to the passages, saved in the coref_text column'
+    )
+    arg_parser.add_argument(
+        '--service', default=None,
+        help='the socket of a running resolver_service.py to send the texts to'
+    )
+    args = arg_parser.parse_args()
+    if args.service:
+        # the worker processes inherit it
+        os.environ['RESOLVER_SERVICE'] = args.service
+
+    csv_path = args.dataset
+    if not csv_path.endswith('.csv'):
+        from parse_and_save import DATASET_CONFIG, output_paths
+        if csv_path not in DATASET_CONFIG:
+            arg_parser.error(f'Dataset {csv_path} is not supported')
+        csv_path, _ = output_paths(csv_path)
+
+    resolve_dataset(
+        csv_path, args.out or default_out_path(csv_path), resume=args.resume,
+        limit=args.limit, workers=args.workers, chunk_size=args.chunk_size,
+        context=args.context
+    )
@@ -0,0 +1,245 @@
+'''
+A local coreference service: one long-lived process holds the spaCy models and the
+workers send it texts over a Unix socket, so the RAM doesn't grow with the number
+of workers (every process which imports spacy_resolve loads gigabytes of models).
+
+The requests of all the clients are micro-batched: the service waits for more
+requests until it has `token_budget` tokens or the oldest request has waited
+`deadline` seconds, then resolves them together with spacy_resolve.resolve_many.
+
+The requests are pickled, so only the user who runs the service may talk to it:
+the socket is created with 0600 permissions and the clients authenticate with a key,
+$RESOLVER_SERVICE_KEY if it's set, otherwise a random key the service writes next
+to the socket (<socket path>.key, 0600 too) for the clients to read.
+The socket lives in a directory of the user ($XDG_RUNTIME_DIR, or a 0700
+/tmp/resolver-service-<uid>), not in bare /tmp where anyone can plant files.
+
+works like this: python resolver_service.py [<socket path>]
+and in a worker:
+    with ResolverClient() as client:
+        resolved_texts = client.resolve_many(texts)
+'''
+from collections import defaultdict
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+import os
+import queue
+import secrets
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+
+from batching import count_tokens
+
+
+
+def default_address():
+    '''The socket in the runtime directory of the user, see private_dir().'''
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or os.path.join(
+        tempfile.gettempdir(), f'resolver-service-{os.getuid()}'
+    )
+    return os.path.join(runtime_dir, 'resolver-service.sock')
+
+
+ADDRESS = os.environ.get('RESOLVER_SERVICE') or default_address()
+KEY_ENV = 'RESOLVER_SERVICE_KEY'
+DEADLINE = 0.05  # seconds the first request of a micro-batch waits for others
+TOKEN_BUDGET = 8_000  # tokens which close a micro-batch before the deadline
+
+
+def key_path(address):
+    return f'{address}.key'
+
+
+def private_dir(path):
+    '''
+    Creates the directory with 0700 if it's missing. A directory of another user,
+    a symlink or a directory others can write to is refused (RuntimeError).
+    '''
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(f'{path} is not a private directory of this user')
+
+
+def load_authkey(address=ADDRESS) -> bytes:
+    '''The key of the service at `address`: $RESOLVER_SERVICE_KEY or the key file of the service.'''
+    if key := os.environ.get(KEY_ENV):
+        return key.encode()
+    try:
+        with open(key_path(address), 'rb') as fp:
+            return fp.read()
+    except FileNotFoundError:
+        raise RuntimeError(f'No key for the resolver service at {address}: is it running?') from None
+
+
+class ResolverService:
+    '''
+    Input: address -- the path of the Unix socket.
+           resolve_many -- the function doing the work, called as
+               resolve_many(texts, context=..., with_clusters=...);
+               spacy_resolve.resolve_many by default (loaded in serve()).
+           authkey -- the key of the clients: $RESOLVER_SERVICE_KEY or a random one
+               (written to <address>.key) by default.
+    '''
+    def __init__(self, address=ADDRESS, resolve_many=None, deadline=DEADLINE, token_budget=TOKEN_BUDGET,
+                 authkey=None):
+        self.address = address
+        self.authkey = authkey
+        self.resolve_many = resolve_many
+        self.deadline = deadline
+        self.token_budget = token_budget
+        self.requests = queue.Queue()
+        self.listener = None
+        self.stopped = threading.Event()
+        self.batches = self.texts = 0
+
+    def serve(self):
+        '''Blocks: accepts clients until stop() is called.'''
+        if self.resolve_many is None:
+            import spacy_resolve
+            self.resolve_many = spacy_resolve.resolve_many
+        if self.address == default_address():
+            private_dir(os.path.dirname(self.address))
+        if self.authkey is None:
+            self.authkey = os.environ.get(KEY_ENV, '').encode() or self._write_key()
+        if os.path.exists(self.address):
+            os.remove(self.address)  # left over from a service which was killed
+        # the socket is created with 0600: only the user of the service may connect
+        umask = os.umask(0o177)
+        try:
+            self.listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        finally:
+            os.umask(umask)
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        print(f'Resolver service listening on {self.address}')
+        try:
+            while not self.stopped.is_set():
+                try:
+                    conn = self.listener.accept()
+                except (OSError, EOFError, AuthenticationError):
+                    # a client with a wrong key, or the wake-up connection of stop()
+                    continue
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        finally:
+            self.listener.close()
+            if os.path.exists(key_path(self.address)):
+                os.remove(key_path(self.address))
+
+    def stop(self):
+        '''Stops serve(): it's blocked in accept(), so a connection wakes it up.'''
+        self.stopped.set()
+        if self.listener is None:
+            return
+        try:
+            with socket.socket(socket.AF_UNIX) as sock:
+                sock.connect(self.address)
+        except OSError:
+            pass  # serve() is already gone
+
+    def _write_key(self) -> bytes:
+        '''
+        A random key for this run of the service, readable by its user only.
+        A file (or a symlink) already at the path is removed, not written into: its
+        owner and permissions could be anyone's. If it reappears, open() fails.
+        '''
+        key = secrets.token_hex(32).encode()
+        path = key_path(self.address)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(key)
+        return key
+
+    def _serve_client(self, conn):
+        '''One thread per client: every request waits for its micro-batch to be resolved.'''
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                reply = queue.Queue(maxsize=1)
+                self.requests.put((request, reply, time.monotonic()))
+                conn.send(reply.get())
+
+    def _next_batch(self):
+        '''Waits for a request, then collects more until the budget or the deadline.'''
+        first = self.requests.get()
+        batch = [first]
+        tokens = sum(count_tokens(text) for text in first[0]['texts'])
+        closes_at = first[2] + self.deadline
+        while tokens < self.token_budget:
+            timeout = closes_at - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(item)
+            tokens += sum(count_tokens(text) for text in item[0]['texts'])
+        return batch
+
+    def _batch_loop(self):
+        while not self.stopped.is_set():
+            batch = self._next_batch()
+            # requests with different options are resolved separately
+            groups = defaultdict(list)
+            for request, reply, _ in batch:
+                groups[(request.get('context'), request.get('with_clusters', False))].append(
+                    (request['texts'], reply)
+                )
+            for (context, with_clusters), requests in groups.items():
+                texts = [text for request_texts, _ in requests for text in request_texts]
+                try:
+                    results = self.resolve_many(texts, context=context, with_clusters=with_clusters)
+                except Exception as e:
+                    for _, reply in requests:
+                        reply.put({'error': f'{type(e).__name__}: {e}'})
+                    continue
+                self.batches += 1
+                self.texts += len(texts)
+                start = 0
+                for request_texts, reply in requests:
+                    reply.put({'results': results[start:start + len(request_texts)]})
+                    start += len(request_texts)
+
+
+class ResolverClient:
+    '''
+    A connection to a running ResolverService. resolve_many() has the signature of
+    spacy_resolve.resolve_many, so the client can be used in its place.
+    '''
+    def __init__(self, address=ADDRESS, authkey=None):
+        self.conn = Client(address, family='AF_UNIX', authkey=authkey or load_authkey(address))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def resolve_many(self, texts, context=None, with_clusters=False) -> list:
+        self.conn.send({'texts': list(texts), 'context': context, 'with_clusters': with_clusters})
+        response = self.conn.recv()
+        if 'error' in response:
+            raise RuntimeError(f"Resolver service failed: {response['error']}")
+        return response['results']
+
+    def resolve(self, text, context=None) -> str:
+        return self.resolve_many([text], context=context)[0]
+
+
+if __name__ == '__main__':
+    address = sys.argv[1] if len(sys.argv) > 1 else ADDRESS
+    ResolverService(address).serve()
@@ -0,0 +1,238 @@
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import json
+import os
+import time
+
+from tqdm import tqdm
+
+from base_extractor import ArticleColumns
+from memory_guard import MB, MemoryGuard, current_rss
+from parse_and_save import (
+    ALL_DATASETS, DATASET_CONFIG, file_size, is_error, list_files, load_processed,
+    make_extractor, output_paths, parse_file, save_parsed, select_files
+)
+
+BATCH_BYTES = 4 * 1024 * 1024  # roughly how much html one task for a worker contains
+BATCH_FILES = 64
+FLUSH_EVERY = 500  # write the parsed articles of a dataset every N articles
+
+# extractors of a worker process, created once per dataset
+_EXTRACTORS = {}
+_RELEASE_SOUPS = False
+
+
+def _init_worker(release_soups):
+    global _RELEASE_SOUPS
+    _RELEASE_SOUPS = release_soups
+
+
+def _get_extractor(dataset_name):
+    if dataset_name not in _EXTRACTORS:
+        _EXTRACTORS[dataset_name] = make_extractor(dataset_name, release_soups=_RELEASE_SOUPS)
+    return _EXTRACTORS[dataset_name]
+
+
+def parse_batch(batch):
+    '''
+    Runs in a worker: parses a batch of (dataset_name, file_path, size) tasks.
+    Output: a list of (dataset_name, file_path, size, parsed, message, seconds, rss),
+    rss -- the RSS of the worker after the file, where the soups of the dataset live.
+    '''
+    results = []
+    for dataset_name, file_path, size in batch:
+        start = time.perf_counter()
+        parsed, message = parse_file(_get_extractor(dataset_name), file_path)
+        results.append((
+            dataset_name, file_path, size, parsed, message, time.perf_counter() - start,
+            current_rss()
+        ))
+    return results
+
+
+def make_batches(tasks, batch_bytes=BATCH_BYTES, batch_files=BATCH_FILES):
+    '''
+    Groups (size, dataset_name, file_path) tasks into batches of about `batch_bytes`.
+    The tasks are scheduled largest first, so the big files don't end up
+    at the tail of the run with most of the workers idle.
+    '''
+    batch, batch_size = [], 0
+    for size, dataset_name, file_path in sorted(tasks, reverse=True):
+        batch.append((dataset_name, file_path, size))
+        batch_size += size
+        if batch_size >= batch_bytes or len(batch) >= batch_files:
+            yield batch
+            batch, batch_size = [], 0
+    if batch:
+        yield batch
+
+
+class DatasetRun:
+    '''
+    The output of one dataset in a multi-dataset run: the parsed articles are appended
+    to the dataset's own csv every `flush_every` articles, and the files without an
+    article are saved in <dataset>_state.json, so an interrupted run can be resumed.
+    The files which failed (parse_and_save.is_error) are not saved: they are retried.
+    '''
+    def __init__(self, dataset_name, rerun=False, flush_every=FLUSH_EVERY):
+        self.dataset_name = dataset_name
+        self.flush_every = flush_every
+        self.out_path, self.log_path = output_paths(dataset_name)
+        self.state_path = os.path.join(
+            os.path.dirname(self.out_path), f'{dataset_name}_state.json'
+        )
+
+        existing_df, self.processed_files = load_processed(self.out_path, rerun)
+        self.append = existing_df is not None
+        self.skipped = set() if rerun else self._load_skipped()
+        if rerun:
+            open(self.log_path, 'w', encoding='utf-8').close()
+        # otherwise the log is appended to: it keeps why the skipped files of the
+        # earlier runs were skipped, they aren't parsed again
+
+        # the parsed articles wait for the flush as columns, not as a list of records
+        self.buffer, self.logs = ArticleColumns(), []
+        self.files = self.bytes = self.articles = 0
+        self.worker_seconds = 0.0
+        self.peak_rss = 0  # the peak RSS of the workers while parsing the dataset
+        # set when the pool starts, the datasets share it so their wall time starts together
+        self.started = self.last_result = None
+
+    def _load_skipped(self):
+        if not os.path.exists(self.state_path):
+            return set()
+        with open(self.state_path, encoding='utf-8') as fp:
+            return set(json.load(fp)['skipped'])
+
+    def add(self, file_path, size, parsed, message, seconds, rss=None):
+        self.last_result = time.perf_counter()
+        self.files += 1
+        self.bytes += size
+        self.worker_seconds += seconds
+        if rss:
+            self.peak_rss = max(self.peak_rss, rss)
+        if message:
+            self.logs.append(message)
+        if parsed:
+            self.articles += 1
+            self.buffer.append(parsed)
+        elif not is_error(message):
+            # a page without an article isn't parsed again; a failed one is retried next run
+            self.skipped.add(file_path)
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            save_parsed(self.buffer, self.out_path, append=self.append)
+            self.append = True
+            self.buffer = ArticleColumns()
+        if self.logs:
+            with open(self.log_path, 'a', encoding='utf-8') as fp:
+                fp.write('\n'.join(self.logs) + '\n')
+            self.logs = []
+        with open(self.state_path, 'w', encoding='utf-8') as fp:
+            json.dump({'skipped': sorted(self.skipped)}, fp, ensure_ascii=False)
+
+    def report(self):
+        wall = (self.last_result - self.started) if self.files else 0
+        megabytes = self.bytes / 1024 / 1024
+        speed = f'{self.files / wall:.1f} files/s, {megabytes / wall:.2f} MB/s' if wall else 'n/a'
+        return (f'{self.dataset_name}: {self.files} files ({megabytes:.1f} MB), '
+            f'{self.articles} articles, {speed}, '
+            f'{self.worker_seconds:.1f} worker-seconds'
+            + (f', peak worker RSS {self.peak_rss / MB:.0f} MB' if self.peak_rss else '')
+        )
+
+
+def run(dataset_names, workers=None, rerun=False, memory_limit_mb=None, snapshot_every=0):
+    '''
+    Parses the datasets on one shared pool of `workers` processes.
+    The memory of the main process (which buffers the parsed articles) is watched by
+    a MemoryGuard: above `memory_limit_mb` all the datasets are flushed to their csvs.
+    The peak RSS of the workers (where the pages are parsed) is reported per dataset.
+    '''
+    workers = workers or os.cpu_count()
+    runs, tasks = {}, []
+    for dataset_name in dataset_names:
+        runs[dataset_name] = dataset_run = DatasetRun(dataset_name, rerun)
+        extractor = make_extractor(dataset_name)
+        files = list_files(dataset_name, extractor)
+        tasks_before = len(tasks)
+        for file_path in select_files(dataset_name, files, dataset_run.processed_files):
+            if file_path in dataset_run.skipped:
+                continue
+            tasks.append((file_size(extractor, file_path), dataset_name, file_path))
+        # the workers open their own readers: the parent doesn't keep a pack mapped for the run
+        if hasattr(extractor.reader, 'close'):
+            extractor.reader.close()
+        print(f'{dataset_name}: {len(files)} files, {len(tasks) - tasks_before} to parse')
+
+    batches = make_batches(tasks)
+    progress = tqdm(total=len(tasks), desc="Processing files", unit="file")
+    started = time.perf_counter()
+    for dataset_run in runs.values():
+        dataset_run.started = started
+    guard = MemoryGuard(
+        'run_all main process', soft_limit_mb=memory_limit_mb, snapshot_every=snapshot_every,
+        on_limit=lambda: [dataset_run.flush() for dataset_run in runs.values()]
+    )
+    # with a memory limit, the workers free their soups right away too
+    with guard, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(bool(memory_limit_mb),)
+    ) as pool:
+        pending = set()
+        # keep a couple of batches per worker in flight, not the whole corpus
+        for batch in batches:
+            pending.add(pool.submit(parse_batch, batch))
+            if len(pending) < workers * 2:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            _collect(done, runs, progress, guard)
+        _collect(pending, runs, progress, guard)
+    progress.close()
+
+    for dataset_run in runs.values():
+        dataset_run.flush()
+        print(dataset_run.report())
+    print(guard.report())
+    return runs
+
+
+def _collect(futures, runs, progress, guard):
+    for future in futures:
+        for dataset_name, file_path, size, parsed, message, seconds, rss in future.result():
+            runs[dataset_name].add(file_path, size, parsed, message, seconds, rss)
+            # the guard watches the buffers of the main process: no labels, its peaks
+            # per dataset would only say how much of the dataset is buffered
+            guard.track(file_path, size, None, current_rss())
+            progress.update(1)
+
+
+if __name__ == '__main__':
+    'works like this: from the folder "code" python run_all.py all | <dataset_name> ...'
+    arg_parser = argparse.ArgumentParser(description='Parse several datasets on a shared worker pool')
+    arg_parser.add_argument(
+        'datasets', nargs='+',
+        help=f'"all" or some of: {", ".join(DATASET_CONFIG)}'
+    )
+    arg_parser.add_argument('--workers', type=int, default=None, help='number of processes')
+    arg_parser.add_argument('--rerun', action='store_true', help='parse all files from the top')
+    arg_parser.add_argument(
+        '--memory-limit', type=int, default=None,
+        help='a soft limit in MB: above it, the parsed articles are flushed and the garbage collected'
+    )
+    arg_parser.add_argument(
+        '--snapshot-every', type=int, default=0, help='a tracemalloc snapshot every N documents'
+    )
+    args = arg_parser.parse_args()
+
+    dataset_names = ALL_DATASETS if args.datasets == ['all'] else args.datasets
+    for dataset_name in dataset_names:
+        if dataset_name not in DATASET_CONFIG:
+            arg_parser.error(f'Dataset {dataset_name} is not supported')
+
+    run(
+        dataset_names, workers=args.workers, rerun=args.rerun,
+        memory_limit_mb=args.memory_limit, snapshot_every=args.snapshot_every
+    )
@@ -1,7 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 import os
-import random
-import time
 
 from bs4 import BeautifulSoup
 from tqdm import tqdm
@@ -13,9 +12,11 @@ from links_parser import (
     UkrinformParser, EurActivParser, TyzhdenParser,
     KyivpostArchiveParser
 )
+from page_store import PageStore
+from rate_control import RateController
+from transport import DnsCache, Transport
 
 DATA = '/Users/macuser/Documents/UPPSALA/thesis/data'
-HOUR_IN_SECONDS = 3600
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36',
 }
@@ -49,7 +50,9 @@ SOURCES_CONFIG = {
 class SimpleScraper:
     def __init__(
             self, source, data_dir=DATA, 
-            delay=2, random_delay_range=(0, 2), timeout=10
+            delay=2, random_delay_range=(0, 2), timeout=10,
+            use_store=False, revalidate=False, adaptive=True, http2=False,
+            dns_cache=None
         ):
         if source not in SOURCES_CONFIG:
             raise ValueError(
@@ -67,6 +70,14 @@ class SimpleScraper:
         self.links_file = f'{self.index_dir}/links.csv'
         
         self.links = self.get_links()
+
+        # with the store, pages are saved compressed into packed segments
+        # instead of one file per article (see page_store.py)
+        self.store = PageStore(self.source_dir) if use_store else None
+        # ask the site whether already downloaded pages have changed (conditional GET)
+        self.revalidate = revalidate
+        # called as on_page(filename, html, link) for every downloaded article (see pipeline.py)
+        self.on_page = None
         
         self.random_delay_range = random_delay_range
         self.timeout = timeout
@@ -77,6 +88,21 @@ class SimpleScraper:
         if not random_delay_range and self.source == 'ukrinform':
             # UkrInform is a bloking bitch, so use larger range
             self.random_delay_range = (2, 5)
+
+        # one pooled client for all the requests of the scraper (see transport.py);
+        # dns_cache is a transport.DnsCache shared by the scrapers of the process
+        self.transport = Transport(
+            headers=HEADERS, timeout=self.timeout, http2=http2, dns_cache=dns_cache
+        )
+
+        # the delay between requests is learned per host: it goes down while the site
+        # answers fine and up on 429/503/Retry-After (see rate_control.py);
+        # the learned delays are kept between runs. Not adaptive: the delay stays fixed.
+        self.rate = RateController(
+            state_path=f'{self.index_dir}/rate-state.json' if adaptive else None,
+            delay=delay, jitter=self.random_delay_range,
+            min_delay=0.25 if adaptive else delay, max_delay=1800 if adaptive else delay,
+        )
     
     def __repr__(self):
         return(f'<SimpleScraper>, source: {self.source}, '
@@ -97,22 +123,21 @@ class SimpleScraper:
             
             all_links.extend(links)
 
-        df = pd.DataFrame(all_links, columns=['link'])
-        df.to_csv(f'{self.links_file}', index=False)
-
-        self.links = df
+        self.save_links(all_links)
     
     def scrape_articles(self):
-        fails = 0
-        # TODO: maybe refactor, there are some magic numbers
         if self.links is None:
             self.get_links_from_index_pages()
         if self.links is None:
             raise ValueError('No links found')
 
-        session = requests.Session()
-        session.headers.update(HEADERS)
+        try:
+            self._scrape_links()
+        finally:
+            self.rate.save()
+            print(self.rate.report())
 
+    def _scrape_links(self):
         for ind, row in tqdm(self.links.iterrows(), total=len(self.links), desc="Downloading articles"):
             
             link = row['link']
@@ -121,7 +146,14 @@ class SimpleScraper:
             except Exception as e:
                 print(f"Error getting file destination for {link}: {e}")
                 continue
-            if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            request_headers = {}
+            if self.store is not None:
+                if filename in self.store:
+                    if not self.revalidate:
+                        print(f"Skipping already downloaded: {filename}")
+                        continue
+                    request_headers = self.store.validators(filename)
+            elif os.path.exists(filename) and os.path.getsize(filename) > 0:
                 # this special check is for ukrinform,
                 # because there were a lot of javascript-protected pages
                 with open(filename, "r", encoding="utf-8") as f:
@@ -134,56 +166,127 @@ class SimpleScraper:
                     print(f"Found incomplete article, redownloading: {filename}")
 
             retries = 3
-            delay = self.delay
             for attempt in range(retries):
+                # waits as long as the host wants, the backoff after failures included
+                self.rate.wait(link)
+                # plain files are streamed to disk, the store and the pipeline need the text
+                stream_to_disk = self.store is None and self.on_page is None
                 try:
-                    response = session.get(link, timeout=10)
-                    if response.status_code == 200:
-                        with open(filename, "w", encoding="utf-8") as f:
-                            f.write(response.text)
-                        break
+                    if stream_to_disk:
+                        response = self.transport.download(link, filename, timeout=10, headers=request_headers)
                     else:
-                        print(f"Attempt {attempt+1}: Failed {response.status_code} for {link}")
-
+                        response = self.transport.get(link, timeout=10, headers=request_headers)
                 except requests.RequestException as e:
                     print(f"Attempt {attempt+1}: Error {e} for {link}")
-
-                time.sleep(delay + random.uniform(5, 15))  # Increase randomness
-                delay *= 2  # Exponential backoff
+                    self.rate.record_error(link)
+                    continue
+                self.rate.record(link, response.status_code, response.headers)
+                if response.status_code == 304:
+                    print(f"Not modified: {link}")
+                    break
+                if response.status_code == 200:
+                    if not stream_to_disk:
+                        self.save_page(filename, response, link)
+                    break
+                print(f"Attempt {attempt+1}: Failed {response.status_code} for {link}")
+                if response.status_code == 404:
+                    break
             else:
                 print(f"Skipping {ind}, {link} after {retries} attempts")
-                fails += 1
-            
-            time.sleep(delay + random.uniform(*self.random_delay_range))
-            if fails >= 3 and self.source == 'ukrinform':
-                fails = 0
-                print("Too many fails, going to sleep...")
-                time.sleep(HOUR_IN_SECONDS)
 
-    def get_index_pages(self):
+            if ind % 50 == 0:
+                self.rate.save()
+
+    def save_page(self, filename, response, link):
+        '''Writes the downloaded page either into the page store or into a plain file.'''
+        if self.store is not None:
+            self.store.put(
+                filename, response.text, url=link,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+            )
+        else:
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write(response.text)
+        if self.on_page is not None:
+            self.on_page(filename, response.text, link)
+
+    def get_index_pages(self, workers=4, retries=3, refetch=False, stop_when_no_new_links=True):
+        '''
+        Downloads the index (search) pages 1..page_num-1 into index_dir, `workers` pages
+        at a time, and extracts their links into links.csv as they come.
+        The pages which are already saved are not downloaded again (unless refetch),
+        only their links are read. A failed page is retried with the backoff of the
+        rate controller. The crawl stops after a page which gives no new links:
+        the search results have run out (or repeat the last page).
+        '''
         if self.parser.index_page_link is None:
             raise ValueError('Index pages link is not provided')
-        
-        page_num = self.parser.page_num
-        
-        session = requests.Session()
-        session.headers.update(HEADERS)
-        
-        for p in tqdm(range(1, page_num), desc="Downloading index pages", total=page_num-1):
+
+        pages = list(range(1, self.parser.page_num))
+        seen_links = {}  # a dict keeps the order of the links
+        failed = []
+
+        def fetch(p):
+            '''Returns the path of the saved page or None if it failed.'''
+            file_path = os.path.join(self.index_dir, f'{p}.html')
+            if not refetch and os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+                return file_path
             page = self.parser.index_page_link.format(p)
-            response = session.get(page, timeout=self.timeout)
+            for attempt in range(retries):
+                self.rate.wait(page)
+                try:
+                    # streamed through a temporary file, so a half-written page isn't "saved"
+                    response = self.transport.download(page, file_path)
+                except requests.RequestException as e:
+                    print(f"Attempt {attempt+1}: Error {e} for {page}")
+                    self.rate.record_error(page)
+                    continue
+                self.rate.record(page, response.status_code, response.headers)
+                if response.status_code == 200:
+                    return file_path
+                print(f"Attempt {attempt+1}: Failed {response.status_code} for {page}")
+                if response.status_code == 404:
+                    break
+            return None
 
-            if response.status_code == 200:
-                file_path = os.path.join(self.index_dir, f'{p}.html')
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(response.text)
-            
-            # randomise delay to avoid being blocked
-            time.sleep(self.delay + random.uniform(0, 2))
+        progress = tqdm(total=len(pages), desc="Downloading index pages")
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # in waves of `workers` pages, so the crawl can stop in order
+                for wave_start in range(0, len(pages), workers):
+                    wave = pages[wave_start:wave_start + workers]
+                    stop = False
+                    for p, file_path in zip(wave, pool.map(fetch, wave)):
+                        progress.update(1)
+                        if file_path is None:
+                            failed.append(p)
+                            continue
+                        new_links = [
+                            link for link in self.parser.parse_tag(file_path)
+                            if link not in seen_links
+                        ]
+                        seen_links.update(dict.fromkeys(new_links))
+                        if not new_links and stop_when_no_new_links:
+                            print(f'No new links on page {p}, stopping')
+                            stop = True
+                    self.save_links(list(seen_links))
+                    if stop:
+                        break
+        finally:
+            progress.close()
+            self.rate.save()
+        if failed:
+            print(f'Failed index pages: {failed}')
+
+    def save_links(self, links):
+        df = pd.DataFrame(links, columns=['link'])
+        df.to_csv(self.links_file, index=False)
+        self.links = df
 
 
 if __name__ == '__main__':
-    scraper = SimpleScraper('nv', timeout=60)
+    scraper = SimpleScraper('nv', timeout=60, dns_cache=DnsCache())
     #scraper.get_index_pages()
     #scraper.get_links_from_index_pages()
     scraper.scrape_articles()
@@ -1,12 +1,41 @@
 from collections import Counter
+import os
 import re
 
 import spacy
 
+from batching import TOKEN_BUDGET, WINDOW, map_batched
+from relevance import relevant_text
+from span_rewrite import drop_conflicting_spans, merge_spans, splice_tokens
+
+
+# "full" -- the whole en_core_web_trf pipeline with coref, as it was trained.
+# "fast_cpu" -- for machines without a GPU: the parser is excluded (the resolver only
+#   needs the entities, the tags and the lemmas next to the coref clusters), the Linear
+#   layers of the transformers are quantized to int8 and torch uses `threads` threads,
+#   so a few processes can share the cpu.
+PROFILES = {
+    'full': {'exclude': [], 'quantize': False, 'threads': None},
+    'fast_cpu': {'exclude': ['parser'], 'quantize': True, 'threads': 1},
+}
+PROFILE = os.environ.get('SPACY_RESOLVE_PROFILE', 'full')
+
+
+def load_models(profile='full', threads=None):
+    '''
+    Loads the pipeline with the coreference components for one of PROFILES.
+    `threads` overrides the profile's number of torch threads
+    (also set by the SPACY_RESOLVE_THREADS environment variable).
+    '''
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile {profile}, use one of: {', '.join(PROFILES)}")
+    config = PROFILES[profile]
+    threads = threads or os.environ.get('SPACY_RESOLVE_THREADS') or config['threads']
+    if threads:
+        _set_threads(int(threads))
 
-def load_models():
     try:
-        nlp = spacy.load("en_core_web_trf")
+        nlp = spacy.load("en_core_web_trf", exclude=config['exclude'])
         nlp_coref = spacy.load("en_coreference_web_trf")
         
         nlp_coref.replace_listeners("transformer", "coref", ["model.tok2vec"])
@@ -17,11 +46,74 @@ def load_models():
         nlp.add_pipe("span_resolver", source=nlp_coref)
     except Exception as e:
         raise RuntimeError(f"Failed to load NLP models: {e}")
+
+    if config['quantize']:
+        quantized = quantize_pipeline(nlp)
+        print(f'Quantized {quantized} torch modules of the pipeline')
     
     return nlp, nlp_coref
 
 
-NLP, NLP_COREF = load_models()
+def _set_threads(threads):
+    import torch
+    torch.set_num_threads(threads)
+    # the thread pool of the interop ops can only be set before it's used
+    try:
+        torch.set_num_interop_threads(threads)
+    except RuntimeError:
+        pass
+
+
+def quantize_pipeline(nlp) -> int:
+    '''
+    Dynamic int8 quantization of the Linear layers of every torch model in the pipeline
+    (the transformer, and the copies of it inside coref and span_resolver).
+    Quantization only works on cpu; a model which can't be quantized is left as it is.
+    Returns the number of quantized models.
+    '''
+    import torch
+    from thinc.api import PyTorchShim
+
+    quantized = 0
+    for _, pipe in nlp.pipeline:
+        model = getattr(pipe, 'model', None)
+        if model is None:
+            continue
+        for node in model.walk():
+            for shim in node.shims:
+                if not isinstance(shim, PyTorchShim):
+                    continue
+                try:
+                    shim._model = torch.quantization.quantize_dynamic(
+                        shim._model, {torch.nn.Linear}, dtype=torch.qint8
+                    )
+                    quantized += 1
+                except Exception as e:
+                    print(f'Could not quantize {node.name}: {e}')
+    return quantized
+
+
+_MODELS = None
+
+
+def get_models():
+    '''
+    (nlp, nlp_coref) of PROFILE, loaded on the first use: the heuristics below
+    can be run over cached docs (see doc_cache.py) without loading the transformers.
+    '''
+    global _MODELS
+    if _MODELS is None:
+        _MODELS = load_models(PROFILE)
+    return _MODELS
+
+
+def __getattr__(name):
+    # spacy_resolve.NLP and spacy_resolve.NLP_COREF load the models when they are asked for
+    if name == 'NLP':
+        return get_models()[0]
+    if name == 'NLP_COREF':
+        return get_models()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_coref_clusters(doc: spacy.tokens.doc.Doc) -> dict:
@@ -38,42 +130,121 @@ def find_span_positions(coref_clusters) -> dict:
     }
     
 
+NAMED_ENTITY_LABELS = {"PERSON", "ORG", "NORP", "GPE", "DATE"}
+NOT_HEAD_NOUNS = {"we", "they", "it", "them"}
+
+
 def _get_head_noun(mention):
     doc = mention.doc[mention.start:mention.end]
     for token in list(doc)[::-1]:  # Search from end (head often last)
-        if token.pos_ in {"NOUN", "PROPN"} and not token.text.lower() in {"we", "they", "it", "them"}:
+        if token.pos_ in {"NOUN", "PROPN"} and not token.text.lower() in NOT_HEAD_NOUNS:
             return token.lemma_.lower()
     return None
 
 
 def _is_named_entity(mention):
-    return any(ent.label_ in {"PERSON", "ORG", "NORP", "GPE", "DATE"} for ent in mention.ents)
+    return any(ent.label_ in NAMED_ENTITY_LABELS for ent in mention.ents)
+
+
+class DocIndex:
+    '''
+    Per-token arrays of a doc, built in one pass, so every mention is scored with
+    a few lookups instead of walking mention.ents and slicing the doc
+    (the same answers as _is_named_entity() and _get_head_noun()):
+    next_entity_end[i] -- the end of the first named entity which starts at i or later;
+        a mention contains a named entity (mention.ents are the entities fully
+        inside it) if the first one starting in it also ends in it.
+    last_noun[i] -- the last head noun candidate at i or before (-1 if none).
+    '''
+    def __init__(self, doc):
+        n_tokens = len(doc)
+        self.text = doc.text
+        self.char_start = [token.idx for token in doc]
+        self.char_end = [token.idx + len(token) for token in doc]
+        self.lemmas = [None] * n_tokens
+
+        entity_end = [n_tokens + 1] * (n_tokens + 1)
+        for ent in doc.ents:
+            if ent.label_ in NAMED_ENTITY_LABELS:
+                entity_end[ent.start] = ent.end
+        self.next_entity_end = entity_end
+        for i in range(n_tokens - 1, -1, -1):
+            self.next_entity_end[i] = min(entity_end[i], self.next_entity_end[i + 1])
+
+        self.last_noun = [-1] * n_tokens
+        last = -1
+        for i, token in enumerate(doc):
+            if token.pos_ in {"NOUN", "PROPN"} and token.text.lower() not in NOT_HEAD_NOUNS:
+                last = i
+                self.lemmas[i] = token.lemma_.lower()
+            self.last_noun[i] = last
+
+    def mention_text(self, start, end):
+        return self.text[self.char_start[start]:self.char_end[end - 1]] if end > start else ''
+
+    def is_named_entity(self, start, end):
+        return self.next_entity_end[start] <= end
+
+    def head_noun(self, start, end):
+        if end <= start:
+            return None
+        last = self.last_noun[end - 1]
+        return self.lemmas[last] if last >= start else None
+
+
+def pick_best_entities(coref_clusters) -> dict:
+    '''The representative mention text of every cluster: cluster_id -> text.'''
+    best_entities = {}
+    doc_index = None
+
+    for cluster_id, mentions in coref_clusters.items():
+        if doc_index is None:
+            doc_index = DocIndex(mentions.doc)
+        span_texts = [
+            (
+                doc_index.mention_text(mention.start, mention.end),
+                doc_index.is_named_entity(mention.start, mention.end),
+                doc_index.head_noun(mention.start, mention.end),
+            )
+            for mention in mentions
+        ]
+
+        # Prefer named entities if unique and representative:
+        # the shortest proper noun mention (e.g., "Aftonbladet"), the first one on ties
+        best_entity = None
+        for text, is_ne, _ in span_texts:
+            if is_ne and (best_entity is None or len(text) < len(best_entity)):
+                best_entity = text
+        if best_entity is None and span_texts:
+            # Fallback: most frequent head noun span (e.g., "camp site"),
+            # the shortest of them, the first one on ties
+            head_counter = Counter(head for *_, head in span_texts if head)
+            best_key = None
+            for text, _, head in span_texts:
+                key = (head_counter[head] if head else 0, -len(text))
+                if best_key is None or key > best_key:
+                    best_key, best_entity = key, text
+
+        best_entities[cluster_id] = best_entity
+
+    return best_entities
 
 
 def identify_entities(coref_clusters, cluster_spans) -> dict:
     representative_spans = {}
+    best_entities = pick_best_entities(coref_clusters)
 
-    for cluster_id, mentions in coref_clusters.items():
-        span_texts = [(mention.text, mention.start, mention.end, _is_named_entity(mention), _get_head_noun(mention)) for mention in mentions]
-
-        # Count full span and head noun frequencies
-        span_counter = Counter(text for text, *_ in span_texts)
-        head_counter = Counter(h for *_, h in span_texts if h)
-
-        # Prefer named entities if unique and representative
-        named_entities = [(text, start, end) for text, start, end, is_ne, _ in span_texts if is_ne]
-        if named_entities:
-            # Prefer shortest proper noun mention (e.g., "Aftonbladet")
-            best_entity = min(named_entities, key=lambda x: len(x[0]))[0]
-        else:
-            # Fallback: most frequent head noun span (e.g., "camp site")
-            best_span = max(span_texts, key=lambda x: (head_counter[x[4]] if x[4] else 0, -len(x[0])))
-            best_entity = best_span[0]
-
-        # Apply replacement
-        original_spans = cluster_spans[cluster_id]
-        adjusted_spans = [(start, end, best_entity) for start, end, _ in original_spans]
-        representative_spans[cluster_id] = adjusted_spans
+    # Apply replacement: nested and overlapping mentions of a cluster are merged into one span,
+    # and a span overlapping a span of another cluster is rewritten only once
+    cluster_ids = list(best_entities)
+    merged_spans = [
+        merge_spans([(start, end) for start, end, _ in cluster_spans[cluster_id]], inclusive=False)
+        for cluster_id in cluster_ids
+    ]
+    merged_spans = drop_conflicting_spans(merged_spans, inclusive=False)
+    for cluster_id, spans in zip(cluster_ids, merged_spans):
+        best_entity = best_entities[cluster_id]
+        representative_spans[cluster_id] = [(start, end, best_entity) for start, end in spans]
 
     return representative_spans
     
@@ -91,19 +262,10 @@ def replace_all_references_with_entities(doc, entity_spans):
     """
     tokens = [token.text for token in doc]        
     modifications = [(start, end, rep_name) for spans in entity_spans.values() for start, end, rep_name in spans if spans]       
+    # the spans with a smaller start are written later, so they win on overlaps
     modifications.sort(key=lambda x: x[0], reverse=True)
-    
-    result_tokens = tokens.copy()
-    
-    for start, end, replacement in modifications:
-        if start < len(result_tokens):
-            result_tokens[start] = replacement
-            
-            for i in range(start+1, end):
-                if i < len(result_tokens):
-                    result_tokens[i] = ""
-    
-    return [tok for tok in result_tokens if tok.strip()]
+
+    return splice_tokens(tokens, modifications, drop_blank_tokens=True)
 
 
 def detokenize(tokens):
@@ -161,11 +323,15 @@ def detokenize(tokens):
     return out
 
 
-def resolve(text: str) -> str:
+def resolve(text: str, context=None) -> str:
     """
     Perform coreference resolution on the provided text.
+    If `context` is set, only the passages about Sweden are resolved
+    (the sentences with a mention and `context` sentences around them, see relevance.py).
     """
-    doc = NLP(text)        
+    if context is not None:
+        text = relevant_text(text, context)
+    doc = get_models()[0](text)
     coref_clusters = get_coref_clusters(doc)
     cluster_spans = find_span_positions(coref_clusters)
     entity_spans = identify_entities(coref_clusters, cluster_spans)
@@ -185,3 +351,33 @@ def resolve_from_doc(doc: spacy.tokens.doc.Doc) -> str:
     resolved_tokens = replace_all_references_with_entities(doc, entity_spans)
     resolved_text = detokenize(resolved_tokens)  
     return resolved_text
+
+
+def cluster_offsets(doc: spacy.tokens.doc.Doc) -> list:
+    '''The coref clusters of the doc as lists of [start, end] token offsets (exclusive end).'''
+    return [
+        [[span.start, span.end] for span in spans]
+        for spans in get_coref_clusters(doc).values()
+    ]
+
+
+def resolve_many(texts, token_budget=TOKEN_BUDGET, window=WINDOW, nlp=None, context=None,
+                 with_clusters=False) -> list:
+    '''
+    resolve() for many texts: the texts are bucketed by length into batches of at most
+    `token_budget` padded tokens (see batching.py), which bounds the memory of nlp.pipe.
+    `context` works as in resolve().
+    Returns the resolved texts in the order of `texts`,
+    or (resolved text, cluster_offsets()) tuples if `with_clusters`.
+    '''
+    nlp = nlp or get_models()[0]
+    if context is not None:
+        texts = (relevant_text(text, context) for text in texts)
+
+    def resolve_batch(batch):
+        docs = nlp.pipe(batch, batch_size=len(batch))
+        if with_clusters:
+            return [(resolve_from_doc(doc), cluster_offsets(doc)) for doc in docs]
+        return [resolve_from_doc(doc) for doc in docs]
+
+    return list(map_batched(resolve_batch, texts, token_budget, window=window))
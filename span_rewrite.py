@@ -0,0 +1,86 @@
+def splice_tokens(tokens: list, rewrites: list, drop_blank_tokens=False) -> list:
+    '''
+    Rewrites spans of tokens in one pass. Shared by maverick_resolve and spacy_resolve.
+
+    Input: tokens -- a list of token strings.
+           rewrites -- a list of (start, end, replacement) with an exclusive end.
+               The replacement is either a string, which replaces the first token
+               of the span while the rest of the span is removed (a blank string
+               removes the first token too), or a list of
+               values, where values[i] replaces tokens[start + i] and None removes it.
+               If rewrites overlap, the later one in the list wins, token by token
+               (like writing them one after another into a token -> replacement dict).
+           drop_blank_tokens -- also remove the blank tokens (the rewritten ones included).
+    Output: the new list of tokens.
+
+    Every rewrite is a slice assignment into a copy of the tokens and the output
+    is built by one filtering pass, so there are no per-token lookups.
+    '''
+    n_tokens = len(tokens)
+    result = list(tokens)
+    for start, end, replacement in rewrites:
+        if start >= n_tokens:
+            continue
+        end = min(end, n_tokens)
+        if isinstance(replacement, str):
+            result[start] = replacement if replacement.strip() else None
+            result[start + 1:end] = [None] * (end - start - 1)
+        else:
+            result[start:end] = replacement[:end - start]
+
+    if drop_blank_tokens:
+        return [token for token in result if token is not None and token.strip()]
+    return [token for token in result if token is not None]
+
+
+def merge_spans(spans, inclusive=True) -> list:
+    '''
+    Merges overlapping and nested spans of one cluster with a sorted sweep, O(n log n):
+    Ukrainian Hetman Ivan Mazepa => 
+        [Ukrainian hetman, Ukrainian hetman Ivan Mazepa, Ivan Mazepa] => one span.
+    The spans don't have to be sorted; touching spans like (1, 2), (3, 4) stay apart.
+    Input: spans -- (start, end) tuples, `inclusive` tells whether the end is inclusive
+           (maverick) or exclusive (spaCy).
+    Output: a sorted list of non-overlapping (start, end) tuples.
+    '''
+    merged = []
+    for start, end in sorted(spans):
+        if merged:
+            last_start, last_end = merged[-1]
+            if start < last_end + inclusive:
+                merged[-1] = (last_start, max(last_end, end))
+                continue
+        merged.append((start, end))
+    return merged
+
+
+def drop_conflicting_spans(spans_of_clusters, inclusive=True) -> list:
+    '''
+    Spans of different clusters can overlap as well ("Sweden" in one cluster and
+    "Sweden ’s government" in another), and rewriting both rewrites the same tokens twice.
+    Sweeps all the spans sorted by start and keeps the longest span of every overlap
+    (the earlier one on ties), O(n log n).
+    Input: a list of lists of (start, end) spans, one list per cluster.
+    Output: the same lists without the spans which lost a conflict.
+    '''
+    candidates = sorted(
+        (start, -(end - start), cluster, ind, end)
+        for cluster, spans in enumerate(spans_of_clusters)
+        for ind, (start, end) in enumerate(spans)
+    )
+    kept = []
+    for start, negative_length, cluster, ind, end in candidates:
+        if kept:
+            last_start, last_negative_length, _, _, last_end = kept[-1]
+            if start < last_end + inclusive:
+                # the kept spans before the last one end before this one starts
+                if negative_length < last_negative_length:
+                    kept[-1] = (start, negative_length, cluster, ind, end)
+                continue
+        kept.append((start, negative_length, cluster, ind, end))
+
+    keep = {(cluster, ind) for _, _, cluster, ind, _ in kept}
+    return [
+        [span for ind, span in enumerate(spans) if (cluster, ind) in keep]
+        for cluster, spans in enumerate(spans_of_clusters)
+    ]
@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+
+import pandas as pd
+
+from base_extractor import FIELD_METHODS, Article, ArticleColumns
+from extractors import EuractivExtractor, HromadskeExtractor
+import parse_and_save
+from parse_and_save import save_parsed
+
+
+def test_article_is_compact():
+    article = Article(title='T', keywords=['a', 'b'], genre=''.join(['ne', 'ws']), file_path='x.html')
+    assert not hasattr(article, '__dict__')
+    assert article.keywords == ('a', 'b')
+    assert article.genre is sys.intern('news')
+    assert article['title'] == 'T'
+    assert Article(keywords=None).keywords == ()
+
+
+def test_columns_are_saved_like_the_dicts_were(tmp_path):
+    articles = [
+        Article(title=f'T{n}', date_published='2024-03-07', article_body='body',
+                keywords=('sweden', 'nato'), genre='news', file_path=f'{n}.html')
+        for n in range(3)
+    ]
+    buffer = ArticleColumns(articles)
+    assert len(buffer) == 3
+
+    out_path = tmp_path / 'out.csv'
+    save_parsed(buffer, out_path, append=False)
+    save_parsed(articles[:1], out_path, append=True)
+    df = pd.read_csv(out_path)
+    assert list(df.columns) == [
+        'title', 'date_published', 'abstract', 'article_body',
+        'keywords', 'genre', 'author', 'file_path',
+    ]
+    assert list(df['file_path']) == ['0.html', '1.html', '2.html', '0.html']
+    assert set(df['keywords']) == {"['sweden', 'nato']"}
+
+
+def test_outlet_column_only_when_set():
+    buffer = ArticleColumns([Article(file_path='a.html', outlet='nv')])
+    assert list(buffer.to_frame()['outlet']) == ['nv']
+
+
+PAGE = '''<html><body><h1>Sweden joins NATO</h1><time datetime="2024-03-07T10:00"></time>
+<div class="s-content"><p class="">Sweden became the 32nd member.</p></div>
+<ul class="c-tags__list"><li>Tags</li><li>NATO</li></ul></body></html>'''
+
+
+def test_versions_follow_the_field_methods():
+    hromadske, euractiv = HromadskeExtractor().versions(), EuractivExtractor().versions()
+    assert set(hromadske) == set(euractiv) == set(FIELD_METHODS)
+    # the body and the abstract of euractiv come from the same method
+    assert euractiv['article_body'] == euractiv['abstract']
+    assert hromadske['article_body'] != hromadske['abstract']
+    assert hromadske['title'] != euractiv['title']
+
+    # the date format is set in __init__
+    class OtherDates(HromadskeExtractor):
+        def __init__(self):
+            super().__init__()
+            self.date_str_format = '%d.%m.%Y'
+
+    other = OtherDates().versions()
+    assert other['date_published'] != hromadske['date_published']
+    assert other['title'] == hromadske['title']
+
+
+def test_reextract_updates_only_the_stale_fields(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_and_save, 'PATH', str(tmp_path))
+    monkeypatch.setattr(parse_and_save, 'OUT_PATH', str(tmp_path / 'parsed_data'))
+    (tmp_path / 'hromadske').mkdir()
+    for n in range(2):
+        (tmp_path / 'hromadske' / f'{n}.html').write_text(PAGE, encoding='utf-8')
+
+    extractor = HromadskeExtractor()
+    articles = [extractor.extract(str(tmp_path / 'hromadske' / f'{n}.html')) for n in range(2)]
+    for article in articles:
+        article.file_path = os.path.relpath(article.file_path, tmp_path)
+    out_path, log_path = parse_and_save.output_paths('hromadske')
+    save_parsed(articles, out_path, append=False)
+    with open(log_path, 'w', encoding='utf-8') as fp:
+        fp.write('the log of the parsing')
+    assert parse_and_save.reextract('hromadske') == 0
+
+    # the title method of the first row "has changed" since it was parsed
+    df = pd.read_csv(out_path)
+    versions = json.loads(df.loc[0, 'versions'])
+    versions['title'] = 'old'
+    df.loc[0, ['versions', 'title', 'article_body']] = [json.dumps(versions), 'stale', 'kept']
+    df.to_csv(out_path, index=False)
+
+    assert parse_and_save.reextract('hromadske') == 1
+    df = pd.read_csv(out_path)
+    assert list(df['title']) == ['Sweden joins NATO'] * 2
+    # the other fields are not recomputed
+    assert list(df['article_body']) == ['kept', 'Sweden became the 32nd member.']
+    assert list(df['keywords']) == ["['NATO']"] * 2
+    assert json.loads(df.loc[0, 'versions']) == extractor.versions()
+    # the log of the parsing is not overwritten
+    with open(log_path, encoding='utf-8') as fp:
+        assert fp.read() == 'the log of the parsing'
+    assert os.path.exists(tmp_path / 'parsed_data' / 'hromadske_reextract_log.txt')
@@ -0,0 +1,40 @@
+import random
+
+from batching import count_tokens, in_order, map_batched, token_batches
+
+
+def words(n):
+    return ' '.join(['word'] * n)
+
+
+def test_batches_stay_under_the_budget():
+    rng = random.Random(0)
+    texts = [words(rng.randint(1, 300)) for _ in range(500)]
+    batches = list(token_batches(texts, token_budget=1000, window=100))
+    for batch in batches:
+        lengths = [count_tokens(text) for _, text in batch]
+        assert lengths == sorted(lengths, reverse=True)
+        assert max(lengths) * len(lengths) <= 1000
+    assert sorted(index for batch in batches for index, _ in batch) == list(range(500))
+
+
+def test_long_text_gets_its_own_batch():
+    texts = [words(5), words(50), words(5)]
+    batches = list(token_batches(texts, token_budget=20, window=None))
+    assert [[index for index, _ in batch] for batch in batches] == [[1], [0, 2]]
+    assert len(list(token_batches(texts, token_budget=20, max_items=1))) == 3
+
+
+def test_window_reads_a_stream_in_parts():
+    texts = (words(n) for n in [1, 2, 3, 4])
+    batches = list(token_batches(texts, token_budget=100, window=2))
+    assert [[index for index, _ in batch] for batch in batches] == [[1, 0], [3, 2]]
+
+
+def test_results_come_back_in_order():
+    rng = random.Random(1)
+    texts = [words(rng.randint(1, 100)) for _ in range(200)]
+    assert list(map_batched(lambda batch: [count_tokens(t) for t in batch], texts, 300, window=50)) == [
+        count_tokens(text) for text in texts
+    ]
+    assert list(in_order([(2, 'c'), (0, 'a'), (1, 'b')])) == ['a', 'b', 'c']
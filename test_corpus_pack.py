@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from corpus_pack import PackReader, build_pack
+from extractors import HromadskeExtractor
+
+
+def test_build_and_read_pack(tmp_path):
+    root = tmp_path / 'hromadske'
+    root.mkdir()
+    pages = {'a.html': '<h1>Швеція</h1>', 'b.html': '<h1>Sweden</h1>'}
+    for name, html in pages.items():
+        (root / name).write_text(html, encoding='utf-8')
+
+    pack_path = str(tmp_path / 'packs' / 'hromadske.pack')
+    files = sorted(str(root / name) for name in pages)
+    assert build_pack(files, str(root), pack_path) == 2
+
+    with PackReader(pack_path, str(root)) as pack:
+        assert list(pack.paths()) == files
+        assert bytes(pack.read(files[0])).decode('utf-8') == '<h1>Швеція</h1>'
+
+        extractor = HromadskeExtractor()
+        extractor.reader = pack
+        assert extractor.find_title(extractor.make_soup(files[1])) == 'Sweden'
+        assert extractor.make_soup(os.path.join(str(root), 'missing.html')) is None
+
+
+def test_close_with_a_live_view(tmp_path):
+    (tmp_path / 'a.html').write_text('<h1>Sweden</h1>', encoding='utf-8')
+    pack_path = str(tmp_path / 'a.pack')
+    build_pack([str(tmp_path / 'a.html')], str(tmp_path), pack_path)
+
+    pack = PackReader(pack_path, str(tmp_path))
+    view = pack.read(str(tmp_path / 'a.html'))
+    page = bytes(view)
+    with pytest.raises(BufferError):
+        pack.close()
+    view.release()
+    pack.close()
+    assert page == b'<h1>Sweden</h1>'
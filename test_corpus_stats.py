@@ -0,0 +1,100 @@
+import pandas as pd
+import pytest
+
+from base_extractor import Article, ArticleColumns
+from corpus_stats import CorpusStats, month_of, parse_keywords, update_datasets
+
+ARTICLES = [
+    Article(title='a', date_published='2014-05-02', article_body='one two three',
+            keywords=('sweden', 'nato'), genre='news', author='A', file_path='nv/1.html'),
+    Article(title='b', date_published='2014-05-20', article_body='one two',
+            keywords=('sweden',), genre='news', author='B', file_path='nv/2.html'),
+    Article(title='c', date_published='2016-01-03', article_body='one',
+            keywords=('nato',), genre='opinion', author='A', file_path='nv/3.html'),
+    Article(title='d', date_published=None, article_body='one two',
+            keywords=(), genre='news', author=None, file_path='nv/4.html'),
+]
+
+
+def test_helpers():
+    assert month_of('2024-03-07') == '2024-03'
+    assert month_of(None) == month_of('n/a') == ''
+    assert parse_keywords("['a', 'b']") == ['a', 'b']
+    assert parse_keywords(float('nan')) == ()
+
+
+def test_rollups_are_updated_incrementally(tmp_path):
+    csv_path = tmp_path / 'nv.csv'
+    ArticleColumns(ARTICLES[:2]).to_frame().to_csv(csv_path, index=False)
+
+    with CorpusStats(str(tmp_path / 'stats.sqlite')) as stats:
+        assert stats.update_from_csv(csv_path, 'nv') == 2
+        # the csv grows, only the new articles are counted
+        ArticleColumns(ARTICLES[2:]).to_frame().to_csv(csv_path, index=False, mode='a', header=False)
+        assert stats.update_from_csv(csv_path, 'nv') == 2
+        assert stats.update_from_csv(csv_path, 'nv') == 0
+        assert stats.add('sputnik', [{
+            'file_path': 'sputnik/1.html', 'date_published': '2014-05-01', 'article_body': 'x',
+            'keywords': ['nato'], 'genre': 'news', 'author': None,
+        }]) == 1
+        assert len(stats) == 5
+
+        months = stats.months(outlet='nv')
+        assert list(zip(months['month'], months['articles'], months['tokens'])) == [
+            ('', 1, 2), ('2014-05', 2, 5), ('2016-01', 1, 1)
+        ]
+        totals = stats.totals(period='2010-2014')
+        assert dict(zip(totals['outlet'], totals['articles'])) == {'nv': 2, 'sputnik': 1}
+
+        top = stats.top('keywords', period='2010-2014', n=1)
+        assert list(zip(top['keyword'], top['n'])) == [('nato', 2)]
+        by_year = stats.top('authors', outlet='nv', by_year=True)
+        assert list(zip(by_year['year'], by_year['author'], by_year['n'])) == [
+            ('2014', 'A', 1), ('2014', 'B', 1), ('2016', 'A', 1)
+        ]
+        assert 'Top genres' in stats.report(period='2015-2019')
+
+        stats.forget('sputnik')
+        assert len(stats) == 4
+        assert list(stats.totals()['outlet']) == ['nv']
+
+
+def test_rollups_survive_reopening(tmp_path):
+    db_path = str(tmp_path / 'stats.sqlite')
+    with CorpusStats(db_path) as stats:
+        stats.add('nv', ARTICLES)
+    with CorpusStats(db_path) as stats:
+        assert stats.add('nv', ARTICLES) == 0
+        genres = stats.top('genres')
+        assert isinstance(genres, pd.DataFrame)
+        assert list(zip(genres['genre'], genres['n'])) == [('news', 3), ('opinion', 1)]
+
+
+def test_datasets_are_forgotten_by_their_own_articles(tmp_path):
+    # a page of a dataset with several outlets carries its outlet
+    dump_page = {
+        'file_path': 'dump/1.html', 'date_published': '2014-05-09', 'article_body': 'one',
+        'keywords': ['nato'], 'genre': 'news', 'author': 'C', 'outlet': 'nv',
+    }
+    with CorpusStats(str(tmp_path / 'stats.sqlite')) as stats:
+        stats.add('nv', ARTICLES[:2])
+        stats.add('dump', [dump_page])
+        months = stats.months(outlet='nv')
+        assert list(zip(months['month'], months['articles'], months['tokens'])) == [('2014-05', 3, 6)]
+
+        stats.forget('dump')
+        assert len(stats) == 2
+        assert list(stats.months(outlet='nv')['articles']) == [2]
+        # and it is counted again after the rebuild
+        assert stats.add('dump', [dump_page]) == 1
+        stats.forget('nv')
+        assert list(stats.months(outlet='nv')['articles']) == [1]
+        top = stats.top('authors', outlet='nv')
+        assert list(zip(top['author'], top['n'])) == [('C', 1)]
+
+
+def test_the_mixed_dataset_is_not_counted(tmp_path):
+    with CorpusStats(str(tmp_path / 'stats.sqlite')) as stats:
+        with pytest.raises(ValueError, match='mixed'):
+            update_datasets(stats, ['nv', 'mixed'])
+        assert len(stats) == 0
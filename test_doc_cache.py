@@ -0,0 +1,54 @@
+import spacy
+from spacy.tokens import Span
+
+from doc_cache import DocCache, build_cache, resolve_cached
+
+
+def make_doc(nlp, text):
+    '''A doc like the coref pipeline gives: entities, tags and a coref cluster.'''
+    doc = nlp(text)
+    for token in doc:
+        token.pos_ = 'PROPN' if token.text == 'Sweden' else 'PRON' if token.text == 'It' else 'VERB'
+        token.lemma_ = token.text.lower()
+    doc.ents = [Span(doc, 0, 1, label='GPE')]
+    doc.spans['coref_clusters_1'] = [Span(doc, 0, 1), Span(doc, 4, 5)]
+    return doc
+
+
+class FakePipeline:
+    '''Stands in for the transformer pipeline: counts the texts it processes.'''
+    def __init__(self):
+        self.nlp = spacy.blank('en')
+        self.processed = 0
+
+    def pipe(self, records, batch_size, as_tuples):
+        for text, key in records:
+            self.processed += 1
+            yield make_doc(self.nlp, text), key
+
+
+def test_cache_roundtrip_and_lazy_shards(tmp_path):
+    pipeline = FakePipeline()
+    records = [(f'file{i}', f'Sweden joined NATO . It was {i} .') for i in range(5)]
+    with DocCache(tmp_path, shard_size=2) as cache:
+        assert build_cache(records, cache, pipeline) == 5
+    assert cache.shards == 3
+
+    # a new cache object reads the index; no shard is loaded before it's needed
+    cache = DocCache(tmp_path)
+    assert len(cache) == 5 and 'file4' in cache and not cache.loaded
+    doc = cache.get('file3')
+    assert list(cache.loaded) == [1]
+    assert doc.text == 'Sweden joined NATO . It was 3 .'
+    assert [ent.label_ for ent in doc.ents] == ['GPE']
+    assert [(span.start, span.end) for span in doc.spans['coref_clusters_1']] == [(0, 1), (4, 5)]
+
+    # the docs which are cached are not processed again
+    assert build_cache(records + [('file5', 'Sweden won . It was fun .')], cache, pipeline) == 1
+    assert pipeline.processed == 6
+
+
+def test_heuristics_run_on_cached_docs(tmp_path):
+    with DocCache(tmp_path) as cache:
+        build_cache([('a', 'Sweden joined NATO . It was ready .')], cache, FakePipeline())
+    assert dict(resolve_cached(DocCache(tmp_path))) == {'a': 'Sweden joined NATO. Sweden was ready.'}
@@ -0,0 +1,61 @@
+from base_extractor import MemoryReader
+from extractor_registry import AutoExtractor, route_page
+from parse_and_save import ALL_DATASETS, DATASET_CONFIG
+
+PAGES = {
+    'sputnik': '<div class="article__header"></div><div class="article__body"></div>',
+    'hromadske': '<link rel="canonical" href="https://hromadske.ua/posts/x"><div class="s-content"></div>',
+    'nv': '<div class="article__head__additional_published"></div><div class="content_wrapper"></div>',
+    'ukrinform': '<h1 class="newsTitle"></h1><div class="newsText"></div>',
+    'kyivpost': '<section id="section_0"></section><div class="post-info"></div>',
+    'kyivpost_archive': '<div class="entry-content"></div><div class="pm-item"></div>',
+    'tyzhden': '<div class="entry-content"></div><div class="all-tags"></div><span class="a-name"></span>',
+    'euractiv': '<div class="ea-article-body-content"></div>',
+}
+
+HROMADSKE = '''<html><body><h1>Sweden joins NATO</h1><time datetime="2024-03-07T10:00"></time>
+<div class="s-content"><p class="">Sweden became the 32nd member.</p></div>
+</body></html>'''
+
+
+def test_pages_are_routed_by_their_markup():
+    for outlet, html in PAGES.items():
+        # the path says nothing about the outlet
+        assert route_page('dump/page.html', f'<html><body>{html}</body></html>').name == outlet
+
+
+def test_path_outweighs_a_stray_marker():
+    html = '<div class="entry-content"></div>'
+    assert route_page('../data/tyzhden/1.HTM', html).name == 'tyzhden'
+    assert route_page('../data/kyivpost/archive_kyivpost/1.html', html).name == 'kyivpost_archive'
+    assert route_page('../data/nv/ukr/1.html', '').name == 'nv'
+
+
+def test_unknown_page_is_not_routed():
+    assert route_page('dump/page.html', '<html><body><p>hi</p></body></html>') is None
+    # the names of the outlets in the text are not their hosts
+    assert route_page('dump/page.html', '<p>sputnik and ukrinform reported</p>') is None
+
+
+def test_markers_after_the_head_are_found():
+    html = ' ' * 100 + PAGES['ukrinform']
+    assert route_page('dump/page.html', html, head_chars=10).name == 'ukrinform'
+
+
+def test_auto_extractor_parses_with_the_outlet_extractor():
+    extractor = AutoExtractor()
+    extractor.reader = MemoryReader({
+        '../data/mixed/a.html': HROMADSKE,
+        '../data/mixed/b.html': '<html><body><p>hi</p></body></html>',
+    })
+    parsed = extractor.extract('../data/mixed/a.html')
+    assert parsed['outlet'] == 'hromadske'
+    assert parsed['title'] == 'Sweden joins NATO'
+    assert parsed['date_published'] == '2024-03-07'
+    assert parsed['file_path'] == 'mixed/a.html'
+    assert extractor.extract('../data/mixed/b.html') is None
+
+
+def test_mixed_dataset_is_not_in_all():
+    assert 'mixed' not in ALL_DATASETS
+    assert set(ALL_DATASETS) == set(DATASET_CONFIG) - {'mixed'}
@@ -0,0 +1,61 @@
+import glob
+import os
+
+import pytest
+
+from file_discovery import discover_files, schema_to_regex
+
+
+def make_tree(root):
+    for rel_path in [
+        '20120618/174104542.html',
+        '20190927/church-of-sweden.html',
+        '2019092/too-short.html',
+        'index-pages/1.html',
+        'index-pages/links.csv',
+        'world/deep/nested/article.html',
+        'TYZHDEN/ARTICLE/INDEX.HTM',
+        'kyivpost/archive_kyivpost/world/news.html',
+        'top.html',
+    ]:
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write('<html></html>')
+
+
+@pytest.mark.parametrize('path_schema', [
+    f"{'[0-9]' * 8}/*.html",
+    '**/*.html',
+    '*.html',
+    '**/*.HTM',
+    'kyivpost/archive_kyivpost/**/*.html',
+])
+def test_same_files_as_glob_without_index_pages(tmp_path, path_schema):
+    root = str(tmp_path)
+    make_tree(root)
+    expected = {
+        path for path in glob.iglob(os.path.join(root, path_schema), recursive=True)
+        if 'index-pages' not in path
+    }
+    assert set(discover_files(root, path_schema)) == expected
+
+
+def test_cached_listing_follows_changes(tmp_path):
+    root = str(tmp_path / 'data')
+    make_tree(root)
+    cache_path = str(tmp_path / 'listing.json')
+
+    first = discover_files(root, '**/*.html', cache_path=cache_path)
+    assert discover_files(root, '**/*.html', cache_path=cache_path) == first
+
+    new_file = os.path.join(root, 'world', 'deep', 'new.html')
+    with open(new_file, 'w') as fp:
+        fp.write('<html></html>')
+    assert set(discover_files(root, '**/*.html', cache_path=cache_path)) == set(first) | {new_file}
+
+
+def test_alternatives_in_the_schema():
+    pattern = schema_to_regex('**/*.[hH][tT][mM]{,[lL]}')
+    assert all(pattern.match(path) for path in ('a.htm', 'x/a.html', 'A.HTML', 'b/c/A.HTM'))
+    assert not any(pattern.match(path) for path in ('a.html.part', 'a.html.tmp', 'a.htmx', 'a.txt'))
@@ -0,0 +1,45 @@
+'''
+Golden tests of the extractors, see golden.py (python golden.py update regenerates the expectations).
+'''
+import json
+import os
+
+import pytest
+
+from extractor_registry import route_page
+from file_discovery import schema_to_regex
+from golden import GOLDEN_DIR, expected_path, extract, golden_pages, golden_root
+from parse_and_save import ALL_DATASETS, DATASET_CONFIG
+
+
+def test_every_extractor_has_fixtures():
+    datasets = {dataset_name for dataset_name, _ in golden_pages()}
+    assert datasets == set(ALL_DATASETS)
+
+
+def test_every_fixture_belongs_to_one_dataset():
+    fixtures = [
+        os.path.join(dir_path, name)
+        for dir_path, _, files in os.walk(GOLDEN_DIR) for name in files if not name.endswith('.json')
+    ]
+    assert sorted(fixtures) == sorted(page_path for _, page_path in golden_pages())
+
+
+@pytest.mark.parametrize(
+    'dataset_name, page_path', golden_pages(),
+    ids=[os.path.relpath(page_path, GOLDEN_DIR) for _, page_path in golden_pages()]
+)
+def test_golden(dataset_name, page_path):
+    with open(expected_path(page_path), encoding='utf-8') as fp:
+        expected = json.load(fp)
+    assert extract(dataset_name, page_path) == expected
+
+    # the fixtures are laid out like the data folder
+    relative_path = os.path.relpath(page_path, golden_root(dataset_name))
+    assert schema_to_regex(DATASET_CONFIG[dataset_name]['path_schema']).match(relative_path)
+    with open(page_path, encoding='utf-8') as fp:
+        html = fp.read()
+    # the mixed dataset routes the page to the same extractor (by the markup only)
+    if expected is not None:
+        assert route_page('page.html', html).name == dataset_name
+
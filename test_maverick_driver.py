@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+import maverick_driver
+from maverick_driver import load_checkpoint, make_batches
+
+
+def test_batches_are_sorted_by_length():
+    articles = [(f'a{n}', ' '.join(['word'] * n)) for n in (5, 50, 1, 20, 20)]
+    batches = list(make_batches(articles, batch_tokens=40, batch_articles=2))
+    lengths = [[len(text.split()) for _, text in batch] for batch in batches]
+    assert lengths == [[50], [20, 20], [5, 1]]
+    assert sorted(article_id for batch in batches for article_id, _ in batch) == sorted(
+        article_id for article_id, _ in articles
+    )
+
+
+def test_checkpoint_skips_a_cut_off_line(tmp_path):
+    out_path = tmp_path / 'resolved.jsonl'
+    with open(out_path, 'w', encoding='utf-8') as fp:
+        fp.write(json.dumps({'article_id': 'a1', 'resolved_text': 'x', 'clusters': []}) + '\n')
+        fp.write(json.dumps({'article_id': 'a2', 'resolved_text': None, 'clusters': None, 'error': 'e'}) + '\n')
+        fp.write('{"article_id": "a3", "resol')
+    assert load_checkpoint(out_path) == {'a1', 'a2'}
+    assert load_checkpoint(tmp_path / 'missing.jsonl') == set()
+
+
+def test_resume_after_a_cut_off_line(tmp_path, monkeypatch):
+    out_path = tmp_path / 'resolved.jsonl'
+    with open(out_path, 'w', encoding='utf-8') as fp:
+        fp.write(json.dumps({'article_id': 'a1', 'resolved_text': 'x', 'clusters': []}) + '\n')
+        fp.write('{"article_id": "a2", "resol')
+
+    def resolve_batch(batch):
+        return [(article_id, text.upper(), [], None) for article_id, text in batch]
+
+    # threads instead of the processes which would load Maverick
+    monkeypatch.setattr(maverick_driver, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(maverick_driver, '_init_worker', lambda *args: None)
+    monkeypatch.setattr(maverick_driver, 'resolve_batch', resolve_batch)
+    maverick_driver.run([('a1', 'x'), ('a2', 'y'), ('a3', 'z')], str(out_path))
+
+    resolved = maverick_driver.load_resolved(out_path)
+    assert sorted(resolved['article_id']) == ['a1', 'a2', 'a3']
+    assert dict(zip(resolved['article_id'], resolved['resolved_text']))['a2'] == 'Y'
+
+    # a file cut right after a newline is left as it is
+    size = out_path.stat().st_size
+    maverick_driver.drop_partial_line(out_path)
+    assert out_path.stat().st_size == size
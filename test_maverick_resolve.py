@@ -1,4 +1,4 @@
-from maverick_resolve import get_canonical_mention, find_nonoverlapping_spans
+from maverick_resolve import get_canonical_mention, find_nonoverlapping_spans, resolve_many
 
 assert get_canonical_mention(
     ['Ukraine ’s hetman', 'Ukraine ’s hetman Ivan Mazepa', 'Ivan Mazepa']
@@ -85,3 +85,23 @@ assert find_nonoverlapping_spans(llist) == llist
 
 assert find_nonoverlapping_spans(((62, 64), (62, 66), (65, 66))) == [(62, 66)]
 
+
+assert find_nonoverlapping_spans([(5, 7)]) == [(5, 7)]
+
+assert find_nonoverlapping_spans([(70, 75), (62, 66), (63, 64), (71, 71)]) == [(62, 66), (70, 75)]
+
+
+class FakeMaverick:
+    def __init__(self):
+        self.predicted = []
+
+    def predict(self, text):
+        self.predicted.append(text)
+        return {'tokens': text.split(), 'clusters_token_text': [], 'clusters_token_offsets': []}
+
+
+# the texts without anything about Sweden are not sent to the model
+model = FakeMaverick()
+resolved = resolve_many(model, ['Prices rose.', 'Sweden sent aid.', ''], context=0)
+assert model.predicted == ['Sweden sent aid.']
+assert resolved[0] == resolved[2] == ''
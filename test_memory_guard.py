@@ -0,0 +1,102 @@
+import pandas as pd
+
+from extractors import HromadskeExtractor
+from memory_guard import MB, MemoryGuard, current_rss, peak_rss
+import parse_and_save
+
+PAGE = '''<html><body><h1>Sweden joins NATO</h1><time datetime="2024-03-07T10:00"></time>
+<div class="s-content"><p class="">Sweden became the 32nd member.</p><p class="">{n}</p></div>
+</body></html>'''
+
+
+def test_rss():
+    assert current_rss() > 0 and peak_rss() > 0
+
+
+def test_largest_documents_and_peaks():
+    guard = MemoryGuard('test', top_docs=2)
+    for n, size in enumerate([10, 30, 20, 5]):
+        guard.track(f'{n}.html', size, 'nv' if n % 2 else 'sputnik', rss=(n + 1) * MB, used=size * 2)
+    assert sorted(guard.largest, reverse=True) == [(30, '1.html'), (20, '2.html')]
+    assert sorted(guard.hungriest, reverse=True) == [(60, '1.html'), (40, '2.html')]
+    assert guard.label_peaks == {'sputnik': 3 * MB, 'nv': 4 * MB}
+    assert guard.peak == 4 * MB
+    assert '1.html' in guard.report()
+
+
+def test_soft_limit_flushes_and_collects():
+    flushed = []
+    guard = MemoryGuard('test', soft_limit_mb=2, on_limit=lambda: flushed.append(True))
+    guard.track('a.html', 1, None, rss=1 * MB)
+    assert not flushed
+    guard.track('b.html', 1, None, rss=3 * MB)
+    assert flushed == [True] and guard.reliefs == 1
+
+
+def test_no_flush_after_every_document_above_the_limit():
+    flushed = []
+    guard = MemoryGuard('test', soft_limit_mb=10, on_limit=lambda: flushed.append(True), rearm_docs=4)
+    # the RSS doesn't go back down after a flush: the limit is re-armed every 4 docs only
+    for n in range(10):
+        guard.track(f'{n}.html', 1, None, rss=12 * MB)
+    assert len(flushed) == 3
+    # ...or as soon as the RSS falls 10% below the limit
+    guard.track('a.html', 1, None, rss=12 * MB)
+    guard.track('b.html', 1, None, rss=8 * MB)
+    guard.track('c.html', 1, None, rss=12 * MB)
+    assert len(flushed) == 4
+    # but just below the limit isn't enough
+    guard.track('d.html', 1, None, rss=int(9.5 * MB))
+    guard.track('e.html', 1, None, rss=12 * MB)
+    assert len(flushed) == 4
+
+
+def test_snapshots_and_the_label_set_after_parsing():
+    with MemoryGuard('test', snapshot_every=2) as guard:
+        kept = []
+        for n in range(4):
+            with guard.document(f'{n}.html', 100) as document:
+                kept.append(bytearray(MB))
+                document['label'] = 'hromadske'
+    assert len(guard.snapshots) == 2
+    assert guard.label_peaks.keys() == {'hromadske'}
+    # the tracemalloc peak of every document is about the megabyte it allocated
+    assert all(used >= MB for used, _ in guard.hungriest)
+
+
+def test_extract_releases_the_soup(tmp_path):
+    page = tmp_path / 'a.html'
+    page.write_text(PAGE.format(n=1), encoding='utf-8')
+    extractor = HromadskeExtractor()
+    soup = extractor.make_soup(str(page))
+    extractor.release(soup)
+    assert soup.contents == []
+
+    released = []
+    release = extractor.release
+    extractor.release = lambda soup: released.append(release(soup))
+    # not by default: it costs more time than it saves without memory pressure
+    assert extractor.extract(str(page)).title == 'Sweden joins NATO'
+    assert released == []
+    # the article's fields are strings, which outlive the soup
+    extractor.release_soups = True
+    assert extractor.extract(str(page)).title == 'Sweden joins NATO'
+    assert len(released) == 1
+
+
+def test_parse_dataset_flushes_over_the_limit(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(parse_and_save, 'PATH', str(tmp_path))
+    monkeypatch.setattr(parse_and_save, 'OUT_PATH', str(tmp_path / 'parsed_data'))
+    monkeypatch.setattr(parse_and_save, 'LISTING_PATH', str(tmp_path / 'listings'))
+    (tmp_path / 'hromadske').mkdir()
+    for n in range(3):
+        (tmp_path / 'hromadske' / f'{n}.html').write_text(PAGE.format(n=n), encoding='utf-8')
+
+    # any process is over 1 MB: flushed after the first article, not after every one
+    assert parse_and_save.parse_dataset('hromadske', memory_limit_mb=1) == 3
+    assert capsys.readouterr().out.count('over the soft limit 1 MB') == 1
+    out_path, _ = parse_and_save.output_paths('hromadske')
+    df = pd.read_csv(out_path)
+    assert len(df) == 3 and list(df.columns)[0] == 'title'
+    # nothing new the second time
+    assert parse_and_save.parse_dataset('hromadske') == 0
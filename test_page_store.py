@@ -0,0 +1,28 @@
+import os
+
+from page_store import PageStore
+
+
+def test_put_and_read(tmp_path):
+    source_dir = str(tmp_path / 'nv')
+    store = PageStore(source_dir)
+    file_path = os.path.join(source_dir, 'world', 'article-1.html')
+    store.put(file_path, '<h1>Швеція</h1>', url='https://nv.ua/world/article-1.html', etag='"abc"')
+
+    assert file_path in store
+    assert store.read(file_path) == '<h1>Швеція</h1>'
+    assert list(store.paths()) == [file_path]
+    assert store.validators(file_path) == {'If-None-Match': '"abc"'}
+
+
+def test_newest_copy_wins_after_reload(tmp_path):
+    source_dir = str(tmp_path / 'nv')
+    file_path = os.path.join(source_dir, 'article.html')
+    store = PageStore(source_dir, segment_size=1)  # every page goes to a new segment
+    store.put(file_path, 'old')
+    store.put(file_path, 'new', last_modified='Wed, 21 Oct 2015 07:28:00 GMT')
+
+    reloaded = PageStore(source_dir)
+    assert len(reloaded) == 1
+    assert reloaded.read(file_path) == 'new'
+    assert reloaded.validators(file_path) == {'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'}
@@ -0,0 +1,36 @@
+import os
+
+import pandas as pd
+
+import parse_and_save
+from pipeline import ScrapePipeline
+from scraper import SimpleScraper
+
+PAGE = '''<html><body><h1>Sweden joins NATO</h1><time datetime="2024-03-07T10:00"></time>
+<div class="s-content"><p class="">Sweden became the 32nd member.</p><p class="">{n}</p></div>
+</body></html>'''
+
+
+def test_pages_are_parsed_as_they_are_downloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_and_save, 'OUT_PATH', str(tmp_path / 'parsed_data'))
+    scraper = SimpleScraper('hromadske', data_dir=str(tmp_path / 'data'))
+
+    with ScrapePipeline(scraper, workers=2, max_pending=2, flush_every=2) as pipeline:
+        for n in range(5):
+            filename = os.path.join(scraper.source_dir, f'{n}.html')
+            scraper.on_page(filename, PAGE.format(n=n), f'https://hromadske.ua/{n}')
+        # a page without an article (a crash of the extractor would be retried instead)
+        scraper.on_page(
+            os.path.join(scraper.source_dir, 'empty.html'),
+            '<html><body><h1>Tags</h1><div class="s-content"></div></body></html>', 'x'
+        )
+
+    df = pd.read_csv(tmp_path / 'parsed_data' / 'hromadske.csv')
+    assert sorted(df['file_path']) == [f'hromadske/{n}.html' for n in range(5)]
+    assert set(df['date_published']) == {'2024-03-07'}
+    assert pipeline.output.skipped == {'../data/hromadske/empty.html'}
+
+    # a page which is already in the csv is not parsed again
+    with ScrapePipeline(scraper, workers=1) as pipeline:
+        scraper.on_page(os.path.join(scraper.source_dir, '0.html'), PAGE.format(n=0), 'y')
+    assert pipeline.submitted == 0
@@ -0,0 +1,81 @@
+from email.utils import format_datetime
+from datetime import datetime, timezone
+
+from rate_control import RateController, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(round(seconds, 3))
+        self.now += seconds
+
+
+def make_controller(clock, **kwargs):
+    return RateController(delay=2.0, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_hosts_are_spaced_by_their_delay():
+    clock = FakeClock()
+    rate = make_controller(clock)
+    rate.wait('https://nv.ua/a')
+    rate.wait('https://nv.ua/b')
+    rate.wait('https://www.ukrinform.ua/c')  # another host doesn't wait
+    assert clock.slept == [2.0]
+
+
+def test_faster_while_healthy_slower_when_throttled():
+    clock = FakeClock()
+    rate = make_controller(clock, healthy_streak=5, rate_step=0.1)
+    for _ in range(5):
+        rate.record('https://nv.ua/a', 200)
+    faster = rate.hosts['nv.ua'].delay
+    assert faster < 2.0
+    assert rate.record('https://nv.ua/a', 429) is False
+    assert rate.hosts['nv.ua'].delay == faster * 2
+    assert rate.metrics()['nv.ua']['throttled'] == 1
+
+
+def test_forbidden_backs_off_and_other_errors_are_not_healthy():
+    clock = FakeClock()
+    rate = make_controller(clock, healthy_streak=2, rate_step=0.1)
+    assert rate.record('https://nv.ua/a', 403) is False
+    assert rate.record('https://nv.ua/a', 401) is False
+    assert rate.hosts['nv.ua'].delay == 8.0
+    assert rate.hosts['nv.ua'].throttled == 2
+
+    for status in (400, 410, 410, 451):
+        assert rate.record('https://nv.ua/a', status) is False
+    state = rate.hosts['nv.ua']
+    assert state.delay == 8.0 and state.ok == 0 and state.streak == 0
+    # a missing page is still a healthy answer
+    assert rate.record('https://nv.ua/a', 404) is True
+    assert state.ok == 1
+
+
+def test_retry_after_blocks_the_host():
+    clock = FakeClock()
+    rate = make_controller(clock)
+    rate.record('https://nv.ua/a', 503, {'Retry-After': '120'})
+    rate.wait('https://nv.ua/a')
+    assert clock.slept == [120.0]
+    assert parse_retry_after(
+        format_datetime(datetime.fromtimestamp(1_000_060, timezone.utc), usegmt=True), now=1_000_000
+    ) == 60
+    assert parse_retry_after('soon') is None
+
+
+def test_delays_are_kept_between_runs(tmp_path):
+    state_path = str(tmp_path / 'rate-state.json')
+    rate = make_controller(FakeClock(), state_path=state_path)
+    rate.record_error('https://nv.ua/a')
+    rate.save()
+    again = make_controller(FakeClock(), state_path=state_path)
+    assert again.metrics()['nv.ua']['delay'] == 3.0
+    assert again.metrics()['nv.ua']['requests'] == 0
@@ -0,0 +1,43 @@
+from relevance import relevant_passages, relevant_sentences, relevant_text
+
+
+TEXT = (
+    'Kyiv hosted a summit. Ministers met. Sweden sent aid. It was the third package. '
+    'Prices rose. Markets fell. Weather was fine. The Swedes voted. They chose NATO.'
+)
+
+
+def test_relevant_sentences():
+    assert relevant_sentences(TEXT) == ['Sweden sent aid.', 'The Swedes voted.']
+    assert relevant_sentences('Nothing here.') == []
+    assert relevant_sentences('') == []
+
+
+def test_ukrainian_and_russian_forms():
+    assert relevant_sentences('Україна і Швеція підписали угоду. Інше речення.') == [
+        'Україна і Швеція підписали угоду.'
+    ]
+    assert relevant_sentences('Делегація прибула до Стокгольма. Шведські війська.') == [
+        'Делегація прибула до Стокгольма.', 'Шведські війська.'
+    ]
+    assert relevant_sentences('В Швеции прошли выборы.') == ['В Швеции прошли выборы.']
+    assert relevant_sentences('Швецією. Швецию.') == ['Швецією.', 'Швецию.']
+
+
+def test_surname_and_shoemaker_are_not_sweden():
+    assert relevant_sentences('Заяву зробив Олександр Швець. Швеця не було.') == []
+    assert relevant_sentences('Старий швець лагодив чоботи.') == []
+
+
+def test_context_window():
+    assert relevant_passages(TEXT, context=1) == [
+        'Ministers met. Sweden sent aid. It was the third package.',
+        'Weather was fine. The Swedes voted. They chose NATO.',
+    ]
+    # the windows touch: one passage
+    assert relevant_passages(TEXT, context=2) == [
+        'Kyiv hosted a summit. Ministers met. Sweden sent aid. It was the third package. '
+        'Prices rose. Markets fell. Weather was fine. The Swedes voted. They chose NATO.'
+    ]
+    assert relevant_text(TEXT, context=0) == 'Sweden sent aid.\n\nThe Swedes voted.'
+    assert relevant_text('Nothing here.') == ''
@@ -0,0 +1,62 @@
+import json
+
+import pandas as pd
+
+import resolve_dataset
+from resolve_dataset import resolve_dataset as run
+
+
+class UpperResolver:
+    '''Stands in for spacy_resolve: "resolves" a text by upper-casing it.'''
+    calls = 0
+
+    @classmethod
+    def resolve_many(cls, texts, context=None, with_clusters=False):
+        cls.calls += len(texts)
+        return [(text.upper(), [[[0, 1], [2, 3]]]) for text in texts]
+
+
+def make_csv(path, n_rows):
+    pd.DataFrame({
+        'title': [f't{i}' for i in range(n_rows)],
+        'article_body': [None if i == 3 else f'body\n{i}' for i in range(n_rows)],
+    }).to_csv(path, index=False)
+
+
+def test_resolve_and_resume(tmp_path, monkeypatch):
+    monkeypatch.setattr(resolve_dataset, '_RESOLVER', UpperResolver)
+    csv_path, out_path = tmp_path / 'parsed.csv', str(tmp_path / 'resolved.csv')
+    make_csv(csv_path, 10)
+
+    run(csv_path, out_path, limit=4, chunk_size=3)
+    df = pd.read_csv(out_path)
+    assert df['title'].tolist() == ['t0', 't1', 't2', 't3']
+    assert df['resolved_body'].tolist()[:3] == ['BODY\n0', 'BODY\n1', 'BODY\n2']
+    assert pd.isna(df['resolved_body'][3]) and df['n_clusters'][3] == 0
+    assert json.loads(df['coref_clusters'][0]) == [[[0, 1], [2, 3]]]
+
+    # a crash while the next chunk was written: the half-written rows are cut off on resume
+    with open(out_path, 'a', encoding='utf-8') as fp:
+        fp.write('t4,body 4,BO')
+    UpperResolver.calls = 0
+    run(csv_path, out_path, resume=True, chunk_size=3)
+    df = pd.read_csv(out_path)
+    assert df['title'].tolist() == [f't{i}' for i in range(10)]
+    assert df['resolved_body'][9] == 'BODY\n9'
+    assert UpperResolver.calls == 6
+
+    # without --resume the run starts from the top
+    run(csv_path, out_path, limit=2, chunk_size=3)
+    assert pd.read_csv(out_path)['title'].tolist() == ['t0', 't1']
+
+
+def test_the_passages_of_the_offsets_are_kept_with_context(tmp_path, monkeypatch):
+    monkeypatch.setattr(resolve_dataset, '_RESOLVER', UpperResolver)
+    chunk = pd.DataFrame({'article_body': [
+        'Rain. Sweden joined NATO. It was the 32nd member.', 'Nothing here.', None,
+    ]})
+    resolved = resolve_dataset.resolve_chunk(chunk, context=0)
+    assert resolved['coref_text'].tolist()[:2] == ['Sweden joined NATO.', '']
+    assert pd.isna(resolved['coref_text'][2])
+    # without context the offsets are the ones of the article body
+    assert 'coref_text' not in resolve_dataset.resolve_chunk(chunk).columns
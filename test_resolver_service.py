@@ -0,0 +1,125 @@
+from multiprocessing import AuthenticationError
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from resolver_service import ResolverClient, ResolverService, default_address, key_path, private_dir
+
+
+def upper_many(texts, context=None, with_clusters=False):
+    if 'fail' in texts:
+        raise ValueError('bad text')
+    if with_clusters:
+        return [(text.upper(), []) for text in texts]
+    return [text.upper() for text in texts]
+
+
+def start_service(address, **kwargs):
+    service = ResolverService(address, resolve_many=upper_many, deadline=0.2, **kwargs)
+    thread = threading.Thread(target=service.serve, daemon=True)
+    thread.start()
+    while service.listener is None:
+        time.sleep(0.01)
+    return service, thread
+
+
+def test_clients_share_micro_batches(tmp_path, monkeypatch):
+    monkeypatch.delenv('RESOLVER_SERVICE_KEY', raising=False)
+    address = str(tmp_path / 'resolver.sock')
+    service, thread = start_service(address)
+
+    results = {}
+
+    def work(n):
+        with ResolverClient(address) as client:
+            results[n] = client.resolve_many([f'text {n}', f'more {n}'])
+
+    workers = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert results == {n: [f'TEXT {n}', f'MORE {n}'] for n in range(4)}
+    assert service.texts == 8
+
+    with ResolverClient(address) as client:
+        assert client.resolve('sweden') == 'SWEDEN'
+        assert client.resolve_many(['a'], with_clusters=True) == [('A', [])]
+        with pytest.raises(RuntimeError, match='bad text'):
+            client.resolve('fail')
+    service.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert not os.path.exists(key_path(address))
+
+
+def test_only_the_owner_with_the_key_can_connect(tmp_path, monkeypatch):
+    monkeypatch.delenv('RESOLVER_SERVICE_KEY', raising=False)
+    address = str(tmp_path / 'resolver.sock')
+    service, thread = start_service(address)
+    try:
+        assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+        assert stat.S_IMODE(os.stat(key_path(address)).st_mode) == 0o600
+        with pytest.raises(AuthenticationError):
+            ResolverClient(address, authkey=b'guess')
+        # a failed client doesn't stop the service
+        with ResolverClient(address) as client:
+            assert client.resolve('sweden') == 'SWEDEN'
+    finally:
+        service.stop()
+        thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_key_from_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv('RESOLVER_SERVICE_KEY', 'shared secret')
+    address = str(tmp_path / 'resolver.sock')
+    service, thread = start_service(address)
+    try:
+        assert not os.path.exists(key_path(address))
+        with ResolverClient(address) as client:
+            assert client.resolve('nato') == 'NATO'
+    finally:
+        service.stop()
+        thread.join(timeout=5)
+
+
+def test_a_planted_key_file_is_replaced(tmp_path, monkeypatch):
+    monkeypatch.delenv('RESOLVER_SERVICE_KEY', raising=False)
+    address = str(tmp_path / 'resolver.sock')
+    planted = tmp_path / 'planted'
+    planted.write_text('readable by anyone')
+    planted.chmod(0o644)
+    os.symlink(planted, key_path(address))
+
+    service, thread = start_service(address)
+    try:
+        # the symlink was removed, not followed
+        assert planted.read_text() == 'readable by anyone'
+        assert not os.path.islink(key_path(address))
+        assert stat.S_IMODE(os.stat(key_path(address)).st_mode) == 0o600
+        with ResolverClient(address) as client:
+            assert client.resolve('sweden') == 'SWEDEN'
+    finally:
+        service.stop()
+        thread.join(timeout=5)
+
+
+def test_the_default_socket_is_in_a_private_directory(tmp_path, monkeypatch):
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    assert default_address().endswith(f'resolver-service-{os.getuid()}/resolver-service.sock')
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    assert default_address() == str(tmp_path / 'resolver-service.sock')
+
+    private_dir(str(tmp_path / 'mine'))
+    assert stat.S_IMODE(os.stat(tmp_path / 'mine').st_mode) == 0o700
+    (tmp_path / 'shared').mkdir(mode=0o777)
+    os.chmod(tmp_path / 'shared', 0o777)
+    with pytest.raises(RuntimeError):
+        private_dir(str(tmp_path / 'shared'))
+    os.symlink(tmp_path / 'mine', tmp_path / 'link')
+    with pytest.raises(RuntimeError):
+        private_dir(str(tmp_path / 'link'))
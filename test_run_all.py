@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from corpus_pack import build_pack
+from golden import GOLDEN_DIR, expected_path, golden_pages, golden_root
+import parse_and_save
+import run_all
+from run_all import make_batches
+
+
+def test_batches_are_largest_first_and_bounded():
+    tasks = [(size, 'nv', f'{size}.html') for size in (1, 5, 3, 8, 2, 2)]
+    batches = list(make_batches(tasks, batch_bytes=8, batch_files=2))
+    assert batches == [
+        [('nv', '8.html', 8)],
+        [('nv', '5.html', 5), ('nv', '3.html', 3)],
+        [('nv', '2.html', 2), ('nv', '2.html', 2)],
+        [('nv', '1.html', 1)],
+    ]
+    # every task is scheduled once
+    assert sorted(task for batch in batches for task in batch) == sorted(
+        (dataset_name, file_path, size) for size, dataset_name, file_path in tasks
+    )
+    assert list(make_batches([])) == []
+
+
+def test_two_datasets_on_one_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_and_save, 'PATH', str(tmp_path))
+    monkeypatch.setattr(parse_and_save, 'OUT_PATH', str(tmp_path / 'parsed_data'))
+    monkeypatch.setattr(parse_and_save, 'LISTING_PATH', str(tmp_path / 'listings'))
+    expected = {}
+    for dataset_name, page_path in golden_pages():
+        if dataset_name not in ('hromadske', 'nv'):
+            continue
+        relative_path = os.path.relpath(page_path, golden_root(dataset_name))
+        os.makedirs(os.path.dirname(tmp_path / dataset_name / relative_path), exist_ok=True)
+        shutil.copy(page_path, tmp_path / dataset_name / relative_path)
+        with open(expected_path(page_path), encoding='utf-8') as fp:
+            article = json.load(fp)
+        if article is not None:
+            expected.setdefault(dataset_name, []).append(article['title'])
+    (tmp_path / 'hromadske' / 'not-an-article.html').write_text(
+        '<html><body><h1>Tags</h1><div class="s-content"></div></body></html>', encoding='utf-8'
+    )
+    # can't be decoded: an error, not a page without an article
+    (tmp_path / 'hromadske' / 'broken.html').write_bytes(b'\xff\xfe<html></html>')
+
+    runs = run_all.run(['hromadske', 'nv'], workers=1)
+    assert {name: dataset_run.files for name, dataset_run in runs.items()} == {'hromadske': 3, 'nv': 2}
+    for dataset_name in ('hromadske', 'nv'):
+        out_path, _ = parse_and_save.output_paths(dataset_name)
+        assert sorted(pd.read_csv(out_path)['title']) == sorted(expected[dataset_name])
+    state_path = tmp_path / 'parsed_data' / 'hromadske_state.json'
+    assert json.loads(state_path.read_text())['skipped'] == [
+        str(tmp_path / 'hromadske' / 'not-an-article.html')
+    ]
+
+    # the memory of the workers, per dataset
+    assert runs['nv'].peak_rss > 0 and 'peak worker RSS' in runs['nv'].report()
+
+    # only the failed file is parsed again
+    runs = run_all.run(['hromadske', 'nv'], workers=1)
+    assert {name: dataset_run.files for name, dataset_run in runs.items()} == {'hromadske': 1, 'nv': 0}
+    log = (tmp_path / 'parsed_data' / 'hromadske_log.txt').read_text()
+    assert log.count('Error processing') == 2 and 'broken.html' in log
+    # the log of the first run is kept
+    assert 'No valid article data found' in log and 'not-an-article.html' in log
+
+
+def test_the_pack_of_the_parent_is_closed(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_and_save, 'PATH', str(tmp_path))
+    monkeypatch.setattr(parse_and_save, 'OUT_PATH', str(tmp_path / 'parsed_data'))
+    root = os.path.join(GOLDEN_DIR, 'hromadske')
+    files = [page_path for dataset_name, page_path in golden_pages() if dataset_name == 'hromadske']
+    pack_path = str(tmp_path / 'hromadske.pack')
+    build_pack(files, root, pack_path)
+    monkeypatch.setitem(parse_and_save.DATASET_CONFIG['hromadske'], 'pack', pack_path)
+    monkeypatch.setitem(parse_and_save.DATASET_CONFIG['hromadske'], 'root', root)
+
+    extractors = []
+
+    def make_extractor(dataset_name, **kwargs):
+        extractors.append(parse_and_save.make_extractor(dataset_name, **kwargs))
+        return extractors[-1]
+
+    monkeypatch.setattr(run_all, 'make_extractor', make_extractor)
+    runs = run_all.run(['hromadske'], workers=1)
+    assert runs['hromadske'].articles == len(files)
+    assert extractors[0].reader.fp.closed
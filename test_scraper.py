@@ -0,0 +1,61 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+
+from links_parser import SourceParser
+from rate_control import RateController
+from scraper import SimpleScraper
+
+
+class LinkParser(SourceParser):
+    def parse_tag(self, html):
+        soup = self.make_soup(html)
+        return [a['href'] for a in soup.find_all('a')]
+
+
+def make_server(pages, hits):
+    '''Serves /<n>: the links of pages[n]; the first request of page 2 gets a 503.'''
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = int(self.path.strip('/'))
+            hits.append(page)
+            if page == 2 and hits.count(2) == 1:
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = ''.join(f'<a href="{link}">x</a>' for link in pages.get(page, [])).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_index_pages_resume_retry_and_stop(tmp_path):
+    pages = {1: ['a', 'b'], 2: ['c'], 3: ['d'], 4: ['d'], 5: ['e'], 6: ['f']}
+    hits = []
+    server = make_server(pages, hits)
+    try:
+        scraper = SimpleScraper('hromadske', data_dir=str(tmp_path))
+        scraper.parser = LinkParser(
+            index_page_link=f'http://127.0.0.1:{server.server_port}/{{}}', page_num=10
+        )
+        scraper.rate = RateController(delay=0.01, min_delay=0.0)
+        # page 1 is already there and is not downloaded again
+        with open(os.path.join(scraper.index_dir, '1.html'), 'w', encoding='utf-8') as f:
+            f.write('<a href="a">x</a><a href="b">x</a>')
+
+        scraper.get_index_pages(workers=2)
+    finally:
+        server.shutdown()
+
+    # page 4 repeats page 3: the crawl stops after its wave, pages 5-9 aren't asked for
+    assert sorted(hits) == [2, 2, 3, 4]
+    assert scraper.links['link'].tolist() == ['a', 'b', 'c', 'd']
+    assert scraper.get_links()['link'].tolist() == ['a', 'b', 'c', 'd']
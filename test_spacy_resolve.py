@@ -0,0 +1,133 @@
+from collections import Counter
+import random
+from types import SimpleNamespace
+
+import pytest
+import spacy
+from spacy.tokens import Span
+
+import spacy_resolve
+from spacy_resolve import _get_head_noun, _is_named_entity, identify_entities, pick_best_entities
+
+
+def best_entity_per_mention(mentions):
+    '''The scoring identify_entities() had before the DocIndex, for comparison.'''
+    span_texts = [(mention.text, mention.start, mention.end, _is_named_entity(mention), _get_head_noun(mention)) for mention in mentions]
+    head_counter = Counter(h for *_, h in span_texts if h)
+    named_entities = [(text, start, end) for text, start, end, is_ne, _ in span_texts if is_ne]
+    if named_entities:
+        return min(named_entities, key=lambda x: len(x[0]))[0]
+    return max(span_texts, key=lambda x: (head_counter[x[4]] if x[4] else 0, -len(x[0])))[0]
+
+
+def make_doc(nlp, rng, n_tokens=60):
+    words = [rng.choice(['Sweden', 'it', 'they', 'the', 'army', 'Kyiv', 'NATO', 'camp', 'site']) for _ in range(n_tokens)]
+    doc = spacy.tokens.Doc(nlp.vocab, words=words, spaces=[rng.random() < 0.8 for _ in words])
+    for token in doc:
+        token.pos_ = rng.choice(['NOUN', 'PROPN', 'PRON', 'DET'])
+        token.lemma_ = token.text.upper() if rng.random() < 0.5 else token.text
+    ents, position = [], 0
+    while position < n_tokens - 3:
+        position += rng.randint(0, 6)
+        length = rng.randint(1, 3)
+        if position + length <= n_tokens:
+            ents.append(Span(doc, position, position + length, label=rng.choice(['GPE', 'ORG', 'CARDINAL', 'DATE'])))
+        position += length
+    doc.ents = ents
+    for cluster in range(rng.randint(1, 6)):
+        mentions = []
+        for _ in range(rng.randint(1, 5)):
+            start = rng.randint(0, n_tokens - 1)
+            mentions.append(Span(doc, start, min(n_tokens, start + rng.randint(1, 4))))
+        doc.spans[f'coref_clusters_{cluster + 1}'] = mentions
+    return doc
+
+
+def test_same_choices_as_the_per_mention_scoring():
+    nlp = spacy.blank('en')
+    rng = random.Random(0)
+    for _ in range(300):
+        doc = make_doc(nlp, rng)
+        clusters = {key: spans for key, spans in doc.spans.items()}
+        cluster_spans = {
+            key: [(span.start, span.end, span.text) for span in spans]
+            for key, spans in clusters.items()
+        }
+        best_entities = pick_best_entities(clusters)
+        assert best_entities == {key: best_entity_per_mention(spans) for key, spans in clusters.items()}
+        # and the spans to rewrite get them
+        for key, spans in identify_entities(clusters, cluster_spans).items():
+            assert all(entity == best_entities[key] for _, _, entity in spans)
+
+
+class FakePipeline:
+    '''Stands for the trf pipelines: records how they were loaded and put together.'''
+    def __init__(self, name, exclude=()):
+        self.name = name
+        self.exclude = list(exclude)
+        self.calls = []
+
+    def replace_listeners(self, *args):
+        self.calls.append(('replace_listeners',) + args)
+
+    def add_pipe(self, name, source):
+        self.calls.append(('add_pipe', name, source.name))
+
+
+def fake_models(monkeypatch):
+    loaded, threads, quantized = {}, [], []
+
+    def load(name, exclude=()):
+        loaded[name] = FakePipeline(name, exclude)
+        return loaded[name]
+
+    monkeypatch.setattr(spacy_resolve.spacy, 'load', load)
+    monkeypatch.setattr(spacy_resolve, '_set_threads', threads.append)
+    monkeypatch.setattr(spacy_resolve, 'quantize_pipeline', lambda nlp: quantized.append(nlp.name) or 3)
+    monkeypatch.delenv('SPACY_RESOLVE_THREADS', raising=False)
+    return loaded, threads, quantized
+
+
+def test_profiles_without_the_models(monkeypatch):
+    loaded, threads, quantized = fake_models(monkeypatch)
+    nlp, nlp_coref = spacy_resolve.load_models('full')
+    assert nlp.exclude == [] and threads == [] and quantized == []
+    assert nlp.calls == [
+        ('add_pipe', 'coref', 'en_coreference_web_trf'),
+        ('add_pipe', 'span_resolver', 'en_coreference_web_trf'),
+    ]
+    assert [call[2] for call in nlp_coref.calls] == ['coref', 'span_resolver']
+
+    nlp, _ = spacy_resolve.load_models('fast_cpu')
+    assert nlp.exclude == ['parser']
+    assert threads == [1] and quantized == ['en_core_web_trf']
+
+    # the threads of the argument, then of the environment, then of the profile
+    spacy_resolve.load_models('fast_cpu', threads=4)
+    monkeypatch.setenv('SPACY_RESOLVE_THREADS', '2')
+    spacy_resolve.load_models('fast_cpu')
+    spacy_resolve.load_models('full')
+    assert threads == [1, 4, 2, 2]
+
+
+def test_unknown_profile_and_missing_models(monkeypatch):
+    fake_models(monkeypatch)
+    with pytest.raises(ValueError, match='fast_cpu'):
+        spacy_resolve.load_models('fast_gpu')
+
+    def missing(name, exclude=()):
+        raise OSError(f"Can't find model '{name}'")
+
+    monkeypatch.setattr(spacy_resolve.spacy, 'load', missing)
+    with pytest.raises(RuntimeError, match='en_core_web_trf'):
+        spacy_resolve.load_models('full')
+
+
+def test_quantize_pipeline():
+    torch = pytest.importorskip('torch')
+    from thinc.api import PyTorchWrapper
+
+    pipe = SimpleNamespace(model=PyTorchWrapper(torch.nn.Sequential(torch.nn.Linear(4, 2))))
+    nlp = SimpleNamespace(pipeline=[('transformer', pipe), ('sentencizer', SimpleNamespace())])
+    assert spacy_resolve.quantize_pipeline(nlp) == 1
+    assert isinstance(pipe.model.shims[0]._model[0], torch.ao.nn.quantized.dynamic.Linear)
@@ -0,0 +1,101 @@
+import random
+
+from span_rewrite import drop_conflicting_spans, merge_spans, splice_tokens
+
+
+def paint(tokens, rewrites, drop_blank_tokens=False):
+    '''The token-by-token version: a token -> replacement dict, later rewrites win.'''
+    token_id2replacement = {}
+    for start, end, values in rewrites:
+        if isinstance(values, str):
+            values = [values if values.strip() else None] + [None] * (end - start - 1)
+        for ind, value in zip(range(start, end), values):
+            if ind < len(tokens):
+                token_id2replacement[ind] = value
+    new_tokens = []
+    for ind, token in enumerate(tokens):
+        new_token = token_id2replacement.get(ind, token)
+        if new_token is None or (drop_blank_tokens and not new_token.strip()):
+            continue
+        new_tokens.append(new_token)
+    return new_tokens
+
+
+def test_no_rewrites():
+    assert splice_tokens(['Sweden', ' ', 'joined'], []) == ['Sweden', ' ', 'joined']
+    assert splice_tokens(['Sweden', ' ', 'joined'], [], drop_blank_tokens=True) == ['Sweden', 'joined']
+
+
+def test_replace_and_drop():
+    tokens = ['It', 'joined', 'the', 'alliance', 'in', '2024']
+    rewrites = [(0, 1, 'Sweden'), (2, 4, ['NATO', None])]
+    assert splice_tokens(tokens, rewrites) == ['Sweden', 'joined', 'NATO', 'in', '2024']
+
+
+def test_later_rewrite_wins_on_overlap():
+    tokens = list('abcdefgh')
+    rewrites = [(1, 5, ['X', None, None, None]), (3, 7, ['Y', None, None, "'s"])]
+    assert splice_tokens(tokens, rewrites) == paint(tokens, rewrites) == ['a', 'X', 'Y', "'s", 'h']
+
+
+def test_same_as_token_by_token_on_random_spans():
+    rng = random.Random(0)
+    for _ in range(500):
+        tokens = [rng.choice(['a', 'b', ' ', 'c']) for _ in range(rng.randint(0, 30))]
+        rewrites = []
+        for _ in range(rng.randint(0, 10)):
+            start = rng.randint(0, 32)
+            end = start + rng.randint(1, 6)
+            if rng.random() < 0.5:
+                rewrites.append((start, end, rng.choice(['E', ' '])))
+            else:
+                rewrites.append((start, end, [rng.choice(['E', None, "'s"]) for _ in range(end - start)]))
+        for drop in (False, True):
+            assert splice_tokens(tokens, rewrites, drop) == paint(tokens, rewrites, drop)
+
+
+def test_merge_single_and_nested_spans():
+    assert merge_spans([(5, 7)]) == [(5, 7)]
+    assert merge_spans([]) == []
+    # "Ukrainian hetman", "Ukrainian hetman Ivan Mazepa", "Ivan Mazepa", unsorted
+    assert merge_spans([(3, 4), (1, 4), (1, 2)]) == [(1, 4)]
+    assert merge_spans([(1, 10), (2, 3), (5, 6)]) == [(1, 10)]
+
+
+def test_merge_touching_spans():
+    # inclusive ends (maverick): (1, 2) and (3, 4) touch, (1, 2) and (2, 4) overlap
+    assert merge_spans([(3, 4), (1, 2)]) == [(1, 2), (3, 4)]
+    assert merge_spans([(1, 2), (2, 4)]) == [(1, 4)]
+    # exclusive ends (spaCy): (1, 3) and (3, 5) touch
+    assert merge_spans([(1, 3), (3, 5)], inclusive=False) == [(1, 3), (3, 5)]
+    assert merge_spans([(1, 4), (3, 5)], inclusive=False) == [(1, 5)]
+
+
+def test_drop_conflicting_spans_keeps_the_longest():
+    # "Sweden" in one cluster, "Sweden ’s government" in another
+    assert drop_conflicting_spans([[(0, 0), (10, 10)], [(0, 2)]]) == [[(10, 10)], [(0, 2)]]
+    # on ties the earlier cluster wins
+    assert drop_conflicting_spans([[(4, 5)], [(4, 5)]]) == [[(4, 5)], []]
+    assert drop_conflicting_spans([[(1, 3)], [(3, 5)]], inclusive=False) == [[(1, 3)], [(3, 5)]]
+
+
+def test_no_conflicts_left_on_random_spans():
+    rng = random.Random(1)
+    for _ in range(300):
+        clusters = []
+        for _ in range(rng.randint(1, 6)):
+            spans = []
+            for _ in range(rng.randint(1, 6)):
+                start = rng.randint(0, 40)
+                spans.append((start, start + rng.randint(0, 4)))
+            clusters.append(merge_spans(spans))
+        kept = sorted(span for spans in drop_conflicting_spans(clusters) for span in spans)
+        assert kept
+        for (_, end), (start, _) in zip(kept, kept[1:]):
+            assert end < start
+        # a sweep is greedy, but it never drops the (only) longest span
+        spans = [span for spans in clusters for span in spans]
+        longest = max(end - start for start, end in spans)
+        longest_spans = [(start, end) for start, end in spans if end - start == longest]
+        if len(longest_spans) == 1:
+            assert longest_spans[0] in kept
@@ -0,0 +1,73 @@
+import socket
+
+from local_server import make_server
+from transport import DnsCache, Transport
+
+
+def test_download_streams_the_decompressed_page(tmp_path):
+    server = make_server(page_kb=64)
+    url = f'http://127.0.0.1:{server.server_port}/1'
+    try:
+        with Transport() as client:
+            text = client.get(url).text
+            response = client.download(url, str(tmp_path / 'page.html'))
+    finally:
+        server.shutdown()
+    assert response.saved
+    assert (tmp_path / 'page.html').read_text(encoding='utf-8') == text
+    assert text.startswith('<p>Sweden joined NATO in 2024.</p>')
+    assert not (tmp_path / 'page.html.part').exists()
+
+
+def test_a_page_without_a_charset_is_saved_as_utf8(tmp_path):
+    server = make_server(page_kb=1, content_type='text/html')
+    url = f'http://127.0.0.1:{server.server_port}/1'
+    try:
+        with Transport() as client:
+            response = client.download(url, str(tmp_path / 'page.html'))
+    finally:
+        server.shutdown()
+    assert response.saved
+    # not decoded as latin-1 (what requests assumes for text/* without a charset)
+    assert 'Швеція вступила до НАТО.' in (tmp_path / 'page.html').read_text(encoding='utf-8')
+
+
+def test_dns_cache_is_bounded_and_expires():
+    calls, now = [], [0.0]
+
+    def fake_getaddrinfo(host, port, *args):
+        calls.append(host)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', port))]
+
+    cache = DnsCache(ttl=60, maxsize=2, resolve=fake_getaddrinfo, clock=lambda: now[0])
+    for host in ('nv.ua', 'nv.ua', 'hromadske.ua', 'nv.ua', 'euractiv.com', 'nv.ua'):
+        cache.lookup(host, 443)
+    assert calls == ['nv.ua', 'hromadske.ua', 'euractiv.com']
+    # the least recently used host is dropped
+    assert list(cache.entries) == [('euractiv.com', 443), ('nv.ua', 443)]
+    now[0] = 61
+    cache.lookup('nv.ua', 443)
+    assert calls[-1] == 'nv.ua' and len(calls) == 4
+
+
+def test_dns_cache_is_used_by_the_transport_only():
+    server = make_server(page_kb=1)
+    calls = []
+
+    def fake_getaddrinfo(host, port, *args):
+        calls.append(host)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', port))]
+
+    getaddrinfo = socket.getaddrinfo
+    cache = DnsCache(resolve=fake_getaddrinfo)
+    url = f'http://sweden.test:{server.server_port}/1'
+    try:
+        # two transports, two connections, one lookup
+        for _ in range(2):
+            with Transport(dns_cache=cache) as client:
+                response = client.get(url)
+                assert response.status_code == 200
+    finally:
+        server.shutdown()
+    assert calls == ['sweden.test']
+    assert socket.getaddrinfo is getaddrinfo
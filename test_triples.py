@@ -0,0 +1,92 @@
+import pytest
+from spacy.tokens import Doc
+from spacy.vocab import Vocab
+
+from triples import TripleStore, extract_triples, load_triples, sentence_triples
+
+VOCAB = Vocab()
+
+
+def make_doc(words, heads, deps, pos, lemmas=None):
+    '''A parsed sentence by hand, so no model is needed.'''
+    return Doc(VOCAB, words=words, heads=heads, deps=deps, pos=pos, lemmas=lemmas or words)
+
+
+def sweden_joined_nato():
+    # "The Swedish government joined NATO and the EU ."
+    return make_doc(
+        words=['The', 'Swedish', 'government', 'joined', 'NATO', 'and', 'the', 'EU', '.'],
+        heads=[2, 2, 3, 3, 3, 4, 7, 4, 3],
+        deps=['det', 'amod', 'nsubj', 'ROOT', 'dobj', 'cc', 'det', 'conj', 'punct'],
+        pos=['DET', 'ADJ', 'NOUN', 'VERB', 'PROPN', 'CCONJ', 'DET', 'PROPN', 'PUNCT'],
+        lemmas=['the', 'swedish', 'government', 'join', 'NATO', 'and', 'the', 'EU', '.'],
+    )
+
+
+def test_sentence_triples():
+    assert sentence_triples(sweden_joined_nato()) == [
+        ('swedish government', 'join', 'nato'),
+        ('swedish government', 'join', 'eu'),
+    ]
+
+
+def test_preposition_objects_and_no_target():
+    # "Ukraine relies on Sweden ."
+    doc = make_doc(
+        words=['Ukraine', 'relies', 'on', 'Sweden', '.'],
+        heads=[1, 1, 1, 2, 1],
+        deps=['nsubj', 'ROOT', 'prep', 'pobj', 'punct'],
+        pos=['PROPN', 'VERB', 'ADP', 'PROPN', 'PUNCT'],
+        lemmas=['Ukraine', 'rely', 'on', 'Sweden', '.'],
+    )
+    assert sentence_triples(doc) == [('ukraine', 'rely', 'sweden')]
+    # neither the subject nor the object mentions a target
+    doc = make_doc(
+        words=['Ukraine', 'joined', 'talks', '.'],
+        heads=[1, 1, 1, 1],
+        deps=['nsubj', 'ROOT', 'dobj', 'punct'],
+        pos=['PROPN', 'VERB', 'NOUN', 'PUNCT'],
+    )
+    assert sentence_triples(doc) == []
+
+
+class FakeNlp:
+    '''Returns the hand-built doc of every sentence it is given.'''
+    def __init__(self, docs):
+        self.docs = docs
+        self.seen = []
+
+    def pipe(self, items, batch_size, as_tuples):
+        for text, context in items:
+            self.seen.append(text)
+            yield self.docs[text], context
+
+
+def test_only_relevant_sentences_are_parsed():
+    sentence = 'The Swedish government joined NATO and the EU.'
+    nlp = FakeNlp({sentence: sweden_joined_nato()})
+    records = [
+        ('nv', '2024-03-07', f'Prices went up. {sentence} The weather was fine.'),
+        ('nv', '2024-03-08', 'Nothing about the target here.'),
+    ]
+    triples = list(extract_triples(records, nlp=nlp))
+    assert nlp.seen == [sentence]
+    assert triples == [
+        ('nv', '2024-03-07', 'swedish government', 'join', 'nato'),
+        ('nv', '2024-03-07', 'swedish government', 'join', 'eu'),
+    ]
+
+
+def test_store_round_trip(tmp_path):
+    pytest.importorskip('pyarrow')
+    triples = [('nv', f'2024-03-0{n}', 'sweden', 'join', 'nato') for n in range(1, 6)]
+    with TripleStore(str(tmp_path), flush_every=2) as store:
+        for triple in triples:
+            store.add(triple)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'part-00000.parquet', 'part-00001.parquet', 'part-00002.parquet'
+    ]
+    df = load_triples(str(tmp_path))
+    assert sorted(map(tuple, df.astype(str).values.tolist())) == triples
+    # a new store appends parts instead of overwriting them
+    assert TripleStore(str(tmp_path)).part == 3
@@ -0,0 +1,235 @@
+'''
+The HTTP layer of the scrapers: one pooled client per scraper instead of a new
+requests.Session in every method.
+
+- Keep-alive connections, `pool_maxsize` per host, so threads don't open (and throw away)
+  a connection per request.
+- Accept-Encoding with every encoding the installed decoders can read
+  (gzip and deflate; br with brotli installed).
+- HTTP/2 with http2=True if httpx (with h2) is installed; otherwise HTTP/1.1 over requests.
+- An opt-in DNS cache (DnsCache, created once by the CLI and passed down): the connections
+  of the transport resolve a host once per `ttl` seconds, not once per connection.
+  Only the transport's own adapter uses it; socket.getaddrinfo is left alone.
+- download() streams the body to the file in chunks instead of keeping response.text.
+'''
+from collections import OrderedDict
+import os
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError
+from urllib3.util.request import ACCEPT_ENCODING
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+POOL_MAXSIZE = 16  # keep-alive connections per host
+POOL_HOSTS = 10  # hosts with a pool
+CHUNK_SIZE = 64 * 1024
+DNS_TTL = 300  # seconds
+DNS_MAXSIZE = 256  # hosts
+
+
+class DnsCache:
+    '''
+    The addresses of the hosts for `ttl` seconds, the `maxsize` most recently used hosts.
+    resolve -- getaddrinfo (socket.getaddrinfo if None), clock -- time.monotonic.
+    '''
+    def __init__(self, ttl=DNS_TTL, maxsize=DNS_MAXSIZE, resolve=None, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.resolve = resolve
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (host, port) -> (expires, getaddrinfo result)
+
+    def __repr__(self):
+        return f'<DnsCache>, {len(self.entries)} hosts, ttl {self.ttl}s'
+
+    def lookup(self, host, port):
+        key = (host, port)
+        now = self.clock()
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached and cached[0] > now:
+                self.entries.move_to_end(key)
+                return cached[1]
+        resolve = self.resolve or socket.getaddrinfo
+        result = resolve(host, port, 0, socket.SOCK_STREAM)
+        with self.lock:
+            self.entries[key] = (now + self.ttl, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return result
+
+
+class _CachedDnsConnection:
+    '''Connects to the addresses from `dns_cache` instead of resolving the host every time.'''
+    dns_cache = None  # set on the classes of one adapter, see CachedDnsAdapter
+
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            addresses = self.dns_cache.lookup(host, self.port)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        error = None
+        for _, _, _, _, sockaddr in addresses:
+            # urllib3 connects to _dns_host; the Host header and TLS still use the name
+            self._dns_host = sockaddr[0]
+            try:
+                return super()._new_conn()
+            except ConnectTimeoutError as e:  # NewConnectionError too
+                error = e
+            finally:
+                self._dns_host = host
+        raise error
+
+
+class CachedDnsAdapter(HTTPAdapter):
+    '''An HTTPAdapter whose connections resolve the hosts through `dns_cache` (a DnsCache).'''
+    def __init__(self, dns_cache, **kwargs):
+        self.dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attrs = {'dns_cache': self.dns_cache}
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('HTTPConnectionPool', (HTTPConnectionPool,), {
+                'ConnectionCls': type('HTTPConnection', (_CachedDnsConnection, HTTPConnection), attrs),
+            }),
+            'https': type('HTTPSConnectionPool', (HTTPSConnectionPool,), {
+                'ConnectionCls': type('HTTPSConnection', (_CachedDnsConnection, HTTPSConnection), attrs),
+            }),
+        }
+
+
+class Transport:
+    '''
+    Input: headers -- sent with every request.
+           timeout -- the default timeout of a request.
+           http2 -- use HTTP/2 (needs `pip install httpx[http2]`).
+           dns_cache -- a DnsCache for the DNS lookups of the transport (None: no cache),
+               usually one per process, created by the CLI; not used with HTTP/2.
+    get() and download() return a response with status_code, headers and text
+    (requests.Response or httpx.Response); the errors are requests.RequestException
+    with both backends, so the callers catch one type.
+    '''
+    def __init__(self, headers=None, timeout=10, pool_maxsize=POOL_MAXSIZE,
+                 http2=False, dns_cache=None):
+        self.timeout = timeout
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
+
+        self.http2 = False
+        if http2:
+            if httpx is None:
+                print('httpx is not installed, falling back to HTTP/1.1')
+            else:
+                try:
+                    self.client = httpx.Client(
+                        http2=True, headers=headers, follow_redirects=True,
+                        limits=httpx.Limits(
+                            max_connections=pool_maxsize * POOL_HOSTS,
+                            max_keepalive_connections=pool_maxsize,
+                        ),
+                    )
+                    self.http2 = True
+                except ImportError:
+                    print('h2 is not installed, falling back to HTTP/1.1')
+        if not self.http2:
+            self.client = requests.Session()
+            self.client.headers.update(headers)
+            if dns_cache is not None:
+                adapter = CachedDnsAdapter(dns_cache, pool_connections=POOL_HOSTS, pool_maxsize=pool_maxsize)
+            else:
+                adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=pool_maxsize)
+            self.client.mount('http://', adapter)
+            self.client.mount('https://', adapter)
+
+    def __repr__(self):
+        return f'<Transport>, {"HTTP/2" if self.http2 else "HTTP/1.1"}'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.client.close()
+
+    def get(self, url, headers=None, timeout=None):
+        timeout = timeout or self.timeout
+        if not self.http2:
+            return self.client.get(url, headers=headers, timeout=timeout)
+        try:
+            return self.client.get(url, headers=headers, timeout=timeout)
+        except httpx.HTTPError as e:
+            raise requests.ConnectionError(str(e)) from e
+
+    def download(self, url, file_path, headers=None, timeout=None, chunk_size=CHUNK_SIZE):
+        '''
+        GET which streams a 200 response into `file_path` (through a temporary file,
+        so an interrupted download doesn't leave half a page) and doesn't keep the body.
+        The pages are saved as utf-8 like the rest of the scraper does: a body in
+        another charset (by the Content-Type header) is decoded and written as text,
+        a body without a charset is taken for utf-8 and streamed.
+        Returns the response; response.saved is True if the body was written.
+        '''
+        timeout = timeout or self.timeout
+        tmp_path = f'{file_path}.part'
+        if self.http2:
+            try:
+                with self.client.stream('GET', url, headers=headers, timeout=timeout) as response:
+                    response.saved = response.status_code == 200
+                    if response.saved:
+                        with open(tmp_path, 'wb') as fp:
+                            if _is_utf8(_charset(response)):
+                                for chunk in response.iter_bytes(chunk_size):
+                                    fp.write(chunk)
+                            else:
+                                fp.write(response.read().decode(response.encoding).encode('utf-8'))
+            except httpx.HTTPError as e:
+                raise requests.ConnectionError(str(e)) from e
+        else:
+            response = self.client.get(url, headers=headers, timeout=timeout, stream=True)
+            with response:
+                response.saved = response.status_code == 200
+                if response.saved:
+                    with open(tmp_path, 'wb') as fp:
+                        if _is_utf8(_charset(response)):
+                            # iter_content decompresses gzip/br on the fly
+                            for chunk in response.iter_content(chunk_size):
+                                fp.write(chunk)
+                        else:
+                            fp.write(response.text.encode('utf-8'))
+        if response.saved:
+            os.replace(tmp_path, file_path)
+        return response
+
+
+def _charset(response):
+    '''
+    The charset of the Content-Type header, None without one. Not response.encoding:
+    requests gives ISO-8859-1 to a text/* response without a charset.
+    '''
+    for param in response.headers.get('Content-Type', '').split(';')[1:]:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            return value.strip().strip('"\'') or None
+    return None
+
+
+def _is_utf8(encoding):
+    # no charset in the headers: the sites are utf-8 (that's how the pages were always saved)
+    return encoding is None or encoding.lower().replace('_', '-') in ('utf-8', 'utf8', 'ascii')
@@ -0,0 +1,146 @@
+import os
+import sys
+
+import pandas as pd
+import spacy
+
+# the pre-filter: only the sentences which mention a target are parsed
+from relevance import TARGET_RE, relevant_sentences
+
+
+SUBJECT_DEPS = {'nsubj', 'nsubjpass'}
+OBJECT_DEPS = {'dobj', 'attr', 'dative', 'oprd'}
+PHRASE_DEPS = {'compound', 'amod', 'poss'}
+TRIPLE_COLUMNS = ('outlet', 'date', 'subject', 'lemma', 'object')
+
+_NLP = None
+
+
+def get_nlp():
+    '''The parser for the triples: no NER, it's not needed and it's not cheap.'''
+    global _NLP
+    if _NLP is None:
+        _NLP = spacy.load("en_core_web_sm", disable=["ner"])
+    return _NLP
+
+
+def _phrase(token) -> str:
+    '''"the Swedish government" => "swedish government": the token with its modifiers.'''
+    words = [child for child in token.lefts if child.dep_ in PHRASE_DEPS] + [token]
+    return ' '.join(word.text.lower() for word in words)
+
+
+def _objects(verb) -> list:
+    objects = []
+    for child in verb.children:
+        if child.dep_ in OBJECT_DEPS:
+            objects.append(child)
+        elif child.dep_ == 'prep':
+            # "sweden joined (to) nato": take the object of the preposition
+            objects.extend(c for c in child.children if c.dep_ == 'pobj')
+    # "recognised palestine and israel"
+    objects.extend(conj for obj in list(objects) for conj in obj.conjuncts)
+    return objects
+
+
+def sentence_triples(sent, target_re=TARGET_RE) -> list:
+    '''
+    Returns (subject, lemma, object) triples of a parsed sentence
+    where either the subject or the object mentions a target.
+    '''
+    triples = []
+    for token in sent:
+        if token.pos_ not in ('VERB', 'AUX'):
+            continue
+        subjects = [child for child in token.children if child.dep_ in SUBJECT_DEPS]
+        subjects.extend(conj for subj in list(subjects) for conj in subj.conjuncts)
+        if not subjects:
+            continue
+        for subject in subjects:
+            subject_text = _phrase(subject)
+            for obj in _objects(token):
+                object_text = _phrase(obj)
+                if target_re.search(subject_text) or target_re.search(object_text):
+                    triples.append((subject_text, token.lemma_.lower(), object_text))
+    return triples
+
+
+def extract_triples(records, nlp=None, batch_size=256, target_re=TARGET_RE):
+    '''
+    Streams (outlet, date, subject, lemma, object) triples from
+    (outlet, date, resolved_text) records, e.g. texts from
+    spacy_resolve.resolve() or maverick_resolve.resolve().
+
+    Only the sentences which pass the pre-filter are parsed, in batches of
+    `batch_size` sentences across articles.
+    '''
+    nlp = nlp or get_nlp()
+
+    def sentences():
+        for outlet, date, text in records:
+            for sent in relevant_sentences(text, target_re):
+                yield sent, (outlet, date)
+
+    for doc, (outlet, date) in nlp.pipe(sentences(), batch_size=batch_size, as_tuples=True):
+        for subject, lemma, obj in sentence_triples(doc, target_re):
+            yield outlet, date, subject, lemma, obj
+
+
+class TripleStore:
+    '''
+    A columnar store for the triples: the triples are buffered as columns and
+    flushed as parquet parts (<out_dir>/part-00000.parquet, ...) with categorical
+    columns, which is compact for the repetitive outlet / lemma values.
+    The whole store is read back with load_triples(out_dir).
+    '''
+    def __init__(self, out_dir, flush_every=100_000):
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+        self.flush_every = flush_every
+        self.columns = {column: [] for column in TRIPLE_COLUMNS}
+        self.part = len([f for f in os.listdir(out_dir) if f.endswith('.parquet')])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def add(self, triple):
+        for column, value in zip(TRIPLE_COLUMNS, triple):
+            self.columns[column].append(value)
+        if len(self.columns['outlet']) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.columns['outlet']:
+            return
+        df = pd.DataFrame(self.columns).astype('category')
+        df.to_parquet(os.path.join(self.out_dir, f'part-{self.part:05d}.parquet'), index=False)
+        self.part += 1
+        self.columns = {column: [] for column in TRIPLE_COLUMNS}
+
+
+def load_triples(out_dir) -> pd.DataFrame:
+    return pd.read_parquet(out_dir)
+
+
+def read_records(csv_path, outlet, text_column='article_body', chunksize=1000):
+    '''Streams (outlet, date, text) records from a parsed or resolved csv, chunk by chunk.'''
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        for date, text in zip(chunk['date_published'], chunk[text_column]):
+            if isinstance(text, str):
+                yield outlet, date, text
+
+
+if __name__ == '__main__':
+    'works like this: python triples.py <csv with resolved texts> <outlet> <out_dir> [<text column>]'
+    if len(sys.argv) < 4:
+        print('Usage: <csv path> <outlet> <out dir> [<text column>]')
+        sys.exit(1)
+
+    csv_path, outlet, out_dir = sys.argv[1:4]
+    text_column = sys.argv[4] if len(sys.argv) > 4 else 'article_body'
+    with TripleStore(out_dir) as store:
+        for triple in extract_triples(read_records(csv_path, outlet, text_column)):
+            store.add(triple)